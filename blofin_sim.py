@@ -0,0 +1,614 @@
+"""
+BloFin Simulator - local stand-in for the BloFin REST endpoints the bot calls
+- Same request signing as BloFin (HMAC-SHA256 over path + method + timestamp
+  + nonce + body); bad key, passphrase, signature, stale timestamp or a
+  replayed nonce are rejected
+- Net-mode positions per instrument: market orders fill at the simulated
+  price, close-position flattens; stops (slTriggerPrice on the order, or
+  TPSL orders placed/cancelled/listed separately) fire when the price is
+  moved through them and go away with the position; balance, margin and
+  P&L are tracked
+- Fault injection: fixed latency + jitter, random 5xx errors, and a
+  per-key request budget answered with 429
+- Optional private WebSocket (--ws-port): signed login, then positions,
+  orders and account pushes after every fill, so the bot's account stream
+  (push, reconnect, dirty invalidation) runs offline too
+
+Point the bot at it:
+  python blofin_sim.py --port 8790 --latency 40 --jitter 20 --error-rate 0.01 --rate-limit 30
+  BLOFIN_BASE_URL=http://127.0.0.1:8790 BLOFIN_API_KEY=sim-key BLOFIN_API_SECRET=sim-secret \\
+      BLOFIN_PASSPHRASE=sim-pass ACCOUNT_STREAM=0 PRICE_STREAM=0 python mxs_webhook_bot.py
+  With --ws-port 8791, run the bot with ACCOUNT_STREAM=1 BLOFIN_WS_PRIVATE_URL=ws://127.0.0.1:8791/ws/private
+
+Control (no signature needed):
+  POST /sim/price   {"instId": "FARTCOIN-USDT", "price": 1.02}   - moves the market, fires stops
+  POST /sim/config  {"latency_ms": 80, "error_rate": 0.05, ...}  - change faults at runtime
+  POST /sim/reset   {"balance": 1000}                            - flat book, fresh balance
+  POST /sim/position {"instId": ..., "side": "buy", "size": 100, "price": 1.0, "stop": 0.98, "leverage": 3}
+                                                                 - open a position as-is (replay seeding)
+  POST /sim/ws      {"drop": true} | {"mute": true|false}         - close every socket (reconnect) /
+                                                                   hold pushes and pongs (stale stream)
+  GET  /sim/state                                                - positions, stops, fills, counters
+"""
+
+import os
+import json
+import hmac
+import time
+import base64
+import random
+import hashlib
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict, deque
+from flask import Flask, request, jsonify
+
+SIM_API_KEY = os.environ.get('SIM_API_KEY', 'sim-key')
+SIM_API_SECRET = os.environ.get('SIM_API_SECRET', 'sim-secret')
+SIM_PASSPHRASE = os.environ.get('SIM_PASSPHRASE', 'sim-pass')
+SIM_TS_WINDOW = 30          # seconds a signed request stays valid
+SIM_FEE = 0.0006            # taker fee on fill notional
+SIM_NONCES_MAX = 10000      # recent nonces remembered for replay detection
+
+app = Flask(__name__)
+
+class SimConfig:
+    latency_ms = 0.0        # added to every API call
+    jitter_ms = 0.0         # + uniform(0, jitter_ms)
+    error_rate = 0.0        # share of API calls answered 500
+    rate_limit = 0          # API calls per second per key (0 = unlimited)
+    slippage = 0.0          # fraction of price, against the taker
+
+    @classmethod
+    def update(cls, values):
+        for k, v in values.items():
+            if k in ('latency_ms', 'jitter_ms', 'error_rate', 'slippage'):
+                setattr(cls, k, float(v))
+            elif k == 'rate_limit':
+                setattr(cls, k, int(v))
+        return cls.to_dict()
+
+    @classmethod
+    def to_dict(cls):
+        return {'latency_ms': cls.latency_ms, 'jitter_ms': cls.jitter_ms, 'error_rate': cls.error_rate,
+                'rate_limit': cls.rate_limit, 'slippage': cls.slippage}
+
+# =============================================================================
+# EXCHANGE STATE
+# =============================================================================
+class SimExchange:
+    """Positions, stops, balance and fills, guarded by one lock"""
+    def __init__(self, balance=1000.0, default_price=1.0):
+        self.lock = threading.Lock()
+        self.default_price = default_price
+        self.reset(balance)
+
+    def reset(self, balance):
+        with self.lock:
+            self.cash = float(balance)         # realised equity
+            self.prices = {}
+            self.positions = {}                # instId -> {'size': signed, 'avg': px, 'leverage': n}
+            self.stops = {}                    # instId -> {tpslId: trigger price} of its stop-loss orders
+            self.leverage = {}                 # (instId, margin_mode) -> leverage
+            self.fills = deque(maxlen=1000)
+            self.order_seq = 0
+            self.tpsl_seq = 0
+
+    def price(self, inst):
+        return self.prices.get(inst, self.default_price)
+
+    def margin_used(self):
+        return sum(abs(p['size']) * p['avg'] / p['leverage'] for p in self.positions.values())
+
+    def unrealized(self, inst):
+        p = self.positions.get(inst)
+        return p['size'] * (self.price(inst) - p['avg']) if p else 0.0
+
+    def available(self):
+        return self.cash - self.margin_used() + sum(min(self.unrealized(i), 0) for i in self.positions)
+
+    def _fill(self, inst, side, size, reason, margin_mode='isolated'):
+        """Trade size contracts at the current price (lock held); returns the fill"""
+        px = self.price(inst) * (1 + SimConfig.slippage if side == 'buy' else 1 - SimConfig.slippage)
+        delta = size if side == 'buy' else -size
+        self.cash -= SIM_FEE * size * px
+        p = self.positions.get(inst)
+        if p is None:
+            p = self.positions[inst] = {'size': 0.0, 'avg': px, 'leverage': self.leverage.get((inst, margin_mode), 1)}
+        if p['size'] == 0 or (p['size'] > 0) == (delta > 0):
+            total = abs(p['size']) + size
+            p['avg'] = (abs(p['size']) * p['avg'] + size * px) / total
+            p['size'] += delta
+        else:
+            closed = min(abs(delta), abs(p['size']))
+            self.cash += closed * (px - p['avg']) * (1 if p['size'] > 0 else -1)
+            p['size'] += delta
+            if abs(delta) > closed:                 # flipped through zero
+                p['avg'] = px
+        if p['size'] == 0:
+            del self.positions[inst]
+            self.stops.pop(inst, None)
+        self.order_seq += 1
+        fill = {'orderId': str(self.order_seq), 'instId': inst, 'side': side, 'size': size,
+                'price': round(px, 10), 'reason': reason, 'ts': int(time.time() * 1000)}
+        self.fills.append(fill)
+        return fill
+
+    def order(self, inst, side, size, sl=None, margin_mode='isolated'):
+        with self.lock:
+            p = self.positions.get(inst)
+            opening = size if not p or (p['size'] > 0) == (side == 'buy') else max(0.0, size - abs(p['size']))
+            if opening * self.price(inst) / self.leverage.get((inst, margin_mode), 1) > self.available() + 1e-9:
+                return None
+            fill = self._fill(inst, side, size, 'order', margin_mode)
+            if sl and inst in self.positions:
+                self._add_stop(inst, sl)
+            return fill
+
+    def _add_stop(self, inst, sl):
+        self.tpsl_seq += 1
+        tpsl_id = f"sl-{self.tpsl_seq}"
+        self.stops.setdefault(inst, {})[tpsl_id] = sl
+        return tpsl_id
+
+    def add_stop(self, inst, sl):
+        """Stop-loss for the whole position (None when there is no position)"""
+        with self.lock:
+            return self._add_stop(inst, sl) if inst in self.positions else None
+
+    def cancel_stop(self, inst, tpsl_id):
+        with self.lock:
+            return self.stops.get(inst, {}).pop(tpsl_id, None) is not None
+
+    def pending_stops(self, inst=None):
+        with self.lock:
+            return [{'tpslId': i, 'instId': s, 'slTriggerPrice': str(px), 'slOrderPrice': '-1', 'size': '-1',
+                     'side': 'sell' if self.positions[s]['size'] > 0 else 'buy', 'state': 'live'}
+                    for s, book in self.stops.items() if (inst is None or s == inst) and s in self.positions
+                    for i, px in book.items()]
+
+    def close(self, inst):
+        with self.lock:
+            p = self.positions.get(inst)
+            if p is None:
+                return None
+            return self._fill(inst, 'sell' if p['size'] > 0 else 'buy', abs(p['size']), 'close')
+
+    def seed_position(self, inst, side, size, px, sl=None, leverage=1):
+        """Open a position at px as-is, without the margin check"""
+        with self.lock:
+            self.leverage[(inst, 'isolated')] = leverage
+            self.prices[inst] = px
+            fill = self._fill(inst, side, size, 'seed')
+            if sl:
+                self._add_stop(inst, sl)
+            return fill
+
+    def set_price(self, inst, px):
+        """Move the market; an attached stop the price crossed fills at the stop"""
+        with self.lock:
+            self.prices[inst] = px
+            p = self.positions.get(inst)
+            book = self.stops.get(inst)
+            if not p or not book:
+                return None
+            # nearest stop fires first: the highest sell stop under a long, the lowest buy stop over a short
+            sl = max(book.values()) if p['size'] > 0 else min(book.values())
+            if (p['size'] > 0 and px <= sl) or (p['size'] < 0 and px >= sl):
+                self.prices[inst] = sl
+                fill = self._fill(inst, 'sell' if p['size'] > 0 else 'buy', abs(p['size']), 'stop')
+                self.prices[inst] = px
+                return fill
+            return None
+
+    def _position_row(self, inst):
+        p = self.positions.get(inst) or {'size': 0.0, 'avg': 0.0, 'leverage': self.leverage.get((inst, 'isolated'), 1)}
+        return {'instId': inst, 'positions': str(p['size']), 'averagePrice': str(p['avg']),
+                'leverage': str(p['leverage']), 'marginMode': 'isolated',
+                'markPrice': str(self.price(inst)), 'unrealizedPnl': str(round(self.unrealized(inst), 8))}
+
+    def position_rows(self):
+        with self.lock:
+            return [self._position_row(inst) for inst in self.positions]
+
+    def push_rows(self, inst):
+        """(position row - flat if closed, available balance) for a stream push"""
+        with self.lock:
+            return self._position_row(inst), round(self.available(), 8)
+
+    def snapshot(self):
+        with self.lock:
+            return {'cash': round(self.cash, 8), 'available': round(self.available(), 8),
+                    'prices': dict(self.prices), 'positions': {k: dict(v) for k, v in self.positions.items()},
+                    'stops': dict(self.stops), 'fills': list(self.fills)[-50:]}
+
+exchange = SimExchange()
+
+# =============================================================================
+# AUTH + FAULT INJECTION
+# =============================================================================
+nonces = OrderedDict()
+nonce_lock = threading.Lock()
+buckets = {}                 # api key -> [window start, calls]
+counters = {'requests': 0, 'auth_errors': 0, 'rate_limited': 0, 'injected_errors': 0}
+
+def fail(http_status, code, msg):
+    return jsonify({'code': code, 'msg': msg, 'data': []}), http_status
+
+def check_signature():
+    h = request.headers
+    if h.get('ACCESS-KEY') != SIM_API_KEY:
+        return fail(401, '152401', 'invalid ACCESS-KEY')
+    if h.get('ACCESS-PASSPHRASE') != SIM_PASSPHRASE:
+        return fail(401, '152403', 'invalid ACCESS-PASSPHRASE')
+    ts, nonce, sig = h.get('ACCESS-TIMESTAMP', ''), h.get('ACCESS-NONCE', ''), h.get('ACCESS-SIGN', '')
+    try:
+        if abs(time.time() - int(ts) / 1000) > SIM_TS_WINDOW:
+            return fail(401, '152408', 'request timestamp expired')
+    except ValueError:
+        return fail(401, '152408', 'invalid ACCESS-TIMESTAMP')
+    path = request.path + ('?' + request.query_string.decode() if request.query_string else '')
+    msg = path + request.method + ts + nonce + request.get_data(as_text=True)
+    mac = hmac.new(SIM_API_SECRET.encode(), msg.encode(), hashlib.sha256)
+    if not hmac.compare_digest(base64.b64encode(mac.hexdigest().encode()).decode(), sig):
+        return fail(401, '152409', 'signature verification failed')
+    with nonce_lock:
+        if not nonce or nonce in nonces:
+            return fail(401, '152410', 'duplicate ACCESS-NONCE')
+        nonces[nonce] = True
+        while len(nonces) > SIM_NONCES_MAX:
+            nonces.popitem(last=False)
+    return None
+
+def rate_limited(key):
+    if SimConfig.rate_limit <= 0:
+        return False
+    now = time.time()
+    with nonce_lock:
+        b = buckets.setdefault(key, [now, 0])
+        if now - b[0] >= 1:
+            b[0], b[1] = now, 0
+        b[1] += 1
+        return b[1] > SimConfig.rate_limit
+
+@app.before_request
+def inject_faults():
+    if not request.path.startswith('/api/'):
+        return None
+    counters['requests'] += 1
+    delay = SimConfig.latency_ms + random.uniform(0, SimConfig.jitter_ms)
+    if delay > 0:
+        time.sleep(delay / 1000)
+    if rate_limited(request.headers.get('ACCESS-KEY') or request.remote_addr):
+        counters['rate_limited'] += 1
+        return fail(429, '429', 'Too Many Requests')
+    if SimConfig.error_rate and random.random() < SimConfig.error_rate:
+        counters['injected_errors'] += 1
+        return fail(500, '500', 'injected error')
+    if not request.path.startswith('/api/v1/market/'):
+        err = check_signature()
+        if err:
+            counters['auth_errors'] += 1
+            return err
+    return None
+
+def body():
+    try:
+        return json.loads(request.get_data(as_text=True) or '{}')
+    except ValueError:
+        return {}
+
+# =============================================================================
+# PRIVATE WEBSOCKET - RFC 6455 subset: unfragmented text frames, ping/close
+# =============================================================================
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_CHANNELS = ('positions', 'orders', 'account')
+
+class WsHandler(socketserver.StreamRequestHandler):
+    """One client: handshake, signed login, subscribe, then text 'ping' -> 'pong'"""
+    def handle(self):
+        headers = {}
+        if not self.rfile.readline().startswith(b'GET '):
+            return
+        for line in iter(self.rfile.readline, b'\r\n'):
+            if not line:
+                return
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers.get('sec-websocket-key', '') + WS_GUID).encode()).digest())
+        self.wfile.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        self.send_lock = threading.Lock()
+        self.logged_in = False
+        self.channels = set()
+        ws_hub.join(self)
+        try:
+            while True:
+                frame = self.recv_frame()
+                if frame is None or frame[0] == 0x8:
+                    return
+                if frame[0] == 0x9:
+                    self.send_frame(0xA, frame[1])
+                elif frame[0] == 0x1:
+                    self.on_text(frame[1].decode())
+        except (OSError, ValueError):
+            pass
+        finally:
+            ws_hub.leave(self)
+
+    def recv_frame(self):
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        n = head[1] & 0x7f
+        if n == 126:
+            n = struct.unpack('>H', self.rfile.read(2))[0]
+        elif n == 127:
+            n = struct.unpack('>Q', self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else None
+        payload = self.rfile.read(n)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return head[0] & 0x0f, payload
+
+    def send_frame(self, opcode, payload):
+        n = len(payload)
+        head = bytes([0x80 | opcode]) + (bytes([n]) if n < 126 else struct.pack('>BH', 126, n) if n < 65536
+                                         else struct.pack('>BQ', 127, n))
+        with self.send_lock:
+            self.wfile.write(head + payload)
+
+    def send_json(self, msg):
+        self.send_text(json.dumps(msg))
+
+    def send_text(self, text):
+        if not ws_hub.muted:
+            self.send_frame(0x1, text.encode())
+
+    def on_text(self, text):
+        if text == 'ping':
+            return self.send_text('pong')
+        msg = json.loads(text)
+        if msg.get('op') == 'login':
+            a = (msg.get('args') or [{}])[0]
+            mac = hmac.new(SIM_API_SECRET.encode(), ('/users/self/verify' + 'GET' + a.get('timestamp', '') +
+                                                     a.get('nonce', '')).encode(), hashlib.sha256)
+            if (a.get('apiKey') != SIM_API_KEY or a.get('passphrase') != SIM_PASSPHRASE or
+                    not hmac.compare_digest(base64.b64encode(mac.hexdigest().encode()).decode(), a.get('sign', ''))):
+                counters['auth_errors'] += 1
+                return self.send_json({'event': 'error', 'code': '152409', 'msg': 'login failed'})
+            self.logged_in = True
+            return self.send_json({'event': 'login', 'code': '0', 'msg': ''})
+        if msg.get('op') == 'subscribe':
+            for arg in msg.get('args', []):
+                if not self.logged_in or arg.get('channel') not in WS_CHANNELS:
+                    return self.send_json({'event': 'error', 'code': '152411', 'msg': f"cannot subscribe {arg}"})
+                self.channels.add(arg['channel'])
+                self.send_json({'event': 'subscribe', 'arg': arg})
+
+class WsHub:
+    """Open private-stream sockets; publish() pushes an instrument's changes to the subscribed ones"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.muted = False
+        self.pushes = 0
+        self.connects = 0
+
+    def join(self, client):
+        with self.lock:
+            self.clients.add(client)
+            self.connects += 1
+
+    def leave(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def publish(self, inst, fills=()):
+        with self.lock:
+            clients = [c for c in self.clients if c.channels]
+        if not clients or not inst:
+            return
+        row, available = exchange.push_rows(inst)
+        msgs = {
+            'positions': {'arg': {'channel': 'positions'}, 'data': [row]},
+            'orders': {'arg': {'channel': 'orders'}, 'data': [
+                {'orderId': f['orderId'], 'instId': f['instId'], 'side': f['side'], 'orderType': 'market',
+                 'state': 'filled', 'filledSize': str(f['size']), 'averagePrice': str(f['price'])} for f in fills if f]},
+            'account': {'arg': {'channel': 'account'}, 'data': {'details': [{'currency': 'USDT', 'available': str(available)}]}},
+        }
+        for c in clients:
+            for channel, msg in msgs.items():
+                if channel in c.channels and msg['data']:
+                    try:
+                        c.send_json(msg)
+                        self.pushes += 1
+                    except OSError:
+                        pass
+
+    def drop(self):
+        """Close every socket, as an exchange-side disconnect"""
+        with self.lock:
+            clients = list(self.clients)
+        for c in clients:
+            try:
+                c.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return len(clients)
+
+    def describe(self):
+        with self.lock:
+            return {'clients': len(self.clients), 'connects': self.connects, 'pushes': self.pushes, 'muted': self.muted}
+
+class WsServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+ws_hub = WsHub()
+
+# =============================================================================
+# BLOFIN API SUBSET
+# =============================================================================
+@app.route('/api/v1/market/tickers', methods=['GET'])
+def tickers():
+    inst = request.args.get('instId')
+    insts = [inst] if inst else sorted(exchange.prices)
+    return jsonify({'code': '0', 'msg': '', 'data': [{'instId': i, 'last': str(exchange.price(i))} for i in insts]})
+
+@app.route('/api/v1/asset/balances', methods=['GET'])
+def balances():
+    with exchange.lock:
+        cash, available = exchange.cash, exchange.available()
+    return jsonify({'code': '0', 'msg': '', 'data': [
+        {'currency': 'USDT', 'balance': str(round(cash, 8)), 'available': str(round(available, 8))}]})
+
+@app.route('/api/v1/account/positions', methods=['GET'])
+def positions():
+    rows = exchange.position_rows()
+    inst = request.args.get('instId')
+    return jsonify({'code': '0', 'msg': '', 'data': [r for r in rows if not inst or r['instId'] == inst]})
+
+@app.route('/api/v1/account/set-leverage', methods=['POST'])
+def set_leverage():
+    d = body()
+    try:
+        lev = int(d['leverage'])
+    except (KeyError, ValueError):
+        return fail(200, '152001', 'invalid leverage')
+    with exchange.lock:
+        exchange.leverage[(d.get('instId'), d.get('marginMode', 'isolated'))] = lev
+    return jsonify({'code': '0', 'msg': '', 'data': {'instId': d.get('instId'), 'leverage': str(lev),
+                                                      'marginMode': d.get('marginMode')}})
+
+@app.route('/api/v1/trade/order', methods=['POST'])
+def order():
+    d = body()
+    try:
+        size = float(d['size'])
+        side = d['side']
+        inst = d['instId']
+    except (KeyError, ValueError):
+        return fail(200, '152002', 'invalid order parameters')
+    if side not in ('buy', 'sell') or size <= 0 or d.get('orderType', 'market') != 'market':
+        return fail(200, '152002', 'only market buy/sell with size > 0 is simulated')
+    sl = float(d['slTriggerPrice']) if d.get('slTriggerPrice') else None
+    fill = exchange.order(inst, side, size, sl, d.get('marginMode', 'isolated'))
+    if fill is None:
+        return fail(200, '102022', 'insufficient balance')
+    ws_hub.publish(inst, [fill])
+    return jsonify({'code': '0', 'msg': '', 'data': [{'orderId': fill['orderId'], 'clientOrderId': d.get('clientOrderId', ''),
+                                                       'code': '0', 'msg': ''}]})
+
+@app.route('/api/v1/trade/order-tpsl', methods=['POST'])
+def order_tpsl():
+    d = body()
+    try:
+        sl = float(d['slTriggerPrice'])
+    except (KeyError, ValueError):
+        return fail(200, '152002', 'only stop-loss TPSL (slTriggerPrice) is simulated')
+    tpsl_id = exchange.add_stop(d.get('instId'), sl)
+    if tpsl_id is None:
+        return fail(200, '152004', 'no position for TPSL')
+    return jsonify({'code': '0', 'msg': '', 'data': {'tpslId': tpsl_id, 'clientOrderId': d.get('clientOrderId', ''),
+                                                      'code': '0', 'msg': ''}})
+
+@app.route('/api/v1/trade/cancel-tpsl', methods=['POST'])
+def cancel_tpsl():
+    d = body()
+    items = d if isinstance(d, list) else [d]
+    data = [{'tpslId': it.get('tpslId'), 'code': '0' if exchange.cancel_stop(it.get('instId'), it.get('tpslId')) else '152005',
+             'msg': ''} for it in items]
+    return jsonify({'code': '0' if all(x['code'] == '0' for x in data) else '1', 'msg': '', 'data': data})
+
+@app.route('/api/v1/trade/orders-tpsl-pending', methods=['GET'])
+def tpsl_pending():
+    return jsonify({'code': '0', 'msg': '', 'data': exchange.pending_stops(request.args.get('instId'))})
+
+@app.route('/api/v1/trade/close-position', methods=['POST'])
+def close_position():
+    d = body()
+    fill = exchange.close(d.get('instId'))
+    if fill is None:
+        return fail(200, '152004', 'no position to close')
+    ws_hub.publish(d.get('instId'), [fill])
+    return jsonify({'code': '0', 'msg': '', 'data': {'instId': d.get('instId'), 'positionSide': d.get('positionSide', 'net')}})
+
+# =============================================================================
+# SIMULATOR CONTROL
+# =============================================================================
+@app.route('/sim/price', methods=['POST'])
+def sim_price():
+    d = request.get_json(force=True)
+    fill = exchange.set_price(d['instId'], float(d['price']))
+    if fill:
+        ws_hub.publish(d['instId'], [fill])
+    return jsonify({'instId': d['instId'], 'price': float(d['price']), 'stop_fill': fill})
+
+@app.route('/sim/position', methods=['POST'])
+def sim_position():
+    d = request.get_json(force=True)
+    fill = exchange.seed_position(d['instId'], d['side'], float(d['size']), float(d['price']),
+                                  float(d['stop']) if d.get('stop') else None, int(d.get('leverage', 1)))
+    ws_hub.publish(d['instId'], [fill])
+    return jsonify(fill)
+
+@app.route('/sim/config', methods=['POST'])
+def sim_config():
+    return jsonify(SimConfig.update(request.get_json(force=True)))
+
+@app.route('/sim/reset', methods=['POST'])
+def sim_reset():
+    d = request.get_json(silent=True) or {}
+    was_open = list(exchange.snapshot()['positions'])
+    exchange.reset(float(d.get('balance', 1000)))
+    for k in counters:
+        counters[k] = 0
+    for inst in was_open:
+        ws_hub.publish(inst)
+    return jsonify(exchange.snapshot())
+
+@app.route('/sim/ws', methods=['POST'])
+def sim_ws():
+    d = request.get_json(force=True)
+    if 'mute' in d:
+        ws_hub.muted = bool(d['mute'])
+    dropped = ws_hub.drop() if d.get('drop') else 0
+    return jsonify(dict(ws_hub.describe(), dropped=dropped))
+
+@app.route('/sim/state', methods=['GET'])
+def sim_state():
+    return jsonify(dict(exchange.snapshot(), config=SimConfig.to_dict(), counters=counters, ws=ws_hub.describe()))
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Local BloFin REST simulator')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8790)
+    p.add_argument('--balance', type=float, default=1000.0)
+    p.add_argument('--price', action='append', default=[], help='INSTID=PRICE starting price (repeatable)')
+    p.add_argument('--latency', type=float, default=0.0, help='ms added to every API call')
+    p.add_argument('--jitter', type=float, default=0.0, help='+ uniform(0, jitter) ms')
+    p.add_argument('--error-rate', type=float, default=0.0, help='share of API calls answered 500')
+    p.add_argument('--rate-limit', type=int, default=0, help='API calls per second per key (0 = off)')
+    p.add_argument('--slippage', type=float, default=0.0)
+    p.add_argument('--ws-port', type=int, default=0, help='private WebSocket port (0 = off)')
+    args = p.parse_args(argv)
+
+    exchange.reset(args.balance)
+    for spec in args.price:
+        inst, px = spec.split('=')
+        exchange.set_price(inst.upper(), float(px))
+    SimConfig.update({'latency_ms': args.latency, 'jitter_ms': args.jitter, 'error_rate': args.error_rate,
+                      'rate_limit': args.rate_limit, 'slippage': args.slippage})
+    print(f"[SIM] BloFin simulator on http://{args.host}:{args.port} key={SIM_API_KEY} {SimConfig.to_dict()}")
+    if args.ws_port:
+        ws = WsServer((args.host, args.ws_port), WsHandler)
+        threading.Thread(target=ws.serve_forever, name='sim-ws', daemon=True).start()
+        print(f"[SIM] private WebSocket on ws://{args.host}:{args.ws_port}/ws/private")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
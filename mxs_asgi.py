@@ -0,0 +1,321 @@
+"""
+MXS ASGI - asyncio serving mode for the webhook bot
+- Same routes, state, stores, caches and strategy as mxs_webhook_bot; only
+  the serving layer changes, so both modes run the same trading code
+- A webhook holds no thread while it waits. It is parsed and deduplicated
+  on the event loop. Stale position/price caches are refreshed with an async
+  httpx client (single-flight per endpoint, same rate-limit buckets). The
+  signal then runs on its symbol's lane worker (SignalQueue) while the
+  request awaits the outcome. Threads in use = symbols executing, however
+  many webhooks or slow exchange calls are in flight.
+- WEBHOOK_MODE=queue still acks with 202 at once
+- Routes that only read memory (/ready, /metrics, /latency, /signals/<id>,
+  and /status, /, /dashboard.json unless STATE_BACKEND=sqlite) run inline;
+  routes that touch sqlite (/logs, the views above under the shared store)
+  or take a symbol's lock (/close, /set_trend, /reset, ...) go to the Flask
+  app on a small thread pool; /events is a native async SSE stream (no
+  thread per tab)
+
+Usage:
+  uvicorn mxs_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import io
+import sys
+import json
+import logging
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+import mxs_webhook_bot as bot
+
+bot.native_sse = True     # /events below is async, so the dashboard streams here
+
+# memory-only routes; under STATE_BACKEND=sqlite the snapshot views re-read the shared store first
+INLINE_ROUTES = ('/ready', '/metrics', '/latency') + (
+    ('/status', '/', '/dashboard.json') if bot.STATE_BACKEND != 'sqlite' else ())
+flask_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='asgi-flask')
+
+# =============================================================================
+# ASYNC EXCHANGE CLIENT - reads only; orders stay on the lane workers
+# =============================================================================
+class AsyncBlofin:
+    """
+    Signed GETs over one pooled httpx.AsyncClient. Identical GETs in flight
+    share one call, keyed like bot.SingleFlight by the write generation, and
+    every call takes a 'read' token from the bot's rate limiter first.
+    """
+    def __init__(self):
+        self.client = None
+        self.flights = {}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(base_url=bot.BASE_URL, timeout=bot.BLOFIN_TIMEOUT,
+                                        limits=httpx.Limits(max_connections=bot.BLOFIN_POOL_SIZE * 10))
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+
+    async def get(self, endpoint):
+        key = (endpoint, bot.singleflight.generation)
+        task = self.flights.get(key)
+        if task is None:
+            task = self.flights[key] = asyncio.ensure_future(self._get(endpoint))
+            task.add_done_callback(lambda _: self.flights.pop(key, None))
+        else:
+            bot.singleflight_shared.inc(endpoint.split('?')[0])
+        return await asyncio.shield(task)
+
+    async def _get(self, endpoint):
+        path = endpoint.split('?')[0]
+        try:
+            await self.throttle()
+        except bot.RateLimited as e:
+            bot.log('API ERROR', 'GET %s: %s', endpoint, e, level=logging.ERROR)
+            return {'code': '-1', 'msg': str(e)}
+        stats = bot.get_endpoint_stats(path)
+        t0 = time.perf_counter()
+        try:
+            r = (await self.client.get(endpoint, headers=bot.signed_headers('GET', endpoint))).json()
+        except Exception as e:
+            stats.observe((time.perf_counter() - t0) * 1000, error=True)
+            bot.log('API ERROR', 'GET %s: %s', endpoint, e, level=logging.ERROR)
+            return {'code': '-1', 'msg': str(e)}
+        ms = (time.perf_counter() - t0) * 1000
+        stats.observe(ms, error=str(r.get('code')) != '0')
+        bot.capture.call('GET', endpoint, None, r, ms)
+        return r
+
+    async def throttle(self):
+        t0 = time.perf_counter()
+        deadline = t0 + bot.BLOFIN_TIMEOUT
+        while True:
+            wait = bot.rest_limiter.try_acquire('read')
+            if not wait:
+                break
+            if time.perf_counter() + wait > deadline:
+                raise bot.RateLimited(f"rest bucket empty for {bot.BLOFIN_TIMEOUT}s (read)")
+            await asyncio.sleep(wait)
+        waited = (time.perf_counter() - t0) * 1000
+        if waited > 1:
+            bot.throttled.inc('read')
+            bot.throttle_stats['read'].observe(waited)
+
+    async def refresh_positions(self):
+        r = await self.get('/api/v1/account/positions')
+        if r.get('code') == '0':
+            bot.account_cache.set_positions({p.get('instId'): bot.parse_position(p) for p in r.get('data', [])})
+            return True
+        return False
+
+    async def refresh_price(self, symbol):
+        r = await self.get(f'/api/v1/market/tickers?instId={symbol}')
+        for t in r.get('data', []) if r.get('code') == '0' else []:
+            if t.get('instId') == symbol:
+                bot.price_cache.set(symbol, float(t['last']))
+
+blofin = AsyncBlofin()
+
+async def prefetch(symbol, data):
+    """Warm what handle_signal() reads first, so the lane worker finds it cached"""
+    reads = []
+    if bot.account_cache.get_position(symbol) is None:
+        reads.append(blofin.refresh_positions())
+    if not data.get('price') and bot.price_cache.get(symbol) is None:
+        reads.append(blofin.refresh_price(symbol))
+    if reads:
+        await asyncio.gather(*reads)
+
+# =============================================================================
+# WEBHOOK
+# =============================================================================
+async def accept_webhook(raw_data):
+    """Async counterpart of bot.accept_webhook() - same responses, no thread held while waiting"""
+    t0 = time.perf_counter()
+    data, err = bot.parse_webhook(raw_data)
+    bot.webhook_stats['parse'].observe((time.perf_counter() - t0) * 1000)
+    if err:
+        bot.log('WEBHOOK', 'Unparseable body: %.500s', raw_data, level=logging.WARNING)
+        bot.log_signal(f"JSON PARSE ERROR: {err}")
+        return {'error': 'Invalid JSON'}, 400
+    if bot.CANDLE_ENGINE != 'off' and isinstance(data, dict):
+        gated = bot.engine_gate(data)
+        if gated:
+            return gated
+    if bot.DEDUP_TTL <= 0 or not isinstance(data, dict):
+        return await route_webhook(data)
+
+    key = bot.alert_key(data)
+    entry, new = bot.dedup_cache.reserve(key)
+    if not new:
+        loop = asyncio.get_running_loop()
+        settled = loop.create_future()
+        bot.dedup_cache.notify(entry, lambda: loop.call_soon_threadsafe(
+            lambda: settled.done() or settled.set_result(None)))
+        try:
+            await asyncio.wait_for(settled, bot.DEDUP_WAIT)
+        except asyncio.TimeoutError:
+            return {'error': 'Duplicate of an alert still being processed'}, 409
+        body, code = entry[2]
+        bot.log_signal(f"DUPLICATE: {data.get('signal')} ({key}) -> {code}", str(data.get('instId') or '').upper() or None)
+        return dict(body, duplicate=True), code
+    # shielded: if the sender hangs up, the signal still runs and its outcome still settles the key
+    return await asyncio.shield(asyncio.ensure_future(settle(key, data)))
+
+async def settle(key, data):
+    try:
+        outcome = await route_webhook(data)
+    except Exception:
+        bot.dedup_cache.release(key)
+        raise
+    if outcome[1] >= 500:
+        bot.dedup_cache.release(key)
+    else:
+        bot.dedup_cache.finish(key, outcome)
+    return outcome
+
+async def route_webhook(data):
+    signal = str(data.get('signal', '')).upper().strip()
+    if not bot.signal_kind(signal):
+        bot.log_signal(f"UNKNOWN SIGNAL: {signal}")
+        return {'error': f'Unknown signal: {signal}'}, 400
+    st = bot.get_state(data.get('instId'))
+    if st is None:
+        bot.log_signal(f"UNKNOWN SYMBOL: {data.get('instId')}")
+        return {'error': f"Unknown instId: {data.get('instId')}"}, 400
+    if bot.WEBHOOK_MODE == 'queue':
+        return {'status': 'queued', 'id': bot.signal_queue.submit(st.symbol, data, bot.capture.queued())}, 202
+
+    await prefetch(st.symbol, data)
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def on_done(rec):
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result((rec['result'], rec['http_status'])))
+
+    bot.signal_queue.submit(st.symbol, data, on_done)
+    return await done
+
+# =============================================================================
+# ASGI PLUMBING
+# =============================================================================
+async def read_body(receive):
+    chunks = []
+    while True:
+        msg = await receive()
+        chunks.append(msg.get('body', b''))
+        if not msg.get('more_body'):
+            return b''.join(chunks)
+
+async def respond(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def respond_json(send, status, obj):
+    await respond(send, status, json.dumps(obj).encode(), [('content-type', 'application/json')])
+
+def call_flask(scope, body, query_string=None):
+    """Run one request through the Flask app (WSGI) and return (status, headers, body)"""
+    server = scope.get('server') or ('127.0.0.1', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'], 'SCRIPT_NAME': '', 'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1') if query_string is None else query_string,
+        'SERVER_NAME': server[0], 'SERVER_PORT': str(server[1]), 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0], 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': scope.get('scheme', 'http'), 'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            key = 'HTTP_' + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = int(status.split()[0]), headers
+
+    result = bot.app(environ, start_response)
+    try:
+        out = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], out
+
+async def events(receive, send):
+    """Async /events: same payloads as the Flask stream, but a tab costs no thread (so no stream cap)"""
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+    gone = asyncio.ensure_future(receive())     # only message left to come is http.disconnect
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+        deadline = time.time() + bot.DASHBOARD_STREAM_SECS
+        sent, last_write = None, time.time()
+        while time.time() < deadline and not gone.done():
+            if bot.STATE_BACKEND == 'sqlite':
+                payload = await asyncio.get_running_loop().run_in_executor(flask_pool, bot.dashboard_payload)
+            else:
+                payload = bot.dashboard_payload()
+            if payload != sent:
+                await send({'type': 'http.response.body', 'body': f"data: {payload}\n\n".encode(), 'more_body': True})
+                sent, last_write = payload, time.time()
+            elif time.time() - last_write >= bot.DASHBOARD_HEARTBEAT:
+                await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                last_write = time.time()
+            await asyncio.wait([gone], timeout=bot.DASHBOARD_DEBOUNCE)
+        if not gone.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        gone.cancel()
+
+async def lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg['type'] == 'lifespan.startup':
+            await blofin.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif msg['type'] == 'lifespan.shutdown':
+            await blofin.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'], scope['method']
+    if path == '/webhook' and method == 'POST':
+        raw_data = (await read_body(receive)).decode('utf-8', 'replace')
+        bot.log('WEBHOOK', 'Raw: %.500s', raw_data, level=logging.DEBUG)
+        with bot.capture.webhook(raw_data) as rec:
+            body, code = await accept_webhook(raw_data)
+            bot.capture.answer(rec, body, code)
+        bot.webhook_responses.inc(str(code))
+        return await respond_json(send, code, body)
+    if path == '/events' and method == 'GET':
+        return await events(receive, send)
+
+    body = await read_body(receive)
+    query = None
+    if path == '/status' and method == 'GET':
+        args = parse_qsl(scope['query_string'].decode('latin-1'))
+        if ('fresh', '1') in args:
+            await blofin.refresh_positions()
+            query = urlencode([(k, v) for k, v in args if k != 'fresh'])
+    if path in INLINE_ROUTES or path.startswith('/signals/'):
+        status, headers, out = call_flask(scope, body, query)
+    else:
+        status, headers, out = await asyncio.get_running_loop().run_in_executor(flask_pool, call_flask, scope, body)
+    await respond(send, status, out, headers)
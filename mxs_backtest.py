@@ -0,0 +1,271 @@
+"""
+MXS Backtest - replay recorded alerts through the live strategy logic
+- Signals: JSONL, one TradingView alert per line plus its time, e.g.
+    {"ts": "2025-01-03T08:00:00Z", "signal": "4H_BULL_BREAK", "price": 1.02, "swing_low": 0.97, "swing_high": 1.1}
+  ("ts"/"time" may also be epoch seconds or ms; lines with another instId are skipped)
+- Bars: 1-minute OHLCV CSV with a header (ts/timestamp/time, open, high, low,
+  close in any order, epoch s or ms), or a .npy of [ts, open, high, low, close] rows
+- --engine instead of --signals: alerts come from the in-process candle
+  engine (mxs_candles) run over the same bars, i.e. no TradingView at all
+- Every alert goes through mxs_strategy.decide() exactly as in the bot; this
+  file only plays the exchange: fills at the alert price, stop-outs between
+  alerts, fees and P&L
+- Stop-outs are found with one vectorised pass over the bars between two
+  alerts (the stop can only move on an alert), so months of 1m data run in
+  well under a second
+
+Usage:
+  python mxs_backtest.py --signals alerts.jsonl --bars FARTCOIN-USDT-1m.csv [--json result.json]
+  python mxs_backtest.py --engine --bars FARTCOIN-USDT-1m.csv
+"""
+
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from mxs_strategy import (LEVERAGE, STOP_BUFFER, MAX_STOP_PCT, POSITION_SIZE_PCT,
+                          SymbolConfig, SymbolState, parse_alert, decide)
+from mxs_candles import PIVOT_BARS, engine_signals
+
+TAKER_FEE = 0.0006        # BloFin taker, charged on entry and exit notional
+BAR_COLUMNS = {'ts': 0, 'timestamp': 0, 'time': 0, 'open': 1, 'high': 2, 'low': 3, 'close': 4}
+
+# =============================================================================
+# DATA
+# =============================================================================
+def to_epoch(value):
+    """Epoch seconds from epoch s/ms or an ISO-8601 string"""
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    value = str(value).strip()
+    try:
+        return to_epoch(float(value))
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+def load_bars(path):
+    """(n, 5) float64 array of [ts, open, high, low, close] sorted by ts; .npy files are memory-mapped"""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+
+    with open(path, 'r') as f:
+        header = [h.strip().lower() for h in f.readline().split(',')]
+    cols = {}
+    for i, name in enumerate(header):
+        if name in BAR_COLUMNS and BAR_COLUMNS[name] not in cols:
+            cols[BAR_COLUMNS[name]] = i
+    if len(cols) != 5:
+        raise ValueError(f"{path}: need ts, open, high, low, close columns, got {header}")
+
+    bars = np.loadtxt(path, delimiter=',', skiprows=1, usecols=[cols[k] for k in range(5)], ndmin=2)
+    if len(bars) and bars[0, 0] > 1e11:
+        bars[:, 0] /= 1000.0
+    return bars[np.argsort(bars[:, 0], kind='stable')]
+
+def load_signals(path, symbol=None):
+    """[(ts, alert), ...] sorted by time"""
+    signals = []
+    with open(path, 'r') as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if symbol and data.get('instId') and data['instId'].upper() != symbol:
+                continue
+            ts = data.get('ts', data.get('time'))
+            if ts is None:
+                raise ValueError(f"{path}:{n}: alert has no ts/time")
+            signals.append((to_epoch(ts), data))
+    signals.sort(key=lambda s: s[0])
+    return signals
+
+# =============================================================================
+# SIMULATION
+# =============================================================================
+class SimPosition:
+    __slots__ = ('side', 'size', 'entry', 'stop', 'opened', 'entry_type')
+
+    def __init__(self, side, size, entry, stop, opened, entry_type):
+        self.side = side
+        self.size = size
+        self.entry = entry
+        self.stop = stop
+        self.opened = opened
+        self.entry_type = entry_type
+
+def first_stop_hit(pos, low, high, start, end):
+    """Index of the first bar in [start, end) that trades through pos.stop, or None"""
+    if end <= start:
+        return None
+    if pos.side == 'LONG':
+        hit = low[start:end] <= pos.stop
+    else:
+        hit = high[start:end] >= pos.stop
+    k = int(hit.argmax())
+    return start + k if hit[k] else None
+
+def run_backtest(signals, bars, cfg=None, balance=1000.0, fee=TAKER_FEE, slippage=0.0,
+                 entry_types=('BREAK', 'CONTINUATION'), log=None):
+    """
+    Replay signals over bars for one symbol.
+    - cfg: SymbolConfig (leverage, stop_buffer, max_stop_pct, size_pct)
+    - slippage: fraction of price lost on every fill
+    - entry_types: which ENTER actions to take ('BREAK', 'CONTINUATION')
+    - log: optional callable for the strategy's signal log
+    Returns {'summary': {...}, 'trades': [...]}.
+    """
+    cfg = cfg or SymbolConfig('BACKTEST')
+    st = SymbolState(cfg)
+    log = log or (lambda msg: None)
+
+    ts, opens, high, low, close = (np.asarray(bars[:, i], dtype=np.float64) for i in range(5))
+    bar_secs = float(np.median(np.diff(ts[:1000]))) if len(ts) > 1 else 60.0
+    closed_at = ts + bar_secs
+
+    equity = float(balance)
+    curve = [equity]
+    trades = []
+    pos = None
+    checked = 0     # bars before this index have been checked for stop-outs
+    counts = {'signals': 0, 'entries': 0, 'trails': 0, 'skipped_entries': 0}
+
+    def close_pos(when, px, reason):
+        nonlocal equity, pos
+        d = 1 if pos.side == 'LONG' else -1
+        fill = px * (1 - d * slippage)
+        pnl = d * (fill - pos.entry) * pos.size - fee * pos.size * (pos.entry + fill)
+        equity += pnl
+        curve.append(equity)
+        trades.append({'side': pos.side, 'type': pos.entry_type, 'opened': pos.opened, 'closed': when,
+                       'entry': pos.entry, 'exit': fill, 'stop': pos.stop, 'size': pos.size,
+                       'pnl': round(pnl, 6), 'equity': round(equity, 6), 'reason': reason})
+        pos = None
+
+    def check_stops(end):
+        nonlocal checked
+        if pos is not None:
+            k = first_stop_hit(pos, low, high, checked, end)
+            if k is not None:
+                # gap through the stop fills at the bar's open
+                px = min(pos.stop, opens[k]) if pos.side == 'LONG' else max(pos.stop, opens[k])
+                close_pos(float(closed_at[k]), px, 'STOP')
+                st.record_exit()
+        checked = max(checked, end)
+
+    for sig_ts, data in signals:
+        end = int(np.searchsorted(closed_at, sig_ts, side='right'))   # bars complete at alert time
+        check_stops(end)
+        signal, kind, price, swing_low, swing_high = parse_alert(data)
+        price = price or (float(close[end - 1]) if end else 0)
+        if not price:
+            continue
+        counts['signals'] += 1
+
+        _, _, action = decide(st, kind, signal, swing_low, swing_high,
+                              pos.side if pos else None, log, verbose=False)
+        if action is None:
+            continue
+        if action[0] == 'EXIT':
+            close_pos(sig_ts, price, action[1])
+            st.record_exit()
+        elif action[0] == 'TRAIL':
+            pos.stop = action[2]
+            counts['trails'] += 1
+        elif action[0] == 'ENTER':
+            _, direction, swing_px, entry_type = action
+            if entry_type not in entry_types:
+                counts['skipped_entries'] += 1
+                continue
+            if pos is not None:
+                close_pos(sig_ts, price, 'REVERSE')
+            stop = st.stop_for(price, swing_px, direction, verbose=False)
+            fill = price * (1 + slippage if direction == 'LONG' else 1 - slippage)
+            size = int(equity * cfg.size_pct * cfg.leverage / fill)
+            if size <= 0:
+                continue
+            pos = SimPosition(direction, size, fill, stop, sig_ts, entry_type)
+            st.record_entry(direction, price, stop)
+            counts['entries'] += 1
+
+    check_stops(len(ts))
+    open_trade = None
+    if pos is not None:
+        d = 1 if pos.side == 'LONG' else -1
+        open_trade = {'side': pos.side, 'entry': pos.entry, 'stop': pos.stop, 'size': pos.size,
+                      'unrealized': round(d * (float(close[-1]) - pos.entry) * pos.size, 6)}
+
+    return {'summary': summarize(trades, curve, balance, counts, open_trade), 'trades': trades}
+
+def summarize(trades, curve, balance, counts, open_trade):
+    curve = np.asarray(curve)
+    peaks = np.maximum.accumulate(curve)
+    pnl = np.array([t['pnl'] for t in trades])
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl <= 0]
+    reasons = {}
+    for t in trades:
+        reasons[t['reason']] = reasons.get(t['reason'], 0) + 1
+    return dict(counts, **{
+        'start_balance': balance,
+        'end_balance': round(float(curve[-1]), 6),
+        'return_pct': round((curve[-1] / balance - 1) * 100, 2),
+        'trades': len(trades),
+        'win_pct': round(len(wins) / len(trades) * 100, 1) if trades else 0.0,
+        'profit_factor': round(float(wins.sum() / -losses.sum()), 2) if losses.sum() < 0 else None,
+        'max_dd_pct': round(float(((peaks - curve) / peaks).max() * 100), 2),
+        'exits': reasons,
+        'open_position': open_trade,
+    })
+
+# =============================================================================
+# CLI
+# =============================================================================
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Replay recorded alerts through the MXS strategy over 1m bars')
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument('--signals', help='alerts JSONL')
+    src.add_argument('--engine', action='store_true', help='generate alerts from the bars with the candle engine')
+    p.add_argument('--pivot', type=int, default=PIVOT_BARS, help='candle engine: bars each side of a swing')
+    p.add_argument('--bars', required=True, help='1m OHLCV CSV or .npy')
+    p.add_argument('--symbol', default=None, help='only alerts for this instId')
+    p.add_argument('--balance', type=float, default=1000.0)
+    p.add_argument('--leverage', type=int, default=LEVERAGE)
+    p.add_argument('--stop-buffer', type=float, default=STOP_BUFFER)
+    p.add_argument('--max-stop', type=float, default=MAX_STOP_PCT)
+    p.add_argument('--size-pct', type=float, default=POSITION_SIZE_PCT)
+    p.add_argument('--fee', type=float, default=TAKER_FEE)
+    p.add_argument('--slippage', type=float, default=0.0)
+    p.add_argument('--entries', default='BREAK,CONTINUATION', help='entry types to take')
+    p.add_argument('--json', help='write summary + trades here')
+    p.add_argument('-v', '--verbose', action='store_true', help='print the strategy log')
+    args = p.parse_args(argv)
+
+    symbol = args.symbol.upper() if args.symbol else None
+    t0 = time.perf_counter()
+    bars = load_bars(args.bars)
+    signals = engine_signals(bars, symbol or 'BACKTEST', args.pivot) if args.engine else load_signals(args.signals, symbol)
+    t1 = time.perf_counter()
+    cfg = SymbolConfig(symbol or 'BACKTEST', args.leverage, args.stop_buffer, args.max_stop, size_pct=args.size_pct)
+    result = run_backtest(signals, bars, cfg, args.balance, args.fee, args.slippage,
+                          tuple(x.strip().upper() for x in args.entries.split(',')),
+                          log=print if args.verbose else None)
+    t2 = time.perf_counter()
+
+    s = result['summary']
+    print(f"{len(bars)} bars, {len(signals)} alerts - load {t1 - t0:.2f}s, run {t2 - t1:.3f}s")
+    print("| Return | Trades | Win% | Max DD | PF |")
+    print(f"| {s['return_pct']:+,.2f}% | {s['trades']} | {s['win_pct']}% | {s['max_dd_pct']}% | {s['profit_factor']} |")
+    print(f"exits: {s['exits']}, trails: {s['trails']}, open: {s['open_position']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
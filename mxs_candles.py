@@ -0,0 +1,191 @@
+"""
+MXS Candles - in-process 30M/4H market structure from the 1m kline stream
+- CandleEngine.on_candle() takes every 1m candle push, including repeated
+  updates of the minute in progress. Each push is O(1) per timeframe: the
+  open 30M/4H bar takes max/min/last, and it closes when the bucket's last
+  minute is confirmed or the next bucket starts.
+- On each closed bar, SwingTracker confirms pivot swings (PIVOT_BARS on
+  each side). A close through the latest swing high or low is a BREAK when
+  it goes against that timeframe's trend, or a CONT(inuation) when it goes
+  with it. A new 4H swing with no break is a 4H_UPDATE.
+- Events come out as alert dicts shaped like the TradingView payloads, so
+  the bot and the backtest run them through the same parse_alert()/decide().
+  Nothing in here talks to the exchange.
+"""
+
+from collections import deque
+
+PIVOT_BARS = 3                                  # bars each side of a swing high/low
+TIMEFRAMES = (('30M', 1800), ('4H', 14400))     # (label, seconds), lowest first
+HTF = '4H'                                      # swings for stops and trails, 4H_UPDATE events
+MINUTE = 60
+
+class Bar:
+    __slots__ = ('ts', 'open', 'high', 'low', 'close')
+
+    def __init__(self, ts, open_, high, low, close):
+        self.ts = ts
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+
+    def to_list(self):
+        return [self.ts, self.open, self.high, self.low, self.close]
+
+class BarBuilder:
+    """The open bar of one timeframe, built from 1m candle pushes"""
+    def __init__(self, secs):
+        self.secs = secs
+        self.bar = None
+        self.closed_through = -1     # bucket start of the last bar handed out
+
+    def update(self, ts, o, h, l, c, confirmed):
+        """Apply one 1m push (ts = minute start, epoch s). Returns the bar it closed, or None."""
+        start = ts - ts % self.secs
+        if start <= self.closed_through:
+            return None              # late push for a bar already closed
+        done = None
+        bar = self.bar
+        if bar is not None and start != bar.ts:
+            done, bar = bar, None
+            self.closed_through = done.ts
+        if bar is None:
+            bar = self.bar = Bar(start, o, h, l, c)
+        else:
+            if h > bar.high:
+                bar.high = h
+            if l < bar.low:
+                bar.low = l
+            bar.close = c
+        if done is None and confirmed and ts + MINUTE >= start + self.secs:
+            # the bucket's last minute is final: close now rather than on the next push
+            self.closed_through = start
+            self.bar = None
+            return bar
+        return done
+
+class SwingTracker:
+    """Swing levels, trend and break/continuation events on one timeframe's closed bars"""
+    def __init__(self, pivot=PIVOT_BARS):
+        self.pivot = pivot
+        self.window = deque(maxlen=2 * pivot + 1)
+        self.trend = None
+        self.swing_high = None
+        self.swing_low = None
+        self.high_broken = False     # each swing is broken once
+        self.low_broken = False
+        self.last_bar = None
+
+    def on_bar(self, bar):
+        """Feed one closed bar, returns the events it produced: BULL_BREAK, BEAR_CONT, NEW_SWING, ..."""
+        events = []
+        if self.swing_high is not None and not self.high_broken and bar.close > self.swing_high:
+            events.append('BULL_CONT' if self.trend == 'BULL' else 'BULL_BREAK')
+            self.trend, self.high_broken = 'BULL', True
+        elif self.swing_low is not None and not self.low_broken and bar.close < self.swing_low:
+            events.append('BEAR_CONT' if self.trend == 'BEAR' else 'BEAR_BREAK')
+            self.trend, self.low_broken = 'BEAR', True
+
+        w = self.window
+        w.append(bar)
+        if len(w) == w.maxlen:
+            mid = w[self.pivot]
+            left, right = list(w)[:self.pivot], list(w)[self.pivot + 1:]
+            if all(mid.high > b.high for b in left) and all(mid.high >= b.high for b in right):
+                self.swing_high, self.high_broken = mid.high, False
+                events.append('NEW_SWING')
+            if all(mid.low < b.low for b in left) and all(mid.low <= b.low for b in right):
+                self.swing_low, self.low_broken = mid.low, False
+                if 'NEW_SWING' not in events:
+                    events.append('NEW_SWING')
+        self.last_bar = bar
+        return events
+
+    def describe(self):
+        return {'trend': self.trend, 'swing_low': self.swing_low, 'swing_high': self.swing_high,
+                'last_bar': self.last_bar.to_list() if self.last_bar else None}
+
+class CandleEngine:
+    """
+    30M/4H bars, swings and signals for one instrument. Not thread-safe: feed
+    it from one thread (the stream's).
+    """
+    def __init__(self, symbol, pivot=PIVOT_BARS, timeframes=TIMEFRAMES):
+        self.symbol = symbol
+        self.builders = {label: BarBuilder(secs) for label, secs in timeframes}
+        self.trackers = {label: SwingTracker(pivot) for label, _ in timeframes}
+        self.last_push = None
+
+    def seed(self, label, bars, open_bar=None):
+        """
+        Replay closed history bars [(ts, o, h, l, c)] of one timeframe, oldest
+        first, to restore swings and trend without emitting signals. Bars at or
+        before the last one seen are skipped, so it also fills a stream gap.
+        open_bar is the bar in progress, so its high/low include the minutes
+        before the stream connected. Returns the number of bars replayed.
+        """
+        tracker, builder = self.trackers[label], self.builders[label]
+        n = 0
+        for ts, o, h, l, c in bars:
+            if tracker.last_bar is not None and ts <= tracker.last_bar.ts:
+                continue
+            tracker.on_bar(Bar(ts, o, h, l, c))
+            builder.closed_through = max(builder.closed_through, ts)
+            if builder.bar is not None and builder.bar.ts <= ts:
+                builder.bar = None
+            n += 1
+        if open_bar and open_bar[0] > builder.closed_through:
+            ts, o, h, l, c = open_bar
+            bar = builder.bar
+            if bar is None or bar.ts < ts:
+                builder.bar = Bar(ts, o, h, l, c)
+            elif bar.ts == ts:
+                bar.open, bar.high, bar.low = o, max(bar.high, h), min(bar.low, l)
+        return n
+
+    def on_candle(self, ts, o, h, l, c, confirmed=False):
+        """One 1m candle push (ts = minute start, epoch s). Returns the alerts of any bar it closed."""
+        self.last_push = ts
+        alerts = []
+        for label, builder in self.builders.items():
+            bar = builder.update(ts, o, h, l, c, confirmed)
+            if bar is not None:
+                alerts += self.close_bar(label, bar)
+        return alerts
+
+    def close_bar(self, label, bar):
+        tracker = self.trackers[label]
+        alerts = []
+        for event in tracker.on_bar(bar):
+            if event == 'NEW_SWING':
+                if label == HTF and not any(a['signal'].startswith(label) for a in alerts):
+                    alerts.append(self.alert(label, 'UPDATE', bar))
+            else:
+                alerts.append(self.alert(label, event, bar))
+        return alerts
+
+    def alert(self, label, event, bar):
+        tracker = self.trackers[label]
+        return {
+            'signal': f'{label}_{event}',
+            'instId': self.symbol,
+            'price': bar.close,
+            'swing_low': tracker.swing_low,
+            'swing_high': tracker.swing_high,
+            'ts': bar.ts + self.builders[label].secs,
+            'alert_id': f'engine-{self.symbol}-{label}-{int(bar.ts)}-{event}',
+            'source': 'engine',
+        }
+
+    def describe(self):
+        return {label: t.describe() for label, t in self.trackers.items()}
+
+def engine_signals(bars, symbol='BACKTEST', pivot=PIVOT_BARS):
+    """[(ts, alert)] the engine emits over closed 1m bars [[ts, o, h, l, c], ...] - signals for the backtest"""
+    engine = CandleEngine(symbol, pivot)
+    out = []
+    for ts, o, h, l, c in bars:
+        for a in engine.on_candle(int(ts), float(o), float(h), float(l), float(c), confirmed=True):
+            out.append((a['ts'], a))
+    return out
@@ -0,0 +1,382 @@
+"""
+MXS Load Test - bursts of TradingView alerts at /webhook, latency per signal type
+- Target: a running bot (--url), or --spawn: starts blofin_sim.py and the bot
+  (gunicorn, or uvicorn + mxs_asgi with --server asgi) in a scratch directory
+  wired to each other, then tears both down
+- Payloads cover every strategy branch: 4H breaks, 4H updates, other 4H
+  signals, 30M breaks and 30M continuations, with a random-walk price and
+  swings per symbol
+- Reports p50/p95/p99/max latency, throughput and error rate per signal
+  type; in queue mode --follow also times each signal to completion
+- --probe polls /status alongside the load and reports its latency, to see
+  whether slow exchange calls starve the rest of the app
+- --out writes the run as JSON; --baseline compares against an earlier
+  file and exits 1 when p95, throughput or error rate regressed
+
+Usage:
+  python mxs_loadtest.py --spawn --bursts 5 --burst-size 200 --concurrency 16 --out bench.json
+  python mxs_loadtest.py --spawn --sim-latency 40 --baseline bench.json
+  python mxs_loadtest.py --spawn --server asgi --sim-latency 500 --concurrency 200 --probe 100
+  python mxs_loadtest.py --url http://127.0.0.1:5000 --symbols FARTCOIN-USDT,WIF-USDT
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# strategy branch -> alert name TradingView sends for it
+SIGNALS = {
+    '4H_BULL_BREAK': '4H_BULL_BREAK',
+    '4H_BEAR_BREAK': '4H_BEAR_BREAK',
+    '4H_UPDATE': '4H_SWING_UPDATE',
+    '4H_OTHER': '4H_BULL_IMBALANCE',
+    '30M_BULL_BREAK': '30M_BULL_BREAK',
+    '30M_BEAR_BREAK': '30M_BEAR_BREAK',
+    '30M_BULL_CONT': '30M_BULL_CONTINUATION',
+    '30M_BEAR_CONT': '30M_BEAR_CONTINUATION',
+}
+
+# =============================================================================
+# PAYLOADS
+# =============================================================================
+class PayloadGen:
+    """Realistic alerts: price random-walks per symbol, swings sit a few % either side"""
+    def __init__(self, symbols, mix, seed=None):
+        self.symbols = symbols
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.rng = random.Random(seed)
+        self.prices = {s: 1.0 for s in symbols}
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            sym = self.rng.choice(self.symbols)
+            px = self.prices[sym] = self.prices[sym] * (1 + self.rng.gauss(0, 0.002))
+            lo, hi = px * (1 - self.rng.uniform(0.003, 0.03)), px * (1 + self.rng.uniform(0.003, 0.03))
+        data = {'signal': SIGNALS[kind], 'instId': sym, 'price': round(px, 6)}
+        if kind.startswith('4H'):
+            data.update(swing_low=round(lo, 6), swing_high=round(hi, 6))
+        return kind, data
+
+def parse_mix(spec):
+    if not spec:
+        return {k: 1.0 for k in SIGNALS}
+    mix = {}
+    for part in spec.split(','):
+        kind, _, w = part.partition('=')
+        kind = kind.strip().upper()
+        if kind not in SIGNALS:
+            raise SystemExit(f"unknown signal type {kind}, expected one of {', '.join(SIGNALS)}")
+        mix[kind] = float(w or 1)
+    return mix
+
+# =============================================================================
+# LOAD
+# =============================================================================
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_type = {}
+
+    def add(self, kind, ms, ok, status, done_ms=None):
+        with self.lock:
+            r = self.by_type.setdefault(kind, {'ms': [], 'done_ms': [], 'errors': 0, 'status': {}})
+            r['ms'].append(ms)
+            if done_ms is not None:
+                r['done_ms'].append(done_ms)
+            if not ok:
+                r['errors'] += 1
+            r['status'][str(status)] = r['status'].get(str(status), 0) + 1
+
+_local = threading.local()
+
+def http():
+    s = getattr(_local, 'session', None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
+def follow(url, sig_id, timeout=30):
+    """Poll a queued signal until it finishes; returns queue + exec ms (None if it never did)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        rec = http().get(f"{url}/signals/{sig_id}", timeout=5).json()
+        if rec.get('status') in ('done', 'error'):
+            return rec.get('queue_ms', 0) + rec.get('exec_ms', 0)
+        time.sleep(0.005)
+    return None
+
+def fire(url, gen, rec, do_follow):
+    kind, data = gen.next()
+    t0 = time.perf_counter()
+    try:
+        r = http().post(f"{url}/webhook", json=data, timeout=30)
+        ms = (time.perf_counter() - t0) * 1000
+        ok = r.status_code < 300
+        done_ms = None
+        if ok and do_follow and r.status_code == 202:
+            done_ms = follow(url, r.json()['id'])
+            ok = done_ms is not None
+        rec.add(kind, ms, ok, r.status_code, done_ms)
+    except requests.RequestException as e:
+        rec.add(kind, (time.perf_counter() - t0) * 1000, False, type(e).__name__)
+
+def probe_status(url, symbol, interval, rec, stop):
+    """GET /status every interval seconds until stop is set"""
+    s = requests.Session()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            r = s.get(f"{url}/status", params={'instId': symbol}, timeout=30)
+            rec.add('STATUS', (time.perf_counter() - t0) * 1000, r.status_code == 200, r.status_code)
+        except requests.RequestException as e:
+            rec.add('STATUS', (time.perf_counter() - t0) * 1000, False, type(e).__name__)
+        stop.wait(interval)
+
+def run_load(url, gen, bursts, burst_size, concurrency, pause, do_follow, probe=None):
+    rec = Recorder()
+    probe_rec, stop = Recorder(), threading.Event()
+    if probe:
+        threading.Thread(target=probe_status, args=(url, gen.symbols[0], probe, probe_rec, stop), daemon=True).start()
+    started = time.perf_counter()
+    busy = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for b in range(bursts):
+            t0 = time.perf_counter()
+            list(pool.map(lambda _: fire(url, gen, rec, do_follow), range(burst_size)))
+            busy += time.perf_counter() - t0
+            if pause and b < bursts - 1:
+                time.sleep(pause)
+    stop.set()
+    return rec, time.perf_counter() - started, busy, probe_rec
+
+# =============================================================================
+# REPORT
+# =============================================================================
+def percentile(sorted_ms, p):
+    if not sorted_ms:
+        return None
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100 * len(sorted_ms) + 0.5)) - 1))
+    return round(sorted_ms[k], 2)
+
+def stats(ms, errors, busy, status=None, done_ms=None):
+    ms = sorted(ms)
+    out = {'count': len(ms), 'errors': errors, 'error_rate': round(errors / len(ms), 4) if ms else 0.0,
+           'throughput_rps': round(len(ms) / busy, 1) if busy else None,
+           'p50_ms': percentile(ms, 50), 'p95_ms': percentile(ms, 95), 'p99_ms': percentile(ms, 99),
+           'max_ms': round(ms[-1], 2) if ms else None,
+           'mean_ms': round(sum(ms) / len(ms), 2) if ms else None}
+    if status is not None:
+        out['status'] = status
+    if done_ms:
+        done_ms = sorted(done_ms)
+        out.update(done_p50_ms=percentile(done_ms, 50), done_p95_ms=percentile(done_ms, 95),
+                   done_p99_ms=percentile(done_ms, 99))
+    return out
+
+def build_report(rec, wall, busy, meta, probe_rec=None):
+    by_type = {k: stats(r['ms'], r['errors'], busy, r['status'], r['done_ms']) for k, r in sorted(rec.by_type.items())}
+    all_ms = [m for r in rec.by_type.values() for m in r['ms']]
+    all_done = [m for r in rec.by_type.values() for m in r['done_ms']]
+    overall = stats(all_ms, sum(r['errors'] for r in rec.by_type.values()), busy, done_ms=all_done)
+    report = {'meta': dict(meta, wall_s=round(wall, 2), busy_s=round(busy, 2)), 'overall': overall, 'by_type': by_type}
+    probe = probe_rec.by_type.get('STATUS') if probe_rec else None
+    if probe:
+        report['status_probe'] = stats(probe['ms'], probe['errors'], None, probe['status'])
+    return report
+
+def print_report(report):
+    print("\n| Signal | Count | Err% | p50 ms | p95 ms | p99 ms | max ms |")
+    rows = list(report['by_type'].items()) + [('ALL', report['overall'])]
+    for kind, s in rows:
+        print(f"| {kind} | {s['count']} | {s['error_rate'] * 100:.1f} | {s['p50_ms']} | {s['p95_ms']} | {s['p99_ms']} | {s['max_ms']} |")
+    o = report['overall']
+    print(f"\nThroughput: {o['throughput_rps']} signals/s over {report['meta']['busy_s']}s of load")
+    if 'done_p50_ms' in o:
+        print(f"Queued -> finished: p50 {o['done_p50_ms']}ms, p95 {o['done_p95_ms']}ms, p99 {o['done_p99_ms']}ms")
+    if 'status_probe' in report:
+        s = report['status_probe']
+        print(f"/status under load: {s['count']} polls, p50 {s['p50_ms']}ms, p99 {s['p99_ms']}ms, max {s['max_ms']}ms, err {s['error_rate'] * 100:.1f}%")
+
+def compare(report, baseline, tolerance):
+    """Regressions versus an earlier report, as human-readable lines"""
+    problems = []
+    pairs = [('ALL', report['overall'], baseline.get('overall', {}))]
+    pairs += [(k, s, baseline.get('by_type', {}).get(k)) for k, s in report['by_type'].items()]
+    for name, new, old in pairs:
+        if not old or not old.get('count'):
+            continue
+        if new['p95_ms'] and old['p95_ms'] and new['p95_ms'] > old['p95_ms'] * (1 + tolerance) and new['p95_ms'] - old['p95_ms'] > 1:
+            problems.append(f"{name}: p95 {old['p95_ms']} -> {new['p95_ms']} ms")
+        if new['error_rate'] > old['error_rate'] + 0.01:
+            problems.append(f"{name}: error rate {old['error_rate']} -> {new['error_rate']}")
+    new_t, old_t = report['overall']['throughput_rps'], baseline.get('overall', {}).get('throughput_rps')
+    if new_t and old_t and new_t < old_t * (1 - tolerance):
+        problems.append(f"ALL: throughput {old_t} -> {new_t} signals/s")
+    return problems
+
+# =============================================================================
+# SPAWNED TARGET - simulator + bot in a scratch directory
+# =============================================================================
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_http(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    return False
+
+class Spawned:
+    """
+    blofin_sim.py + the bot in a scratch directory. env_extra is added to the
+    bot's environment; setup(self) runs once the simulator answers and before
+    the bot starts (files in self.work, simulator seeding).
+    """
+    def __init__(self, args, symbols, env_extra=None, setup=None, prefix='mxs-loadtest-', balance=1000000):
+        self.work = tempfile.mkdtemp(prefix=prefix)
+        self.keep = args.keep
+        self.procs = []
+        sim_port, bot_port = free_port(), free_port()
+        self.sim_url = f"http://127.0.0.1:{sim_port}"
+        self.url = f"http://127.0.0.1:{bot_port}"
+        log = open(os.path.join(self.work, 'sim.log'), 'w')
+        self.procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'blofin_sim.py'), '--port', str(sim_port),
+             '--balance', str(balance), '--latency', str(args.sim_latency), '--jitter', str(args.sim_jitter),
+             '--error-rate', str(args.sim_error_rate)] + [x for s in symbols for x in ('--price', f'{s}=1.0')],
+            cwd=self.work, stdout=log, stderr=subprocess.STDOUT))
+        if setup:
+            if not wait_http(f"{self.sim_url}/sim/state"):
+                self.close()
+                raise SystemExit(f"simulator did not come up, see logs in {self.work}")
+            setup(self)
+        env = dict(os.environ, PYTHONPATH=HERE, BLOFIN_BASE_URL=self.sim_url, BLOFIN_API_KEY='sim-key',
+                   BLOFIN_API_SECRET='sim-secret', BLOFIN_PASSPHRASE='sim-pass', ACCOUNT_STREAM='0',
+                   PRICE_STREAM='0', SYMBOLS=','.join(symbols), WEBHOOK_MODE=args.mode,
+                   STATE_BACKEND='sqlite' if args.workers > 1 else 'journal',
+                   # the simulator doesn't rate-limit, so neither does the bot unless asked to
+                   BLOFIN_RATE_LIMIT=os.environ.get('BLOFIN_RATE_LIMIT', '1000000/1'),
+                   BLOFIN_TRADE_RATE_LIMIT=os.environ.get('BLOFIN_TRADE_RATE_LIMIT', '1000000/1'))
+        env.update(env_extra or {})
+        log = open(os.path.join(self.work, 'bot.log'), 'w')
+        if args.server == 'asgi':
+            cmd = ['uvicorn', 'mxs_asgi:app', '--host', '127.0.0.1', '--port', str(bot_port),
+                   '--workers', str(args.workers), '--log-level', 'warning']
+        else:
+            cmd = ['gunicorn', '-w', str(args.workers), '--threads', str(args.threads), '-b', f'127.0.0.1:{bot_port}',
+                   '--timeout', '120', 'mxs_webhook_bot:app']
+        self.procs.append(subprocess.Popen(cmd, cwd=self.work, env=env, stdout=log, stderr=subprocess.STDOUT))
+        if not (wait_http(f"{self.sim_url}/sim/state") and wait_http(f"{self.url}/status")):
+            self.close()
+            raise SystemExit(f"spawned target did not come up, see logs in {self.work}")
+
+    def close(self):
+        for p in self.procs:
+            p.terminate()
+        for p in self.procs:
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if self.keep:
+            print(f"[SPAWN] logs and state kept in {self.work}")
+        else:
+            shutil.rmtree(self.work, ignore_errors=True)
+
+def git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+# =============================================================================
+# CLI
+# =============================================================================
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Load-test /webhook with realistic alerts')
+    p.add_argument('--url', default='http://127.0.0.1:5000', help='bot to test (ignored with --spawn)')
+    p.add_argument('--spawn', action='store_true', help='start blofin_sim + the bot for the run')
+    p.add_argument('--symbols', default='FARTCOIN-USDT', help='instIds to spread alerts over (must be in the bot\'s SYMBOLS)')
+    p.add_argument('--mix', default='', help='weights per type, e.g. 30M_BULL_BREAK=3,4H_UPDATE=1 (default: all equal)')
+    p.add_argument('--bursts', type=int, default=3)
+    p.add_argument('--burst-size', type=int, default=100)
+    p.add_argument('--burst-pause', type=float, default=1.0, help='seconds between bursts')
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--follow', action='store_true', help='queue mode: also time each signal until it finished')
+    p.add_argument('--probe', type=float, default=0, help='also GET /status every PROBE ms during the load')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--out', help='write the report as JSON')
+    p.add_argument('--baseline', help='earlier --out file to compare against')
+    p.add_argument('--tolerance', type=float, default=0.2, help='allowed p95/throughput drift vs baseline')
+    g = p.add_argument_group('--spawn target')
+    g.add_argument('--server', default='gunicorn', choices=['gunicorn', 'asgi'],
+                   help='gunicorn + Flask, or uvicorn + mxs_asgi')
+    g.add_argument('--mode', default='sync', choices=['sync', 'queue'], help='WEBHOOK_MODE')
+    g.add_argument('--workers', type=int, default=1)
+    g.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    g.add_argument('--sim-latency', type=float, default=0.0, help='ms per exchange call')
+    g.add_argument('--sim-jitter', type=float, default=0.0)
+    g.add_argument('--sim-error-rate', type=float, default=0.0)
+    g.add_argument('--keep', action='store_true', help='keep the scratch directory (logs, state)')
+    args = p.parse_args(argv)
+
+    symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+    gen = PayloadGen(symbols, parse_mix(args.mix), args.seed)
+    target = Spawned(args, symbols) if args.spawn else None
+    url = target.url if target else args.url.rstrip('/')
+    try:
+        print(f"[LOAD] {args.bursts} x {args.burst_size} alerts, concurrency {args.concurrency} -> {url}")
+        rec, wall, busy, probe_rec = run_load(url, gen, args.bursts, args.burst_size, args.concurrency,
+                                              args.burst_pause, args.follow, args.probe / 1000)
+    finally:
+        if target:
+            target.close()
+
+    meta = {'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'git': git_rev(), 'url': url,
+            'spawn': args.spawn, 'symbols': symbols, 'bursts': args.bursts, 'burst_size': args.burst_size,
+            'concurrency': args.concurrency, 'follow': args.follow}
+    if args.spawn:
+        meta.update(server=args.server, mode=args.mode, workers=args.workers, threads=args.threads, sim_latency_ms=args.sim_latency,
+                    sim_jitter_ms=args.sim_jitter, sim_error_rate=args.sim_error_rate)
+    report = build_report(rec, wall, busy, meta, probe_rec)
+    print_report(report)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print(f"\nREGRESSION vs {args.baseline}:")
+            for line in problems:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regression vs {args.baseline} (tolerance {args.tolerance * 100:.0f}%)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
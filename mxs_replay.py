@@ -0,0 +1,361 @@
+"""
+MXS Replay - re-run a traffic capture (CAPTURE_FILE) against the current code
+- Starts blofin_sim.py and the bot (gunicorn, or uvicorn + mxs_asgi with
+  --server asgi) in a scratch directory, seeded from the capture header:
+  strategy state, symbol configs, USDT balance, open positions and their
+  stops on the simulator, WEBHOOK_MODE / COALESCE_MS / DEDUP_TTL
+- Sends every captured body byte for byte at its captured offset divided by
+  --speed. Each alert first moves the simulator to the alert's price, so
+  fills and stop hits follow the captured market. A webhook that arrived
+  after another had been answered (queued: had run) is held until that one
+  is answered in the replay too; webhooks that overlapped live overlap here.
+  So every decision sees the captured order, across symbols as well (they
+  share the balance). Same-symbol webhooks that overlapped live were
+  ordered by the symbol lock; their diffs are marked 'overlapped live'.
+  The dedup TTL is divided by --speed. The coalescing window is not: like
+  the exchange latency it is the bot's own time
+- Diffs each webhook against the capture: HTTP status, response (minus order
+  IDs and timings), the queued outcome in queue mode, and the order/stop
+  calls sent to the exchange (prices within --price-tolerance; sizes only
+  with --check-size, as they follow the balance and so every earlier fill)
+- Timings: bot-side handling ms per signal type, captured vs replayed. The
+  simulator's latency defaults to the capture's median exchange call, so
+  the two are comparable
+- Exits 1 on any decision diff, or when the overall p95 grew past --tolerance
+
+Usage:
+  CAPTURE_FILE=capture.jsonl.gz gunicorn -w 1 --threads 8 -b 0.0.0.0:5000 mxs_webhook_bot:app
+  python mxs_replay.py capture.jsonl.gz
+  python mxs_replay.py capture.jsonl.gz --speed 50 --server asgi --out replay.json
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import statistics
+import threading
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
+import requests
+
+from mxs_strategy import signal_kind
+from mxs_loadtest import Spawned, wait_http, percentile, git_rev, http, follow
+
+VOLATILE = ('id', 'result', 'stop_update', 'timings_ms')   # response keys that differ run to run
+ORDER_VOLATILE = ('clientOrderId', 'tpslId', 'size')    # size follows the balance, i.e. the P&L of earlier fills
+TRADE_PATH = '/api/v1/trade/'
+
+# =============================================================================
+# CAPTURE FILE
+# =============================================================================
+def read_capture(path):
+    """[(header, [record, ...])], one segment per bot process that wrote to the file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    segments = []
+    with opener(path, 'rt') as f:
+        try:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue                 # torn last line of a live capture
+                if 'capture' in rec:
+                    segments.append((rec, []))
+                elif segments:
+                    segments[-1][1].append(rec)
+        except EOFError:
+            pass                             # gzip stream of a bot that is still running
+    return segments
+
+def parse_body(raw):
+    """Same decoding as the bot's parse_webhook(), None when it isn't an alert"""
+    if raw.startswith('{{'):
+        raw = raw[1:]
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def kind_of(rec):
+    data = parse_body(rec['raw'])
+    if data is None:
+        return 'INVALID'
+    return signal_kind(str(data.get('signal', '')).upper().strip()) or 'UNKNOWN'
+
+# =============================================================================
+# SPAWNED TARGET - seeded from the capture header
+# =============================================================================
+def seed(header):
+    """setup() for Spawned: state and symbol files for the bot, positions on the simulator"""
+    def setup(target):
+        with open(os.path.join(target.work, 'bot_state.json'), 'w') as f:
+            json.dump({'symbols': header['state'], 'seq': 0}, f)
+        with open(os.path.join(target.work, 'symbols.json'), 'w') as f:
+            json.dump({sym: {k: v for k, v in cfg.items() if k != 'symbol'} for sym, cfg in header['symbols'].items()}, f)
+        for sym, pos in (header.get('positions') or {}).items():
+            if pos and pos.get('side'):
+                state = header['state'].get(sym) or {}
+                requests.post(f"{target.sim_url}/sim/position", json={
+                    'instId': sym, 'side': 'buy' if pos['side'] == 'LONG' else 'sell', 'size': pos['size'],
+                    'price': pos['entry'], 'stop': state.get('stop'),
+                    'leverage': header['symbols'].get(sym, {}).get('leverage', 1)}, timeout=5).raise_for_status()
+    return setup
+
+def start_balance(header):
+    """Simulator cash: the captured available balance plus the margin of the seeded positions"""
+    margin = sum(p['size'] * p['entry'] / header['symbols'].get(sym, {}).get('leverage', 1)
+                 for sym, p in (header.get('positions') or {}).items() if p and p.get('side'))
+    return (header.get('balance') or 1000000) + margin
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+def send(url, i, rec, results, done):
+    """POST one captured body; a queued signal counts as answered once it has run"""
+    t0 = time.perf_counter()
+    try:
+        r = http().post(f"{url}/webhook", data=rec['raw'].encode(), timeout=60,
+                        headers={'Content-Type': 'application/json'})
+        if r.status_code == 202:
+            follow(url, r.json()['id'], 60)
+        results[i] = {'code': r.status_code, 'client_ms': (time.perf_counter() - t0) * 1000}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        results[i] = {'code': type(e).__name__, 'client_ms': (time.perf_counter() - t0) * 1000}
+    finally:
+        done.set()
+
+def replay(url, sim_url, records, speed):
+    """
+    Send every record at its scaled offset, keeping the capture's
+    happens-before order. A webhook that arrived after an earlier one had been
+    answered (or, queued, had run) waits for that one here too; webhooks that
+    overlapped live overlap in the replay. Returns {index: client-side result}.
+    """
+    done = [threading.Event() for _ in records]
+    results, prices = {}, {}
+    inflight = []     # heap of (captured finish time, index)
+    t_first = records[0]['t']
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        for i, rec in enumerate(records):
+            wait = start + (rec['t'] - t_first) / speed - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            while inflight and inflight[0][0] <= rec['t']:
+                done[heapq.heappop(inflight)[1]].wait()
+            data = parse_body(rec['raw']) or {}
+            sym = str(data.get('instId') or '').upper()
+            if sym and data.get('price') and prices.get(sym) != data['price']:
+                prices[sym] = data['price']
+                http().post(f"{sim_url}/sim/price", json={'instId': sym, 'price': float(data['price'])}, timeout=10)
+            heapq.heappush(inflight, (rec['t'] + (done_ms(rec) or 0) / 1000, i))
+            pool.submit(send, url, i, rec, results, done[i])
+    return results
+
+def collect(path, expected, timeout=30):
+    """Records the replaying bot captured, once all expected ones (queued outcomes included) are written"""
+    deadline = time.time() + timeout
+    while True:
+        records = [r for _, recs in read_capture(path) for r in recs] if os.path.exists(path) else []
+        if len(records) >= expected or time.time() > deadline:
+            return records
+        time.sleep(0.2)
+
+# =============================================================================
+# DIFF
+# =============================================================================
+def num(x):
+    if isinstance(x, bool):
+        return None
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+def same(a, b, tol):
+    """Structural equality, numbers (also numeric strings) equal within a relative tol"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k], tol) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same(x, y, tol) for x, y in zip(a, b))
+    fa, fb = num(a), num(b)
+    if fa is not None and fb is not None:
+        return abs(fa - fb) <= tol * max(abs(fa), abs(fb), 1e-12)
+    return a == b
+
+def scrub(body, keys):
+    """body without keys, in nested dicts and lists too"""
+    if isinstance(body, dict):
+        return {k: scrub(v, keys) for k, v in body.items() if k not in keys}
+    if isinstance(body, list):
+        return [scrub(v, keys) for v in body]
+    return body
+
+def decision(rec, order_volatile=ORDER_VOLATILE):
+    """What a webhook decided, without the parts that differ between runs"""
+    out = {'code': rec.get('code'), 'resp': scrub(rec.get('resp'), VOLATILE)}
+    if 'run' in rec:
+        out['run'] = {'code': rec['run']['code'], 'resp': scrub(rec['run']['resp'], VOLATILE)}
+    orders = [[path, scrub(body, order_volatile)]
+              for _, method, path, body, *_ in rec.get('x', []) if method == 'POST' and path.startswith(TRADE_PATH)]
+    out['orders'] = sorted(orders, key=lambda o: json.dumps(o, sort_keys=True))
+    return out
+
+def diff(captured, replayed, tol, order_volatile=ORDER_VOLATILE):
+    """Pair replayed records with captured ones (same body, in order) and compare their decisions"""
+    by_raw = defaultdict(deque)
+    for rec in replayed:
+        by_raw[rec['raw']].append(rec)
+    racy = overlapping(captured)
+    rows = []
+    for i, rec in enumerate(captured):
+        got = by_raw[rec['raw']].popleft() if by_raw[rec['raw']] else None
+        want = decision(rec, order_volatile)
+        have = decision(got, order_volatile) if got else None
+        fields = [k for k in want if not have or not same(want[k], have.get(k), tol)]
+        rows.append({'i': i, 'kind': kind_of(rec), 'captured': want, 'replayed': have, 'diff': fields, 'overlap': i in racy,
+                     'ms': rec.get('ms'), 'replay_ms': got.get('ms') if got else None,
+                     'done_ms': done_ms(rec), 'replay_done_ms': done_ms(got) if got else None})
+    return rows
+
+def overlapping(records):
+    """
+    Indexes of webhooks that were in flight together with another for the same
+    symbol. The symbol lock, not arrival order, decided which ran first, so a
+    replay may resolve them, and what follows from them, the other way.
+    """
+    racy, active = set(), defaultdict(list)     # symbol -> [(captured finish, index)]
+    for i, rec in enumerate(records):
+        sym = str((parse_body(rec['raw']) or {}).get('instId') or '').upper()
+        live = active[sym] = [(end, j) for end, j in active[sym] if end > rec['t']]
+        if live:
+            racy.add(i)
+            racy.update(j for _, j in live)
+        live.append((rec['t'] + (done_ms(rec) or 0) / 1000, i))
+    return racy
+
+def done_ms(rec):
+    """Arrival to finished: the response, or for a queued signal the end of its run"""
+    run = rec.get('run')
+    return rec.get('ms') if not run else run['queue_ms'] + run['exec_ms']
+
+# =============================================================================
+# REPORT
+# =============================================================================
+def timing(rows, key):
+    ms = sorted(r[key] for r in rows if r[key] is not None)
+    return {'count': len(ms), 'p50_ms': percentile(ms, 50), 'p95_ms': percentile(ms, 95),
+            'p99_ms': percentile(ms, 99), 'max_ms': round(ms[-1], 2) if ms else None}
+
+def build_report(rows, meta):
+    by_kind = defaultdict(list)
+    for r in rows:
+        by_kind[r['kind']].append(r)
+    timings = {kind: {'captured': timing(rs, 'done_ms'), 'replayed': timing(rs, 'replay_done_ms')}
+               for kind, rs in sorted(by_kind.items())}
+    timings['ALL'] = {'captured': timing(rows, 'done_ms'), 'replayed': timing(rows, 'replay_done_ms')}
+    diffs = [r for r in rows if r['diff']]
+    return {'meta': meta, 'webhooks': len(rows), 'matched': len(rows) - len(diffs), 'diffs': diffs,
+            'missing': sum(1 for r in rows if r['replayed'] is None), 'timings': timings}
+
+def print_report(report, show):
+    meta = report['meta']
+    print(f"[REPLAY] {meta['captured_s']}s of traffic replayed in {meta['wall_s']}s")
+    missing = f", {report['missing']} not replayed" if report['missing'] else ''
+    print(f"\n{report['matched']}/{report['webhooks']} webhooks decided the same{missing}")
+    for r in report['diffs'][:show]:
+        print(f"  #{r['i']} {r['kind']}: {', '.join(r['diff'])}{' (overlapped live)' if r['overlap'] else ''}")
+        for k in r['diff']:
+            print(f"      captured {json.dumps(r['captured'].get(k), default=str)}")
+            print(f"      replayed {json.dumps((r['replayed'] or {}).get(k), default=str)}")
+    if len(report['diffs']) > show:
+        print(f"  ... {len(report['diffs']) - show} more (--out for all)")
+    print("\n| Signal | Count | captured p50 / p95 / max ms | replayed p50 / p95 / max ms |")
+    for kind, t in report['timings'].items():
+        c, r = t['captured'], t['replayed']
+        print(f"| {kind} | {c['count']} | {c['p50_ms']} / {c['p95_ms']} / {c['max_ms']} | {r['p50_ms']} / {r['p95_ms']} / {r['max_ms']} |")
+
+# =============================================================================
+# CLI
+# =============================================================================
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Replay a CAPTURE_FILE against the current code and blofin_sim')
+    p.add_argument('capture', help='capture file written by the bot (CAPTURE_FILE)')
+    p.add_argument('--segment', type=int, default=1, help='which bot run in the file to replay (1 = first)')
+    p.add_argument('--speed', type=float, default=1.0, help='time compression: 1 = as captured, 20 = 20x faster')
+    p.add_argument('--price-tolerance', type=float, default=0.001, help='relative difference allowed in prices/sizes')
+    p.add_argument('--check-size', action='store_true', help='also diff order sizes (needs the captured fills to match)')
+    p.add_argument('--tolerance', type=float, default=0.2, help='allowed overall p95 growth vs the capture')
+    p.add_argument('--show', type=int, default=20, help='diffs printed')
+    p.add_argument('--out', help='write the report as JSON')
+    g = p.add_argument_group('spawned target')
+    g.add_argument('--server', default='gunicorn', choices=['gunicorn', 'asgi'])
+    g.add_argument('--threads', type=int, default=8, help='gunicorn threads')
+    g.add_argument('--sim-latency', type=float, default=None, help='ms per exchange call (default: captured median)')
+    g.add_argument('--sim-jitter', type=float, default=0.0)
+    g.add_argument('--keep', action='store_true', help='keep the scratch directory (logs, state, replay capture)')
+    args = p.parse_args(argv)
+    if args.speed <= 0:
+        raise SystemExit('--speed must be > 0')
+
+    segments = read_capture(args.capture)
+    if not 0 < args.segment <= len(segments):
+        raise SystemExit(f"{args.capture}: {len(segments)} segment(s), no segment {args.segment}")
+    header, records = segments[args.segment - 1]
+    if not records:
+        raise SystemExit(f"{args.capture}: segment {args.segment} has no webhooks")
+    records.sort(key=lambda r: r['t'])      # written as they finish, replayed as they arrived
+    config = header['config']
+    exchange_ms = [x[6] for r in records for x in r.get('x', [])]
+    if args.sim_latency is None:
+        args.sim_latency = round(statistics.median(exchange_ms), 1) if exchange_ms else 0.0
+    args.mode, args.workers, args.sim_error_rate = config['WEBHOOK_MODE'], 1, 0.0
+    env = {'CAPTURE_FILE': 'replay_capture.jsonl', 'WEBHOOK_MODE': config['WEBHOOK_MODE'],
+           'COALESCE_MS': str(config['COALESCE_MS']), 'DEDUP_TTL': str(config['DEDUP_TTL'] / args.speed),
+           'CANDLE_ENGINE': config['CANDLE_ENGINE'], 'LOCAL_STOPS': config['LOCAL_STOPS']}
+    if config['CANDLE_ENGINE'] != 'off':
+        env['BLOFIN_WS_PUBLIC_URL'] = 'ws://127.0.0.1:9'   # gate TradingView alerts the same way, no live candles
+
+    span = records[-1]['t'] - records[0]['t']
+    print(f"[REPLAY] {len(records)} webhooks over {span:.0f}s at {args.speed:g}x, {config['WEBHOOK_MODE']} mode, "
+          f"sim latency {args.sim_latency}ms")
+    target = Spawned(args, sorted(header['symbols']), env, seed(header), 'mxs-replay-', start_balance(header))
+    try:
+        if not wait_http(f"{target.url}/ready", 60):
+            raise SystemExit(f"bot never became ready, see logs in {target.work}")
+        t0 = time.time()
+        results = replay(target.url, target.sim_url, records, args.speed)
+        wall = time.time() - t0
+        replayed = collect(os.path.join(target.work, 'replay_capture.jsonl'), len(results))
+    finally:
+        target.close()
+
+    order_volatile = tuple(k for k in ORDER_VOLATILE if k != 'size') if args.check_size else ORDER_VOLATILE
+    rows = diff(records, replayed, args.price_tolerance, order_volatile)
+    meta = {'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'git': git_rev(), 'capture': args.capture,
+            'segment': args.segment, 'speed': args.speed, 'server': args.server, 'mode': config['WEBHOOK_MODE'],
+            'sim_latency_ms': args.sim_latency, 'captured_s': round(span, 2), 'wall_s': round(wall, 2)}
+    report = build_report(rows, meta)
+    print_report(report, args.show)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+    status = 0
+    if report['diffs']:
+        racy = sum(1 for r in report['diffs'] if r['overlap'])
+        print(f"\nDECISIONS CHANGED: {len(report['diffs'])} webhook(s), {racy} of them overlapped live")
+        status = 1
+    old, new = report['timings']['ALL']['captured']['p95_ms'], report['timings']['ALL']['replayed']['p95_ms']
+    if old and new and new > old * (1 + args.tolerance) and new - old > 1:
+        print(f"\nREGRESSION: p95 {old} -> {new} ms (tolerance {args.tolerance * 100:.0f}%)")
+        status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+MXS Volatile Coin Strategy - decision logic
+Shared by the live bot (mxs_webhook_bot.py) and the offline backtest
+(mxs_backtest.py). Nothing in here talks to the exchange, the state store
+or the event log: decide() updates a SymbolState and says what to do,
+the caller does it.
+"""
+
+import logging
+import threading
+
+LEVERAGE = 3              # 3x leverage (confirmed in backtest)
+STOP_BUFFER = 0.005       # 0.5% buffer on HTF swings
+MAX_STOP_PCT = 0.01       # 1% max stop cap (critical for volatile coins)
+MARGIN_MODE = "isolated"
+POSITION_SIZE_PCT = 0.95  # share of available USDT committed per entry
+
+logger = logging.getLogger('mxs')   # handlers are set up by the live bot; the backtest leaves it silent
+
+# =============================================================================
+# PER-SYMBOL CONFIG + STATE
+# =============================================================================
+class SymbolConfig:
+    """Trading parameters for one instrument"""
+    __slots__ = ('symbol', 'leverage', 'stop_buffer', 'max_stop_pct', 'margin_mode', 'size_pct')
+
+    def __init__(self, symbol, leverage=LEVERAGE, stop_buffer=STOP_BUFFER,
+                 max_stop_pct=MAX_STOP_PCT, margin_mode=MARGIN_MODE, size_pct=POSITION_SIZE_PCT):
+        self.symbol = symbol
+        self.leverage = int(leverage)
+        self.stop_buffer = float(stop_buffer)
+        self.max_stop_pct = float(max_stop_pct)
+        self.margin_mode = margin_mode
+        self.size_pct = float(size_pct)
+
+    def to_dict(self):
+        return {'symbol': self.symbol, 'leverage': self.leverage, 'stop_buffer': self.stop_buffer,
+                'max_stop_pct': self.max_stop_pct, 'margin_mode': self.margin_mode,
+                'size_pct': self.size_pct}
+
+class SymbolState:
+    """Strategy state for one instrument. Its lock serialises that symbol's signals."""
+    __slots__ = ('symbol', 'cfg', 'lock', 'version', 'htf_trend', 'ltf_trend', 'had_deviation', 'position',
+                 'entry_price', 'stop_price', 'htf_swing_low', 'htf_swing_high')
+
+    def __init__(self, cfg, saved=None, version=0):
+        self.symbol = cfg.symbol
+        self.cfg = cfg
+        self.lock = threading.RLock()
+        self.version = version    # row version in the shared store (sqlite backend)
+        self.load(saved or {})
+
+    def load(self, saved):
+        self.htf_trend = saved.get('htf_trend')
+        self.ltf_trend = saved.get('ltf_trend')
+        self.had_deviation = saved.get('had_deviation', False)
+        self.position = saved.get('position')
+        self.entry_price = saved.get('entry')
+        self.stop_price = saved.get('stop')
+        self.htf_swing_low = saved.get('htf_swing_low')
+        self.htf_swing_high = saved.get('htf_swing_high')
+
+    def reset(self):
+        self.load({})
+
+    def to_dict(self):
+        return {
+            'htf_trend': self.htf_trend,
+            'ltf_trend': self.ltf_trend,
+            'had_deviation': self.had_deviation,
+            'position': self.position,
+            'entry': self.entry_price,
+            'stop': self.stop_price,
+            'htf_swing_low': self.htf_swing_low,
+            'htf_swing_high': self.htf_swing_high
+        }
+
+    def stop_for(self, entry_px, swing_px, direction, verbose=True):
+        return calculate_stop(entry_px, swing_px, direction, self.cfg.stop_buffer, self.cfg.max_stop_pct, verbose)
+
+    def record_entry(self, direction, entry_px, stop):
+        """Position confirmed open on the exchange"""
+        self.position = direction
+        self.entry_price = entry_px
+        self.stop_price = stop
+        self.had_deviation = False  # Reset after entry
+
+    def record_exit(self):
+        self.position = None
+        self.entry_price = None
+        self.stop_price = None
+
+# =============================================================================
+# STOP CALCULATION WITH 1% CAP
+# =============================================================================
+def calculate_stop(entry_px, swing_px, direction, stop_buffer=STOP_BUFFER, max_stop_pct=MAX_STOP_PCT, verbose=True):
+    """
+    Calculate stop price with buffer and 1% max cap.
+    - direction: 'LONG' or 'SHORT'
+    - stop_buffer / max_stop_pct: per-symbol overrides of the defaults
+    - Returns capped stop price
+    """
+    if direction == 'LONG':
+        # Stop below swing low
+        raw_stop = swing_px * (1 - stop_buffer)
+        stop_distance_pct = (entry_px - raw_stop) / entry_px
+
+        # Cap at 1% max
+        if stop_distance_pct > max_stop_pct:
+            capped_stop = entry_px * (1 - max_stop_pct)
+            if verbose:
+                logger.info('Raw stop %.4f (%.1f%%) -> Capped to %.4f (%s%%)', raw_stop, stop_distance_pct * 100,
+                            capped_stop, max_stop_pct * 100, extra={'tag': 'STOP CAP'})
+            return capped_stop
+        return raw_stop
+    else:
+        # Stop above swing high
+        raw_stop = swing_px * (1 + stop_buffer)
+        stop_distance_pct = (raw_stop - entry_px) / entry_px
+
+        # Cap at 1% max
+        if stop_distance_pct > max_stop_pct:
+            capped_stop = entry_px * (1 + max_stop_pct)
+            if verbose:
+                logger.info('Raw stop %.4f (%.1f%%) -> Capped to %.4f (%s%%)', raw_stop, stop_distance_pct * 100,
+                            capped_stop, max_stop_pct * 100, extra={'tag': 'STOP CAP'})
+            return capped_stop
+        return raw_stop
+
+# =============================================================================
+# SIGNALS - 30M/4H Strategy
+# =============================================================================
+def signal_kind(signal):
+    """Map a signal name to the strategy branch that handles it (None if unknown)"""
+    if '4H' in signal and 'UPDATE' in signal:
+        return '4H_UPDATE'
+    if '4H' in signal and 'BULL' in signal and 'BREAK' in signal:
+        return '4H_BULL_BREAK'
+    if '4H' in signal and 'BEAR' in signal and 'BREAK' in signal:
+        return '4H_BEAR_BREAK'
+    if '4H' in signal and 'BREAK' not in signal and 'UPDATE' not in signal:
+        return '4H_OTHER'
+    if '30M' in signal and 'BULL' in signal and 'CONT' not in signal:
+        return '30M_BULL_BREAK'
+    if '30M' in signal and 'BEAR' in signal and 'CONT' not in signal:
+        return '30M_BEAR_BREAK'
+    if '30M' in signal and 'BULL' in signal and 'CONT' in signal:
+        return '30M_BULL_CONT'
+    if '30M' in signal and 'BEAR' in signal and 'CONT' in signal:
+        return '30M_BEAR_CONT'
+    return None
+
+def parse_alert(data):
+    """Pull (signal, kind, price, swing_low, swing_high) out of a decoded alert; price is 0 when absent"""
+    signal = str(data.get('signal', '')).upper().strip()
+    price = float(data.get('price', 0) or 0)
+    swing_low = float(data.get('swing_low')) if data.get('swing_low') else None
+    swing_high = float(data.get('swing_high')) if data.get('swing_high') else None
+    return signal, signal_kind(signal), price, swing_low, swing_high
+
+def trail_stop(st, side, log, verbose=True):
+    """Move the stop of an open position toward the latest HTF swing, never away. Returns the new stop or None."""
+    if side == 'LONG' and st.htf_swing_low and st.entry_price:
+        # move stop up to new swing low
+        new_stop = st.stop_for(st.entry_price, st.htf_swing_low, 'LONG', verbose)
+        if st.stop_price and new_stop > st.stop_price:
+            st.stop_price = new_stop
+            log(f"TRAIL LONG: stop raised to {new_stop:.6f}")
+            return new_stop
+    elif side == 'SHORT' and st.htf_swing_high and st.entry_price:
+        # move stop down to new swing high
+        new_stop = st.stop_for(st.entry_price, st.htf_swing_high, 'SHORT', verbose)
+        if st.stop_price and new_stop < st.stop_price:
+            st.stop_price = new_stop
+            log(f"TRAIL SHORT: stop lowered to {new_stop:.6f}")
+            return new_stop
+    return None
+
+def decide(st, kind, signal, swing_low, swing_high, pos_side, log, verbose=True):
+    """
+    Run one alert through the strategy for a single symbol.
+    - pos_side: side of the position actually open ('LONG', 'SHORT' or None)
+    - log: callable taking one message, for the signal log
+    Updates st's trends, deviation, swings and trailed stop, then returns
+    (response, http_status, action) where action is None or one of
+      ('EXIT', reason)
+      ('ENTER', direction, swing_px, entry_type)   entry_type 'BREAK' | 'CONTINUATION'
+      ('TRAIL', side, new_stop)
+    Entries and exits are left to the caller, which then records them with
+    st.record_entry() / st.record_exit().
+    """
+    def trailed(side):
+        new_stop = trail_stop(st, side, log, verbose)
+        return ('TRAIL', side, new_stop) if new_stop else None
+
+    def update_swings():
+        if swing_low:
+            st.htf_swing_low = swing_low
+        if swing_high:
+            st.htf_swing_high = swing_high
+
+    # =========================================================================
+    # 4H_UPDATE - Just update swings, no trend change (from Reclaim, Zone Cross, etc.)
+    # =========================================================================
+    if kind == '4H_UPDATE':
+        update_swings()
+        log(f"4H UPDATE: swings updated - low={st.htf_swing_low}, high={st.htf_swing_high}")
+        action = trailed(pos_side)
+        return {'action': 'SWINGS_UPDATED', 'htf_swing_low': st.htf_swing_low, 'htf_swing_high': st.htf_swing_high}, 200, action
+
+    # =========================================================================
+    # 4H (HTF) SIGNALS - Set trend, store swings, trail stops, exit on flip
+    # Only flip trend on STRUCTURE BREAKS (signal must contain BREAK)
+    # =========================================================================
+    elif kind == '4H_BULL_BREAK':
+        old_trend = st.htf_trend
+        st.htf_trend = 'BULL'
+        st.had_deviation = False  # Reset deviation on HTF change
+        update_swings()
+
+        log(f"4H BULL: htf {old_trend} -> BULL, deviation reset, swings: low={st.htf_swing_low}, high={st.htf_swing_high}")
+
+        # Exit SHORT on HTF flip to BULL, otherwise trail an existing LONG
+        if pos_side == 'SHORT':
+            action = ('EXIT', '4H_BULL_FLIP')
+        else:
+            action = trailed('LONG') if pos_side == 'LONG' else None
+        return {'action': 'HTF_BULL', 'htf_swing_low': st.htf_swing_low, 'htf_swing_high': st.htf_swing_high}, 200, action
+
+    elif kind == '4H_BEAR_BREAK':
+        old_trend = st.htf_trend
+        st.htf_trend = 'BEAR'
+        st.had_deviation = False  # Reset deviation on HTF change
+        update_swings()
+
+        log(f"4H BEAR: htf {old_trend} -> BEAR, deviation reset, swings: low={st.htf_swing_low}, high={st.htf_swing_high}")
+
+        # Exit LONG on HTF flip to BEAR, otherwise trail an existing SHORT
+        if pos_side == 'LONG':
+            action = ('EXIT', '4H_BEAR_FLIP')
+        else:
+            action = trailed('SHORT') if pos_side == 'SHORT' else None
+        return {'action': 'HTF_BEAR', 'htf_swing_low': st.htf_swing_low, 'htf_swing_high': st.htf_swing_high}, 200, action
+
+    # =========================================================================
+    # 4H OTHER SIGNALS (Imbalance, Reclaim, Zone Cross, etc.) - Update swings only, NO trend flip
+    # =========================================================================
+    elif kind == '4H_OTHER':
+        update_swings()
+        log(f"4H OTHER ({signal}): swings updated - low={st.htf_swing_low}, high={st.htf_swing_high} (NO TREND CHANGE)")
+        action = trailed(pos_side)
+        return {'action': 'HTF_SWING_UPDATE', 'signal': signal, 'htf_swing_low': st.htf_swing_low, 'htf_swing_high': st.htf_swing_high}, 200, action
+
+    # =========================================================================
+    # 30M (LTF) BREAK SIGNALS - Require deviation
+    # =========================================================================
+    elif kind in ('30M_BULL_BREAK', '30M_BEAR_BREAK'):
+        trend, against = ('BULL', 'BEAR') if kind == '30M_BULL_BREAK' else ('BEAR', 'BULL')
+        direction = 'LONG' if trend == 'BULL' else 'SHORT'
+        old_ltf = st.ltf_trend
+        st.ltf_trend = trend
+
+        # Check for deviation: LTF was against the HTF, now back with it
+        if old_ltf == against and st.htf_trend == trend:
+            st.had_deviation = True
+            log(f"DEVIATION DETECTED: LTF was {against}, now {trend}, HTF is {trend}")
+
+        # Entry conditions: HTF agrees + had deviation + not already in
+        if st.htf_trend != trend:
+            log(f"NO ENTRY: HTF is {st.htf_trend}, need {trend}")
+            return {'action': 'NO_ENTRY', 'reason': f'htf is {st.htf_trend}'}, 200, None
+
+        if not st.had_deviation:
+            log("NO ENTRY: No deviation yet")
+            return {'action': 'NO_ENTRY', 'reason': 'no deviation'}, 200, None
+
+        return enter_if_flat(st, direction, 'BREAK', pos_side)
+
+    # =========================================================================
+    # 30M (LTF) CONTINUATION SIGNALS - No deviation needed
+    # =========================================================================
+    elif kind in ('30M_BULL_CONT', '30M_BEAR_CONT'):
+        trend = 'BULL' if kind == '30M_BULL_CONT' else 'BEAR'
+        direction = 'LONG' if trend == 'BULL' else 'SHORT'
+
+        if st.htf_trend != trend:
+            log(f"NO ENTRY: HTF is {st.htf_trend}, need {trend} for continuation")
+            return {'action': 'NO_ENTRY', 'reason': f'htf is {st.htf_trend}'}, 200, None
+
+        return enter_if_flat(st, direction, 'CONTINUATION', pos_side)
+
+    else:
+        log(f"UNKNOWN SIGNAL: {signal}")
+        return {'error': f'Unknown signal: {signal}'}, 400, None
+
+def enter_if_flat(st, direction, entry_type, pos_side):
+    """Last entry checks shared by breaks and continuations"""
+    if pos_side == direction:
+        return {'action': 'NO_ENTRY', 'reason': f'already {direction}'}, 200, None
+
+    if direction == 'LONG':
+        if not st.htf_swing_low:
+            return {'action': 'NO_ENTRY', 'reason': 'no HTF swing_low for stop'}, 200, None
+        swing_px = st.htf_swing_low
+    else:
+        if not st.htf_swing_high:
+            return {'action': 'NO_ENTRY', 'reason': 'no HTF swing_high for stop'}, 200, None
+        swing_px = st.htf_swing_high
+
+    return {'action': f'{direction}_ENTERED', 'type': entry_type}, 200, ('ENTER', direction, swing_px, entry_type)
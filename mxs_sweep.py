@@ -0,0 +1,258 @@
+"""
+MXS Sweep - parameter grid + walk-forward over the backtest, on every core
+- Grid: stop buffer x stop cap x leverage x timeframe pair (one alerts file
+  per pair) x entry types (break / continuation / both)
+- Bars are converted once to .npy and memory-mapped by every worker, so the
+  OS shares one copy of the data across the pool
+- Results are cached per parameter set in SWEEP_CACHE, keyed on the
+  parameters plus a digest of the bars, the alerts and the strategy code;
+  re-running a grid only computes the new combinations
+- Walk-forward: the period is cut into --windows equal slices; each slice's
+  best parameter set (in-sample) is scored on the next slice (out-of-sample)
+
+Usage:
+  python mxs_sweep.py --bars bars.csv --signals 30M_4H=alerts_30m4h.jsonl --signals 5M_1H=alerts_5m1h.jsonl \\
+      --stop-buffer 0.002:0.01:0.001 --max-stop 0.006:0.02:0.002 --leverage 2,3,5 --entries both,break \\
+      --windows 6 --json sweep.json
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import mxs_backtest as bt
+from mxs_strategy import LEVERAGE, STOP_BUFFER, MAX_STOP_PCT, POSITION_SIZE_PCT, SymbolConfig
+
+SWEEP_CACHE = os.environ.get('SWEEP_CACHE', 'sweep_cache.db')
+ENTRY_SETS = {'both': ('BREAK', 'CONTINUATION'), 'break': ('BREAK',), 'cont': ('CONTINUATION',)}
+RANKS = {
+    'return': lambda s: s['return_pct'],
+    'calmar': lambda s: s['return_pct'] / max(s['max_dd_pct'], 1.0),
+}
+
+# =============================================================================
+# INPUTS
+# =============================================================================
+def parse_values(spec, cast=float):
+    """'0.003,0.005' or 'start:stop:step' (stop inclusive)"""
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        n = int(round((stop - start) / step)) + 1
+        return [cast(round(start + i * step, 10)) for i in range(n)]
+    return [cast(x) for x in spec.split(',') if x.strip()]
+
+def digest(*paths):
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+def bars_npy(path):
+    """Memory-mappable copy of the bars, rebuilt only when the source is newer"""
+    if path.endswith('.npy'):
+        return path
+    npy = os.path.splitext(path)[0] + '.npy'
+    if not os.path.exists(npy) or os.path.getmtime(npy) < os.path.getmtime(path):
+        np.save(npy, np.ascontiguousarray(bt.load_bars(path)))
+    return npy
+
+def code_digest():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return digest(os.path.join(here, 'mxs_strategy.py'), os.path.join(here, 'mxs_backtest.py'))
+
+def param_grid(args, labels):
+    for buf, cap, lev, label, entries in itertools.product(
+            parse_values(args.stop_buffer), parse_values(args.max_stop), parse_values(args.leverage, int),
+            labels, args.entries.split(',')):
+        yield {'signals': label, 'stop_buffer': buf, 'max_stop_pct': cap, 'leverage': lev,
+               'entries': entries.strip().lower(), 'size_pct': args.size_pct, 'balance': args.balance,
+               'fee': args.fee, 'slippage': args.slippage}
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+class SweepCache:
+    """One row per parameter set: summary + per-trade (close time, return) for the windows"""
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                        'key TEXT PRIMARY KEY, params TEXT NOT NULL, summary TEXT NOT NULL, trades TEXT NOT NULL)')
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.db.execute(f"SELECT key, summary, trades FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, summary, trades in rows:
+                found[key] = (json.loads(summary), json.loads(trades))
+        return found
+
+    def put_many(self, rows):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                [(key, json.dumps(p), json.dumps(s), json.dumps(t)) for key, p, s, t in rows])
+
+def cache_key(base, params):
+    return hashlib.sha1(json.dumps([base, params], sort_keys=True).encode()).hexdigest()
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+_bars = None
+_signals = None
+
+def _init_worker(npy_path, signals):
+    global _bars, _signals
+    _bars = np.load(npy_path, mmap_mode='r')
+    _signals = signals
+
+def _run(job):
+    key, p = job
+    cfg = SymbolConfig('SWEEP', p['leverage'], p['stop_buffer'], p['max_stop_pct'], size_pct=p['size_pct'])
+    r = bt.run_backtest(_signals[p['signals']], _bars, cfg, p['balance'], p['fee'], p['slippage'],
+                        ENTRY_SETS[p['entries']])
+    summary = {k: v for k, v in r['summary'].items() if k != 'open_position'}
+    trades = [[t['closed'], round(t['pnl'] / (t['equity'] - t['pnl']), 8)] for t in r['trades']]
+    return key, p, summary, trades
+
+# =============================================================================
+# WALK-FORWARD
+# =============================================================================
+def window_stats(trades, edges):
+    """Per window: compounded return %, trade count and max drawdown % from the trades closed in it"""
+    closed = np.array([t[0] for t in trades]) if trades else np.empty(0)
+    rets = np.array([t[1] for t in trades]) if trades else np.empty(0)
+    out = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        r = rets[(closed >= lo) & (closed < hi)]
+        curve = np.cumprod(np.r_[1.0, 1.0 + r])
+        peaks = np.maximum.accumulate(curve)
+        out.append({'return_pct': round(float(curve[-1] - 1) * 100, 2), 'trades': int(len(r)),
+                    'max_dd_pct': round(float(((peaks - curve) / peaks).max()) * 100, 2)})
+    return out
+
+def walk_forward(results, edges, rank):
+    """Pick the best set on window k-1, score it on window k"""
+    score = RANKS[rank]
+    stats = [window_stats(r['trades'], edges) for r in results]
+    steps = []
+    chained = 1.0
+    for k in range(1, len(edges) - 1):
+        best = max(range(len(results)), key=lambda i: score(stats[i][k - 1]))
+        oos = stats[best][k]
+        chained *= 1 + oos['return_pct'] / 100
+        steps.append({'window': k, 'from': edges[k], 'to': edges[k + 1], 'params': results[best]['params'],
+                      'in_sample': stats[best][k - 1], 'out_of_sample': oos})
+    return {'steps': steps, 'oos_return_pct': round((chained - 1) * 100, 2)}
+
+# =============================================================================
+# CLI
+# =============================================================================
+def describe(p):
+    return f"{p['signals']} buf={p['stop_buffer']} cap={p['max_stop_pct']} lev={p['leverage']}x {p['entries']}"
+
+def day(ts):
+    return time.strftime('%Y-%m-%d', time.gmtime(ts))
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Parameter sweep + walk-forward for the MXS strategy')
+    p.add_argument('--bars', required=True, help='1m OHLCV CSV or .npy')
+    p.add_argument('--signals', required=True, action='append', help='alerts JSONL, optionally LABEL=path (repeat per timeframe pair)')
+    p.add_argument('--symbol', default=None, help='only alerts for this instId')
+    p.add_argument('--stop-buffer', default=str(STOP_BUFFER), help='values: a,b,c or start:stop:step')
+    p.add_argument('--max-stop', default=str(MAX_STOP_PCT))
+    p.add_argument('--leverage', default=str(LEVERAGE))
+    p.add_argument('--entries', default='both', help=f"any of {','.join(ENTRY_SETS)}")
+    p.add_argument('--size-pct', type=float, default=POSITION_SIZE_PCT)
+    p.add_argument('--balance', type=float, default=1000.0)
+    p.add_argument('--fee', type=float, default=bt.TAKER_FEE)
+    p.add_argument('--slippage', type=float, default=0.0)
+    p.add_argument('--windows', type=int, default=4, help='walk-forward slices (0 = off)')
+    p.add_argument('--rank', default='return', choices=sorted(RANKS))
+    p.add_argument('--workers', type=int, default=os.cpu_count())
+    p.add_argument('--top', type=int, default=10)
+    p.add_argument('--json', help='write every result + the walk-forward here')
+    args = p.parse_args(argv)
+
+    symbol = args.symbol.upper() if args.symbol else None
+    files = {}
+    for spec in args.signals:
+        label, _, path = spec.rpartition('=')
+        files[label or os.path.splitext(os.path.basename(path))[0]] = path
+    bad = [e for e in args.entries.split(',') if e.strip().lower() not in ENTRY_SETS]
+    if bad:
+        p.error(f"unknown --entries {bad}")
+
+    t0 = time.perf_counter()
+    npy = bars_npy(args.bars)
+    bars = np.load(npy, mmap_mode='r')
+    signals = {label: bt.load_signals(path, symbol) for label, path in files.items()}
+    base = {'code': code_digest(), 'bars': digest(npy), 'signals': {label: digest(path) for label, path in files.items()}}
+
+    grid = list(param_grid(args, sorted(files)))
+    # --symbol filters the alerts file, so it is part of what the result depends on
+    keys = [cache_key([base['code'], base['bars'], base['signals'][g['signals']], symbol], g) for g in grid]
+    cache = SweepCache(SWEEP_CACHE)
+    done = cache.get_many(keys)
+    todo = [(k, g) for k, g in zip(keys, grid) if k not in done]
+    print(f"{len(grid)} parameter sets, {len(grid) - len(todo)} cached, {len(todo)} to run on {args.workers} worker(s)")
+
+    t1 = time.perf_counter()
+    if todo:
+        batch = []
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(npy, signals)) as pool:
+            for n, (key, params, summary, trades) in enumerate(
+                    pool.map(_run, todo, chunksize=max(1, len(todo) // (args.workers * 8))), 1):
+                done[key] = (summary, trades)
+                batch.append((key, params, summary, trades))
+                if len(batch) >= 200 or n == len(todo):
+                    cache.put_many(batch)
+                    batch = []
+                    print(f"  {n}/{len(todo)} in {time.perf_counter() - t1:.1f}s", end='\r')
+        print()
+    t2 = time.perf_counter()
+
+    results = [{'params': g, 'summary': done[k][0], 'trades': done[k][1]} for k, g in zip(keys, grid)]
+    results.sort(key=lambda r: RANKS[args.rank](r['summary']), reverse=True)
+
+    print(f"\nTop {args.top} by {args.rank} ({day(bars[0, 0])} -> {day(bars[-1, 0])}):")
+    print("| Params | Return | Trades | Win% | Max DD |")
+    for r in results[:args.top]:
+        s = r['summary']
+        print(f"| {describe(r['params'])} | {s['return_pct']:+,.2f}% | {s['trades']} | {s['win_pct']}% | {s['max_dd_pct']}% |")
+
+    wf = None
+    if args.windows >= 2:
+        edges = [float(x) for x in np.linspace(bars[0, 0], bars[-1, 0] + 60, args.windows + 1)]
+        wf = walk_forward(results, edges, args.rank)
+        print(f"\nWalk-forward ({args.windows} windows, best of window k-1 traded in window k):")
+        print("| Window | Params | In-sample | Out-of-sample |")
+        for step in wf['steps']:
+            print(f"| {day(step['from'])} -> {day(step['to'])} | {describe(step['params'])} | "
+                  f"{step['in_sample']['return_pct']:+.2f}% | {step['out_of_sample']['return_pct']:+.2f}% "
+                  f"({step['out_of_sample']['trades']} trades, DD {step['out_of_sample']['max_dd_pct']}%) |")
+        print(f"Chained out-of-sample return: {wf['oos_return_pct']:+,.2f}%")
+
+    print(f"\nload {t1 - t0:.2f}s, sweep {t2 - t1:.1f}s"
+          + (f" ({len(todo) / (t2 - t1):.0f} sets/s)" if todo and t2 > t1 else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'base': base, 'results': [dict(r, trades=len(r['trades'])) for r in results],
+                       'walk_forward': wf}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
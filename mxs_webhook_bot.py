@@ -7,16 +7,36 @@ MXS Volatile Coin Strategy - 30M/4H Webhook Trading Bot
 """
 
 import os
+import sys
+import re
 import json
 import hmac
 import hashlib
 import base64
 import time
+import bisect
+import threading
 import requests
 import uuid
-from flask import Flask, request, jsonify
+import queue
+import atexit
+import sqlite3
+import logging
+import itertools
+import gzip
+import contextvars
+from contextlib import contextmanager, nullcontext
+import websocket
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html import escape
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
 from dotenv import load_dotenv
+from mxs_strategy import LEVERAGE, MARGIN_MODE, SymbolConfig, SymbolState, signal_kind, parse_alert, decide
+from mxs_candles import PIVOT_BARS, CandleEngine
 
 load_dotenv()
 
@@ -28,79 +48,1041 @@ app = Flask(__name__)
 API_KEY = os.environ.get('BLOFIN_API_KEY', '')
 API_SECRET = os.environ.get('BLOFIN_API_SECRET', '')
 PASSPHRASE = os.environ.get('BLOFIN_PASSPHRASE', '')
-BASE_URL = "https://openapi.blofin.com"
+BASE_URL = os.environ.get('BLOFIN_BASE_URL', 'https://openapi.blofin.com')   # e.g. blofin_sim.py
 
 SYMBOL = "FARTCOIN-USDT"
-LEVERAGE = 3              # 3x leverage (confirmed in backtest)
-STOP_BUFFER = 0.005       # 0.5% buffer on HTF swings
-MAX_STOP_PCT = 0.01       # 1% max stop cap (critical for volatile coins)
-MARGIN_MODE = "isolated"
+# Strategy parameters (LEVERAGE, STOP_BUFFER, MAX_STOP_PCT, ...) live in mxs_strategy.py
+
+# Multi-symbol - instruments traded from this process, routed by the alert's instId.
+# The settings above are defaults; SYMBOL_CONFIG_FILE can override them per symbol:
+#   {"WIF-USDT": {"leverage": 2, "stop_buffer": 0.004, "max_stop_pct": 0.012, "size_pct": 0.1}}
+SYMBOLS = [x.strip().upper() for x in os.environ.get('SYMBOLS', SYMBOL).split(',') if x.strip()]
+SYMBOL_CONFIG_FILE = os.environ.get('SYMBOL_CONFIG_FILE', 'symbols.json')
+
+# HTTP client - one pooled keep-alive session shared by every BloFin call
+BLOFIN_POOL_SIZE = int(os.environ.get('BLOFIN_POOL_SIZE', 10))       # max open connections
+BLOFIN_MAX_RETRIES = int(os.environ.get('BLOFIN_MAX_RETRIES', 2))    # connect errors, GET 429/5xx
+BLOFIN_BACKOFF = float(os.environ.get('BLOFIN_BACKOFF', 0.1))        # seconds, doubles per retry
+BLOFIN_TIMEOUT = float(os.environ.get('BLOFIN_TIMEOUT', 10))
+BLOFIN_WARMUP = os.environ.get('BLOFIN_WARMUP', '1') == '1'         # pre-open connections at boot
+
+# Rate limits - BloFin allows 500 REST requests/min per IP and 30 trade requests/10s per account.
+# Orders (any non-GET) go ahead of reads, and reads can't spend the last BLOFIN_READ_RESERVE of a bucket.
+BLOFIN_RATE_LIMIT = os.environ.get('BLOFIN_RATE_LIMIT', '500/60')               # requests/seconds, all REST
+BLOFIN_TRADE_RATE_LIMIT = os.environ.get('BLOFIN_TRADE_RATE_LIMIT', '30/10')    # POST /api/v1/trade/*
+BLOFIN_READ_RESERVE = float(os.environ.get('BLOFIN_READ_RESERVE', 0.2))
+
+# Account stream - positions/orders/balance pushed over the private WebSocket
+BLOFIN_WS_PRIVATE_URL = os.environ.get('BLOFIN_WS_PRIVATE_URL', 'wss://openapi.blofin.com/ws/private')
+ACCOUNT_STREAM = os.environ.get('ACCOUNT_STREAM', '1') == '1'
+ACCOUNT_CACHE_MAX_AGE = float(os.environ.get('ACCOUNT_CACHE_MAX_AGE', 5))   # seconds before REST fallback
+WS_PING_INTERVAL = 20     # BloFin drops idle sockets after 30s
+
+# Price stream - last price per instrument from the public tickers channel
+BLOFIN_WS_PUBLIC_URL = os.environ.get('BLOFIN_WS_PUBLIC_URL', 'wss://openapi.blofin.com/ws/public')
+PRICE_STREAM = os.environ.get('PRICE_STREAM', '1') == '1'
+PRICE_MAX_AGE = float(os.environ.get('PRICE_MAX_AGE', 5))   # seconds before REST fallback
+
+# Candle engine - 30M/4H swings and breaks computed in-process from the public 1m kline stream (mxs_candles.py)
+CANDLE_ENGINE = os.environ.get('CANDLE_ENGINE', 'off').lower()   # 'off', 'shadow' (log + cross-check alerts), 'live' (engine trades)
+CANDLE_PIVOT = int(os.environ.get('CANDLE_PIVOT', PIVOT_BARS))  # bars each side of a swing
+CANDLE_HISTORY = 100            # closed 30M/4H bars read over REST on each (re)connect to restore swings and trend
+CANDLE_MATCH_WINDOW = float(os.environ.get('CANDLE_MATCH_WINDOW', 300))   # seconds an engine event and an alert may differ by
+
+# Webhook mode - 'sync' executes inside the request, 'queue' acks and executes on a worker
+WEBHOOK_MODE = os.environ.get('WEBHOOK_MODE', 'sync').lower()
+SIGNAL_RESULTS_MAX = int(os.environ.get('SIGNAL_RESULTS_MAX', 1000))   # outcomes kept for /signals/<id>
+
+# Idempotency - repeated deliveries of one alert get the first delivery's response
+DEDUP_TTL = float(os.environ.get('DEDUP_TTL', 300))     # seconds, 0 disables; keep under the 30M bar
+DEDUP_MAX = int(os.environ.get('DEDUP_MAX', 2048))      # alerts remembered (least recently seen evicted)
+DEDUP_WAIT = 30     # seconds a duplicate waits for the original still being processed
+
+# Coalescing - a burst of 4H swing updates becomes one transition; entries/exits bypass it
+COALESCE_MS = float(os.environ.get('COALESCE_MS', 250))   # window after a symbol's first update, 0 disables
+COALESCED_KINDS = ('4H_UPDATE', '4H_OTHER')
+
+# Dashboard - '/' renders from memory only; polls /dashboard.json, or gets pushes over Server-Sent Events (/events)
+DASHBOARD_MAX_STREAMS = int(os.environ.get('DASHBOARD_MAX_STREAMS', 0))   # each open tab holds a thread: 0 = poll only
+DASHBOARD_STREAM_SECS = 300    # a stream ends after this and the browser reconnects
+DASHBOARD_HEARTBEAT = 15       # seconds between keep-alives (also how often shared state is re-read)
+DASHBOARD_DEBOUNCE = 0.2       # a change waits this long so one signal's log lines go out as one push
+
+# Entry pipeline - wait for the reversal close to show flat instead of sleeping
+CLOSE_CONFIRM_TIMEOUT = float(os.environ.get('CLOSE_CONFIRM_TIMEOUT', 3))   # seconds
+CLOSE_POLL_INTERVAL = 0.1   # REST poll if the stream hasn't pushed the close by then
+
+# Stop engine - trailed stops amend the exchange SL; armed stops are also watched on price ticks
+LOCAL_STOPS = os.environ.get('LOCAL_STOPS', 'watch').lower()   # 'watch' (log only), 'enforce' (close on breach, opt-in), 'off'
+
+# Startup - warm-up and exchange reads run in the background; /ready answers 503 until they finish
+STARTUP_RECONCILE = os.environ.get('STARTUP_RECONCILE', 'fix').lower()   # 'fix' (correct local state), 'log' (report only), 'off'
+STARTUP_WORKERS = int(os.environ.get('STARTUP_WORKERS', 8))    # concurrent boot requests
+STARTUP_RETRY_SECS = float(os.environ.get('STARTUP_RETRY_SECS', 120))   # give up on the position/stop reads after this
+RECONCILE_LEASE = 'startup-reconcile'   # lease name: one worker at a time reads and reconciles
+RECONCILE_TOLERANCE = 0.001    # entry/stop prices this close (relative) count as equal
+
+# Logging - the request path only queues records; a writer thread formats them to stdout and a rotating JSONL file
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()          # DEBUG adds the raw webhook payloads
+LOG_FILE = os.environ.get('LOG_FILE', 'bot_log.jsonl')           # '' = stdout only, '{pid}' = one file per worker
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUPS = int(os.environ.get('LOG_BACKUPS', 5))
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 10))   # keep 1 in N of the per-signal state dumps
+SAMPLED_TAGS = ('STATE', 'SWINGS', 'HTF SWINGS')
+LOG_QUEUE_MAX = 10000          # records waiting for the writer; past this they are dropped, never waited on
+
+# Traffic capture - every inbound webhook with its outcome and exchange calls, for mxs_replay.py
+CAPTURE_FILE = os.environ.get('CAPTURE_FILE', '')    # '' = off, '.gz' compresses, '{pid}' = one file per worker
 
 # =============================================================================
-# STATE PERSISTENCE
+# LOGGING - compact records queued on the request path, written in batches
 # =============================================================================
-STATE_FILE = 'bot_state.json'
+class LogWriter:
+    """
+    Structured log pipeline. log() only puts a (ts, level, tag, symbol, msg,
+    args, fields) tuple on a bounded queue. One writer thread drains it in
+    batches. It does the %-formatting and writes each batch to stdout as
+    '[TAG] SYMBOL message' lines and to a size-rotated JSONL file, with one
+    write apiece. When the queue is full a record is dropped and counted, so
+    a slow stdout never blocks a webhook.
+    """
+    def __init__(self, path, max_bytes, backups, maxsize):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.f = open(path, 'a') if path else None
+        threading.Thread(target=self._writer, name='log-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def put(self, rec):
+        try:
+            self.queue.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            text, lines = [], []
+            for ts, level, tag, symbol, msg, args, fields in batch:
+                try:
+                    msg = msg % args if args else str(msg)
+                except Exception as e:
+                    msg = f"{msg} {args!r} (bad log format: {e})"
+                text.append(f"{f'[{tag}] ' if tag else ''}{symbol + ' ' if symbol else ''}{msg}\n")
+                if self.f:
+                    rec = {'ts': round(ts, 3), 'level': logging.getLevelName(level), 'tag': tag, 'msg': msg}
+                    if symbol:
+                        rec['symbol'] = symbol
+                    rec.update(fields)
+                    lines.append(json.dumps(rec, default=str) + '\n')
+            try:
+                sys.stdout.write(''.join(text))
+                sys.stdout.flush()
+                if self.f:
+                    self.f.write(''.join(lines))
+                    self.f.flush()
+                    if self.f.tell() >= self.max_bytes:
+                        self._rotate()
+            except Exception as e:
+                sys.stderr.write(f"[LOG WRITER ERROR] {e}\n")
+            for _ in batch:
+                self.queue.task_done()
+
+    def _rotate(self):
+        """bot_log.jsonl -> .1 -> .2 ... up to LOG_BACKUPS, like RotatingFileHandler"""
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self.f = open(self.path, 'w')
+
+    def flush(self):
+        self.queue.join()
+
+class LogBridge(logging.Handler):
+    """Feeds records from the stdlib 'mxs' logger (mxs_strategy) into the same writer"""
+    def emit(self, record):
+        log_writer.put((record.created, record.levelno, getattr(record, 'tag', record.name), None,
+                        record.msg, record.args, {}))
+
+log_writer = LogWriter(LOG_FILE.replace('{pid}', str(os.getpid())), LOG_MAX_BYTES, LOG_BACKUPS, LOG_QUEUE_MAX)
+log_level = logging.getLevelName(LOG_LEVEL)
+logging.getLogger('mxs').setLevel(log_level)
+logging.getLogger('mxs').addHandler(LogBridge())
+logging.getLogger('mxs').propagate = False
+log_samples = {tag: itertools.count() for tag in SAMPLED_TAGS}
+
+def log(tag, msg, *args, symbol=None, level=logging.INFO, **fields):
+    """Queue one record. %-style args are formatted on the writer thread, not here."""
+    if level < log_level:
+        return
+    n = log_samples.get(tag)
+    if n is not None and next(n) % LOG_SAMPLE_EVERY:
+        return
+    log_writer.put((time.time(), level, tag, symbol, msg, args, fields))
+
+# =============================================================================
+# TRAFFIC CAPTURE - inbound webhooks, their outcome and exchange calls, for mxs_replay.py
+# =============================================================================
+current_capture = contextvars.ContextVar('current_capture', default=None)
 
-def load_state():
+class TrafficCapture:
+    """
+    One JSON line per inbound webhook: arrival time, raw body, response,
+    handling ms and the exchange calls made for it as [offset ms, method,
+    path, order body, BloFin code, msg, ms]. The record is current in the
+    request's context while the webhook runs; SignalQueue carries that
+    context to the lane worker, so a queued signal's calls and outcome land
+    in the same record, which is written once both have finished. The first
+    line is a header with the config, strategy state and positions the
+    capture starts from. Lines go through a bounded queue to a writer thread
+    like the log: dropped and counted when full, never waited on.
+    """
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.started = False
+        self.lock = threading.Lock()
+        self.f = None
+        if path:
+            self.f = gzip.open(path, 'at') if path.endswith('.gz') else open(path, 'a')
+            threading.Thread(target=self._writer, name='capture-writer', daemon=True).start()
+            atexit.register(self.close)
+
+    def header(self):
+        return {'capture': 1, 't': time.time(), 'boot': BOOT_ID, 'pid': os.getpid(),
+                'config': {'WEBHOOK_MODE': WEBHOOK_MODE, 'COALESCE_MS': COALESCE_MS, 'DEDUP_TTL': DEDUP_TTL,
+                           'CANDLE_ENGINE': CANDLE_ENGINE, 'LOCAL_STOPS': LOCAL_STOPS},
+                'symbols': {sym: st.cfg.to_dict() for sym, st in states.items()},
+                'state': current_snapshot()['symbols'],
+                'positions': {sym: account_cache.get_position(sym, max_age=None) for sym in states},
+                'balance': account_cache.get_balance(max_age=None)}
+
+    @contextmanager
+    def webhook(self, raw):
+        """Capture the webhook handled inside the block; answer(rec, body, code) sets its response"""
+        if not self.f:
+            yield None
+            return
+        with self.lock:
+            first, self.started = not self.started, True
+        if first:
+            self.put(self.header())
+        rec = {'t': time.time(), 'raw': raw, 'x': [], 'open': 1, 't0': time.perf_counter()}
+        token = current_capture.set(rec)
+        try:
+            yield rec
+        except Exception as e:
+            self.answer(rec, {'error': str(e)}, 500)
+            raise
+        finally:
+            current_capture.reset(token)
+            self.release(rec)
+
+    def answer(self, rec, body, code):
+        if rec is not None:
+            rec.update(code=code, resp=body, ms=round((time.perf_counter() - rec['t0']) * 1000, 2))
+
+    def call(self, method, endpoint, body, r, ms):
+        """An exchange call made for the current record (no-op outside one)"""
+        rec = current_capture.get()
+        if rec is not None:
+            order = json.loads(body) if body and method == 'POST' else None
+            rec['x'].append([round((time.perf_counter() - rec['t0']) * 1000, 2), method, endpoint, order,
+                             str(r.get('code')) if r is not None else 'ERR', (r or {}).get('msg') or None,
+                             round(ms, 2)])
+
+    def queued(self):
+        """on_done for a signal the current webhook queued: its record waits for the outcome"""
+        rec = current_capture.get()
+        if rec is None:
+            return None
+        rec['open'] += 1
+
+        def on_done(q):
+            rec['run'] = {'code': q['http_status'], 'resp': q['result'],
+                          'queue_ms': round((q['started'] - q['received']) * 1000, 2),
+                          'exec_ms': round((q['finished'] - q['started']) * 1000, 2)}
+            self.release(rec)
+        return on_done
+
+    def release(self, rec):
+        with self.lock:
+            rec['open'] -= 1
+            done = rec['open'] == 0
+        if done:
+            del rec['open'], rec['t0']
+            self.put(rec)
+
+    def put(self, rec):
+        try:
+            self.queue.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.f.write(''.join(json.dumps(rec, separators=(',', ':'), default=str) + '\n' for rec in batch))
+                self.f.flush()
+            except Exception as e:
+                log('CAPTURE ERROR', '%s', e, level=logging.ERROR)
+            for _ in batch:
+                self.queue.task_done()
+
+    def close(self):
+        self.queue.join()
+        self.f.close()
+
+capture = TrafficCapture(CAPTURE_FILE.replace('{pid}', str(os.getpid())), LOG_QUEUE_MAX)
+
+# =============================================================================
+# PER-SYMBOL CONFIG
+# =============================================================================
+def load_symbol_configs():
+    overrides = {}
     try:
-        with open(STATE_FILE, 'r') as f:
-            state = json.load(f)
-            print(f"[STARTUP] Loaded state from file: {state}")
-            return state
+        with open(SYMBOL_CONFIG_FILE, 'r') as f:
+            overrides = {k.upper(): v for k, v in json.load(f).items()}
+        log('STARTUP', 'Loaded symbol config from %s: %s', SYMBOL_CONFIG_FILE, sorted(overrides))
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        print(f"[STARTUP] No saved state ({e}), starting fresh")
+        log('STARTUP', 'Bad %s (%s), using defaults', SYMBOL_CONFIG_FILE, e, level=logging.WARNING)
+    return {sym: SymbolConfig(sym, **overrides.get(sym, {})) for sym in SYMBOLS}
+
+# =============================================================================
+# STATE PERSISTENCE - append-only journal + atomic snapshot
+# =============================================================================
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'journal').lower()   # 'journal' (1 worker) or 'sqlite' (N workers)
+STATE_FILE = 'bot_state.json'                # snapshot, replaced atomically on compaction
+STATE_JOURNAL = 'bot_state.journal'          # one JSON line per change since the snapshot
+JOURNAL_FSYNC_INTERVAL = float(os.environ.get('JOURNAL_FSYNC_INTERVAL', 0.2))   # seconds
+JOURNAL_COMPACT_RECORDS = int(os.environ.get('JOURNAL_COMPACT_RECORDS', 1000))
+STATE_DB = os.environ.get('STATE_DB', 'bot_state.db')
+STATE_LEASE_TTL = float(os.environ.get('STATE_LEASE_TTL', 30))   # seconds a dead worker can block a symbol
+
+class StateConflict(Exception):
+    pass
+
+class StateJournal:
+    """
+    Crash-safe state store.
+    - append(): one small JSON line per change, handed to the OS immediately
+      (survives a process crash); fsync is batched every fsync_interval
+    - compaction (background, every compact_records appends): snapshot written
+      to a temp file, fsynced, renamed over the old one, then journal truncated
+    - replay(): snapshot + journal records with seq above the snapshot's seq,
+      so a crash between rename and truncate replays nothing twice
+    """
+    def __init__(self, snapshot_path, journal_path, fsync_interval, compact_records, snapshot_fn):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.fsync_interval = fsync_interval
+        self.compact_records = compact_records
+        self.snapshot_fn = snapshot_fn
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.records = 0          # appended since the last compaction
+        self.unsynced = 0
+        self.f = None
+
+    def replay(self):
+        state = {'symbols': {}}
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                state = json.load(f)
+            if 'symbols' not in state:
+                # Single-symbol file from before multi-symbol support
+                state = {'symbols': {SYMBOL: state}}
+            log('STARTUP', 'Loaded snapshot %s (seq %s)', self.snapshot_path, state.get('seq', 0))
+        except FileNotFoundError:
+            log('STARTUP', 'No snapshot, starting fresh')
+        except Exception as e:
+            bad = f"{self.snapshot_path}.corrupt-{int(time.time())}"
+            os.replace(self.snapshot_path, bad)
+            log('STARTUP ERROR', 'Unreadable snapshot (%s), moved to %s', e, bad, level=logging.ERROR)
+        self.seq = state.get('seq', 0)
+
+        applied = torn = 0
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        torn += 1      # partial last write from a crash
+                        continue
+                    if rec['seq'] <= self.seq:
+                        continue
+                    if rec['k'] == 'state':
+                        state['symbols'][rec['sym']] = rec['s']
+                    self.seq = rec['seq']
+                    applied += 1
+        except FileNotFoundError:
+            pass
+        self.records = applied
+        log('STARTUP', 'Replayed %d journal record(s)%s', applied, f', skipped {torn} torn' if torn else '')
+        return state
+
+    def open(self):
+        self.f = open(self.journal_path, 'a')
+        threading.Thread(target=self._sync_loop, name='journal-sync', daemon=True).start()
+        atexit.register(self.sync)
+
+    def append(self, kind, **fields):
+        with self.lock:
+            self.seq += 1
+            fields.update(seq=self.seq, k=kind)
+            self.f.write(json.dumps(fields, separators=(',', ':')) + '\n')
+            self.f.flush()
+            self.records += 1
+            self.unsynced += 1
+
+    def sync(self):
+        with self.lock:
+            if self.unsynced and self.f:
+                os.fsync(self.f.fileno())
+                self.unsynced = 0
+
+    # Store interface shared with SqliteStateStore. A journal is single-process,
+    # so leasing and refreshing are no-ops.
+    def save_symbol(self, st):
+        self.append('state', sym=st.symbol, s=st.to_dict())
+
+    def lease(self, symbol, wait=None):
+        return nullcontext()
+
+    def refresh(self, st):
+        pass
+
+    def compact(self):
+        with self.lock:
+            snap = self.snapshot_fn()
+            snap['seq'] = self.seq
+            tmp = self.snapshot_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(snap, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self.f.close()
+            self.f = open(self.journal_path, 'w')
+            self.records = 0
+            self.unsynced = 0
+        log('STATE COMPACTED', 'snapshot at seq %s', snap['seq'])
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self.sync()
+                if self.records >= self.compact_records:
+                    self.compact()
+            except Exception as e:
+                log('STATE SAVE ERROR', '%s', e, level=logging.ERROR)
+
+class SqliteStateStore:
+    """
+    Shared state for N gunicorn workers/threads, SQLite in WAL mode.
+    - symbol_state: one row per symbol with a version; save_symbol() is a
+      compare-and-swap on that version, so a stale writer fails loudly
+    - symbol_lease: cross-process per-symbol lock held while a signal is
+      handled, so two workers can never both enter the same symbol; it
+      expires after STATE_LEASE_TTL in case the holder dies
+    """
+    def __init__(self, path, lease_ttl):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.local = threading.local()
+
+    def conn(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            c.execute('PRAGMA journal_mode=WAL')
+            c.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = c
+        return c
+
+    def replay(self):
+        c = self.conn()
+        c.executescript("""
+            CREATE TABLE IF NOT EXISTS symbol_state (
+                symbol TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL, updated REAL);
+            CREATE TABLE IF NOT EXISTS symbol_lease (
+                symbol TEXT PRIMARY KEY, owner TEXT, expires REAL);
+        """)
+        rows = c.execute('SELECT symbol, version, data FROM symbol_state').fetchall()
+        log('STARTUP', 'Loaded %d symbol(s) from %s', len(rows), self.path)
         return {
-            'htf_trend': None,
-            'ltf_trend': None,
-            'had_deviation': False,
-            'position': None,
-            'entry': None,
-            'stop': None,
-            'htf_swing_low': None,
-            'htf_swing_high': None,
-            'signal_log': []
+            'symbols': {sym: json.loads(data) for sym, _, data in rows},
+            'versions': {sym: v for sym, v, _ in rows}
         }
 
-def save_state():
-    state = {
-        'htf_trend': htf_trend,
-        'ltf_trend': ltf_trend,
-        'had_deviation': had_deviation,
-        'position': current_position,
-        'entry': entry_price,
-        'stop': stop_price,
-        'htf_swing_low': htf_swing_low,
-        'htf_swing_high': htf_swing_high,
-        'signal_log': signal_log[-50:]
-    }
-    try:
-        with open(STATE_FILE, 'w') as f:
-            json.dump(state, f)
-        print(f"[STATE SAVED] htf={htf_trend}, ltf={ltf_trend}, dev={had_deviation}, pos={current_position}")
-    except Exception as e:
-        print(f"[STATE SAVE ERROR] {e}")
+    def open(self):
+        pass
+
+    def save_symbol(self, st):
+        c = self.conn()
+        data = json.dumps(st.to_dict())
+        version = st.version + 1
+        if st.version == 0:
+            cur = c.execute('INSERT OR IGNORE INTO symbol_state VALUES (?, 1, ?, ?)', (st.symbol, data, time.time()))
+        else:
+            cur = c.execute('UPDATE symbol_state SET version = ?, data = ?, updated = ? '
+                            'WHERE symbol = ? AND version = ?', (version, data, time.time(), st.symbol, st.version))
+        if cur.rowcount != 1:
+            raise StateConflict(f"{st.symbol} changed by another worker (had v{st.version})")
+        st.version = version
+
+    def refresh(self, st):
+        """Pull another worker's newer state; its trades also make our cached position suspect"""
+        row = self.conn().execute('SELECT version, data FROM symbol_state WHERE symbol = ?', (st.symbol,)).fetchone()
+        if row and row[0] != st.version:
+            st.load(json.loads(row[1]))
+            st.version = row[0]
+            account_cache.invalidate(st.symbol)
+            change_feed.notify()
+
+    @contextmanager
+    def lease(self, symbol, wait=None):
+        c = self.conn()
+        c.execute('INSERT OR IGNORE INTO symbol_lease VALUES (?, NULL, 0)', (symbol,))
+        deadline = time.time() + (self.lease_ttl if wait is None else wait)
+        while True:
+            now = time.time()
+            cur = c.execute('UPDATE symbol_lease SET owner = ?, expires = ? '
+                            'WHERE symbol = ? AND (owner IS NULL OR expires < ?)',
+                            (self.owner, now + self.lease_ttl, symbol, now))
+            if cur.rowcount == 1:
+                break
+            if now > deadline:
+                raise StateConflict(f"{symbol} lease busy for {self.lease_ttl}s")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            c.execute('UPDATE symbol_lease SET owner = NULL WHERE symbol = ? AND owner = ?', (symbol, self.owner))
 
-def log_signal(msg):
-    global signal_log
-    entry = {'time': datetime.now().isoformat(), 'msg': msg}
+# =============================================================================
+# EVENT STORE - ring buffer for the hot path, indexed SQLite history behind /logs
+# =============================================================================
+EVENT_DB = os.environ.get('EVENT_DB', 'events.db')
+EVENT_RETENTION_DAYS = float(os.environ.get('EVENT_RETENTION_DAYS', 180))   # 0 keeps everything
+LOG_RING_SIZE = 200       # recent events kept in memory for /status and the dashboard
+
+def event_type(msg):
+    """'LONG ENTERED: size=...' -> 'LONG_ENTERED', '4H OTHER (X): ...' -> '4H_OTHER'"""
+    m = re.match(r'([A-Z0-9 _]+?)(?: \(.*?\))?:', msg)
+    return m.group(1).strip().replace(' ', '_') if m else 'LOG'
+
+class EventStore:
+    """
+    Persistent signal/event history, indexed by time, type and symbol.
+    log_signal() only enqueues; a writer thread batches the inserts, and the
+    same thread prunes events older than EVENT_RETENTION_DAYS once a day.
+    Pages are keyed by a (ts, id) cursor so deep pages cost the same as the first.
+    """
+    def __init__(self, path, retention_days):
+        self.path = path
+        self.retention_days = retention_days
+        self.pending = queue.Queue()
+        self.local = threading.local()
+
+    def conn(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            c.execute('PRAGMA journal_mode=WAL')
+            c.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = c
+        return c
+
+    def open(self):
+        self.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, time TEXT,
+                type TEXT, symbol TEXT, msg TEXT);
+            CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+            CREATE INDEX IF NOT EXISTS events_type_ts ON events (type, ts);
+            CREATE INDEX IF NOT EXISTS events_symbol_ts ON events (symbol, ts);
+        """)
+        threading.Thread(target=self._writer, name='event-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, entry):
+        self.pending.put(entry)
+
+    def _writer(self):
+        last_prune = 0
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                c = self.conn()
+                with c:
+                    c.execute('BEGIN')
+                    c.executemany('INSERT INTO events (ts, time, type, symbol, msg) VALUES (?, ?, ?, ?, ?)',
+                                  [(e['ts'], e['time'], e['type'], e.get('symbol'), e['msg']) for e in batch])
+                if self.retention_days and time.time() - last_prune > 86400:
+                    c.execute('DELETE FROM events WHERE ts < ?', (time.time() - self.retention_days * 86400,))
+                    last_prune = time.time()
+            except Exception as e:
+                log('EVENT STORE ERROR', '%s', e, level=logging.ERROR)
+            for _ in batch:
+                self.pending.task_done()
+
+    def flush(self):
+        self.pending.join()
+
+    def query(self, since=None, until=None, types=None, symbol=None, cursor=None, limit=100):
+        """Newest-first page of events; returns (events oldest-first, next_cursor)"""
+        where, args = [], []
+        if since is not None:
+            where.append('ts >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('ts < ?')
+            args.append(until)
+        if types:
+            where.append(f"type IN ({','.join('?' * len(types))})")
+            args.extend(types)
+        if symbol:
+            where.append('symbol = ?')
+            args.append(symbol)
+        if cursor:
+            ts, row_id = cursor.split(':')
+            where.append('(ts, id) < (?, ?)')
+            args.extend([float(ts), int(row_id)])
+        sql = 'SELECT id, ts, time, type, symbol, msg FROM events'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        rows = self.conn().execute(sql + ' ORDER BY ts DESC, id DESC LIMIT ?', args + [limit]).fetchall()
+        events = [dict({'time': t, 'type': typ, 'msg': m}, **({'symbol': sym} if sym else {}))
+                  for _, _, t, typ, sym, m in reversed(rows)]
+        next_cursor = f"{rows[-1][1]!r}:{rows[-1][0]}" if len(rows) == limit else None
+        return events, next_cursor
+
+class ChangeFeed:
+    """
+    Version counter bumped on every state save, log event and position update.
+    /status and the dashboard rebuild their snapshots only when it moves;
+    dashboard streams block on it.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.version = 0
+
+    def notify(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, seen, timeout):
+        """Block until the version moves past seen (or timeout), returns the current version"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+change_feed = ChangeFeed()
+
+def current_snapshot():
+    return {'symbols': {sym: s.to_dict() for sym, s in states.items()}}
+
+def save_state(st=None):
+    """Persist the state of one symbol (or every symbol when st is None)"""
+    t0 = time.perf_counter()
+    for s in ([st] if st else list(states.values())):
+        try:
+            state_store.save_symbol(s)
+        except StateConflict as e:
+            log('STATE CONFLICT', '%s - reloading, local change dropped', e, level=logging.WARNING)
+            state_store.refresh(s)
+        except Exception as e:
+            log('STATE SAVE ERROR', '%s', e, level=logging.ERROR)
+    stage_add('save_state', (time.perf_counter() - t0) * 1000)
+    change_feed.notify()
+    if st:
+        log('STATE SAVED', 'htf=%s, ltf=%s, dev=%s, pos=%s', st.htf_trend, st.ltf_trend, st.had_deviation, st.position,
+            symbol=st.symbol)
+
+def log_signal(msg, symbol=None, etype=None):
+    entry = {'time': datetime.now().isoformat(), 'type': etype or event_type(msg), 'msg': msg}
+    if symbol:
+        entry['symbol'] = symbol
     signal_log.append(entry)
-    if len(signal_log) > 50:
-        signal_log = signal_log[-50:]
-    print(f"[LOG] {msg}")
+    event_store.add(dict(entry, ts=time.time()))
+    change_feed.notify()
+    log('LOG', msg, symbol=symbol, event=entry['type'])
+
+def recent_logs(n):
+    """Newest n events - shared store when several workers log, else this process's ring"""
+    if STATE_BACKEND == 'sqlite':
+        return event_store.query(limit=n)[0]
+    return list(signal_log)[-n:]
+
+# Load state at startup: journal replay or shared sqlite store
+if STATE_BACKEND == 'sqlite':
+    state_store = SqliteStateStore(STATE_DB, STATE_LEASE_TTL)
+else:
+    state_store = StateJournal(STATE_FILE, STATE_JOURNAL, JOURNAL_FSYNC_INTERVAL, JOURNAL_COMPACT_RECORDS, current_snapshot)
+_s = state_store.replay()
+symbol_configs = load_symbol_configs()
+states = {sym: SymbolState(cfg, _s['symbols'].get(sym), _s.get('versions', {}).get(sym, 0))
+          for sym, cfg in symbol_configs.items()}
+state_store.open()
+
+event_store = EventStore(EVENT_DB, EVENT_RETENTION_DAYS)
+event_store.open()
+signal_log = deque(event_store.query(limit=LOG_RING_SIZE)[0], maxlen=LOG_RING_SIZE)
+
+@contextmanager
+def symbol_guard(st):
+    """Exclusive access to one symbol: thread lock, worker lease, then latest shared state"""
+    with st.lock, state_store.lease(st.symbol):
+        state_store.refresh(st)
+        yield st
+
+def peek_shared_state(st):
+    """Read-path refresh. Skipped while this process holds the symbol: that handler's save notifies the feed."""
+    if st.lock.acquire(blocking=False):
+        try:
+            state_store.refresh(st)
+        finally:
+            st.lock.release()
+
+def get_state(symbol):
+    return states.get(str(symbol or SYMBOL).upper())
+
+for _st in states.values():
+    log('INIT', 'HTF: %s, LTF: %s, Deviation: %s, Position: %s', _st.htf_trend, _st.ltf_trend, _st.had_deviation, _st.position,
+        symbol=_st.symbol)
+
+# =============================================================================
+# BLOFIN HTTP CLIENT - pooled keep-alive session + per-endpoint latency stats
+# =============================================================================
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms) for one endpoint"""
+    BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS) + 1)   # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms, error=False):
+        i = bisect.bisect_left(self.BUCKETS, ms)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+            if error:
+                self.errors += 1
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.BUCKETS[i] if i < len(self.BUCKETS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        with self.lock:
+            counts = list(self.counts)
+            count, errors, total, peak = self.count, self.errors, self.total_ms, self.max_ms
+        return {
+            'count': count,
+            'errors': errors,
+            'avg_ms': round(total / count, 2) if count else None,
+            'max_ms': round(peak, 2),
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': [[le, c] for le, c in zip(self.BUCKETS + ('inf',), counts)]
+        }
 
-# Load state at startup
-_s = load_state()
-htf_trend = _s.get('htf_trend')
-ltf_trend = _s.get('ltf_trend')
-had_deviation = _s.get('had_deviation', False)
-current_position = _s.get('position')
-entry_price = _s.get('entry')
-stop_price = _s.get('stop')
-htf_swing_low = _s.get('htf_swing_low')
-htf_swing_high = _s.get('htf_swing_high')
-signal_log = _s.get('signal_log', [])
+endpoint_stats = {}
+_endpoint_stats_lock = threading.Lock()
+
+def get_endpoint_stats(path):
+    stats = endpoint_stats.get(path)
+    if stats is None:
+        with _endpoint_stats_lock:
+            stats = endpoint_stats.setdefault(path, LatencyHistogram())
+    return stats
+
+def make_session():
+    # Only GETs are retried on 429/5xx - a POST that reached BloFin may already
+    # have filled, so it is never re-sent. Connect errors are safe to retry for
+    # every method because the request never left the box.
+    retry = Retry(total=BLOFIN_MAX_RETRIES, backoff_factor=BLOFIN_BACKOFF,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BLOFIN_POOL_SIZE, max_retries=retry)
+    s = requests.Session()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+session = make_session()
+
+class RateLimiter:
+    """
+    Token bucket with two lanes. 'order' takes any token and goes first;
+    'read' waits while an order is waiting and leaves `reserve` tokens for
+    orders. acquire() blocks until a token is free and returns the ms
+    waited, or raises RateLimited after timeout.
+    For a limit of `rate` per `per` seconds the bucket holds rate/2 and
+    refills rate/2 per period: a full burst plus its refill stays within
+    the limit over any window, wherever the exchange starts counting.
+    """
+    def __init__(self, name, spec, reserve):
+        rate, per = (float(x) for x in spec.split('/'))
+        self.name = name
+        self.capacity = rate / 2
+        self.fill = rate / 2 / per        # tokens per second
+        self.reserve = self.capacity * reserve
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+        self.cond = threading.Condition()
+        self.orders_waiting = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.fill)
+        self.ts = now
+
+    def acquire(self, lane, timeout):
+        floor = 0 if lane == 'order' else self.reserve
+        t0 = time.monotonic()
+        with self.cond:
+            self._refill(t0)
+            if self.tokens >= floor + 1 and (lane == 'order' or not self.orders_waiting):
+                self.tokens -= 1
+                return 0.0
+            if lane == 'order':
+                self.orders_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.tokens >= floor + 1 and (lane == 'order' or not self.orders_waiting):
+                        self.tokens -= 1
+                        return (now - t0) * 1000
+                    left = t0 + timeout - now
+                    if left <= 0:
+                        raise RateLimited(f"{self.name} bucket empty for {timeout}s ({lane})")
+                    self.cond.wait(min(left, max((floor + 1 - self.tokens) / self.fill, 0.001)))
+            finally:
+                if lane == 'order':
+                    self.orders_waiting -= 1
+                    self.cond.notify_all()
+
+    def refund(self):
+        """Give back a token taken for a request that never went out"""
+        with self.cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + 1)
+            self.cond.notify_all()
+
+    def try_acquire(self, lane):
+        """Non-blocking acquire: 0 if a token was taken, else seconds until one may be free"""
+        floor = 0 if lane == 'order' else self.reserve
+        with self.cond:
+            self._refill(time.monotonic())
+            if self.tokens >= floor + 1 and (lane == 'order' or not self.orders_waiting):
+                self.tokens -= 1
+                return 0
+            return max((floor + 1 - self.tokens) / self.fill, 0.001)
+
+    def available(self):
+        with self.cond:
+            self._refill(time.monotonic())
+            return self.tokens
+
+class RateLimited(Exception):
+    pass
+
+rest_limiter = RateLimiter('rest', BLOFIN_RATE_LIMIT, BLOFIN_READ_RESERVE)
+trade_limiter = RateLimiter('trade', BLOFIN_TRADE_RATE_LIMIT, BLOFIN_READ_RESERVE)
+
+def throttle(method, endpoint):
+    """Take the tokens a request needs (trade bucket first), charging any wait to the exchange stage"""
+    lane = 'read' if method == 'GET' else 'order'
+    waited = 0.0
+    trade = lane == 'order' and endpoint.startswith('/api/v1/trade/')
+    if trade:
+        waited += trade_limiter.acquire(lane, BLOFIN_TIMEOUT)
+    try:
+        waited += rest_limiter.acquire(lane, BLOFIN_TIMEOUT)
+    except RateLimited:
+        if trade:
+            trade_limiter.refund()      # the order never went out
+        raise
+    if waited:
+        throttled.inc(lane)
+        throttle_stats[lane].observe(waited)
+        stage_add('exchange', waited)
+
+class SingleFlight:
+    """
+    Identical GETs in flight at once share one upstream call. A GET never
+    joins a call that started before the last write finished, so a read
+    after an order always sees the order.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.generation = 0     # bumped when a write finishes
+
+    def do(self, endpoint, fn):
+        with self.lock:
+            key = (endpoint, self.generation)
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = [threading.Event(), None]
+        if not leader:
+            call[0].wait()
+            singleflight_shared.inc(endpoint.split('?')[0])
+            return call[1]
+        try:
+            call[1] = fn()
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
+        return call[1]
+
+    def wrote(self):
+        with self.lock:
+            self.generation += 1
+
+singleflight = SingleFlight()
+
+def blofin_http(method, endpoint, headers=None, body=None):
+    """Send a request over the pooled session, recording latency under the path"""
+    throttle(method, endpoint)
+    stats = get_endpoint_stats(endpoint.split('?')[0])
+    t0 = time.perf_counter()
+    try:
+        r = session.request(method, BASE_URL + endpoint, headers=headers,
+                            data=body or None, timeout=BLOFIN_TIMEOUT).json()
+    except Exception:
+        ms = (time.perf_counter() - t0) * 1000
+        stats.observe(ms, error=True)
+        stage_add('exchange', ms)
+        capture.call(method, endpoint, body, None, ms)
+        raise
+    ms = (time.perf_counter() - t0) * 1000
+    stats.observe(ms, error=str(r.get('code')) != '0')
+    stage_add('exchange', ms)
+    capture.call(method, endpoint, body, r, ms)
+    return r
+
+def warm_up_connections(n=2):
+    """Open n pooled connections (TCP+TLS) so the first order doesn't pay the handshake"""
+    opened = []
+    def ping():
+        try:
+            blofin_http('GET', f'/api/v1/market/tickers?instId={SYMBOL}')
+            opened.append(1)
+        except Exception as e:
+            log('WARMUP', '%s', e, level=logging.WARNING)
+    threads = [threading.Thread(target=ping, daemon=True) for _ in range(min(n, BLOFIN_POOL_SIZE))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log('WARMUP', '%d/%d connection(s) open to %s', len(opened), len(threads), BASE_URL)
 
-print(f"[INIT] HTF: {htf_trend}, LTF: {ltf_trend}, Deviation: {had_deviation}, Position: {current_position}")
+# =============================================================================
+# METRICS - counters and stage histograms behind /metrics
+# =============================================================================
+class Counter:
+    """Monotonic counts keyed by a tuple of label values"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + 1
+
+    def items(self):
+        with self.lock:
+            return sorted(self.values.items())
+
+# Where a webhook's time goes: parse (JSON) | route (symbol lookup + guard) |
+# coalesce (burst window) | exchange (waiting on BloFin) | save_state | strategy (the rest) | total
+WEBHOOK_STAGES = ('parse', 'route', 'coalesce', 'exchange', 'save_state', 'strategy', 'total')
+webhook_stats = {stage: LatencyHistogram() for stage in WEBHOOK_STAGES}
+webhook_responses = Counter()    # (http status,)
+signal_counts = Counter()        # (symbol, signal kind)
+entry_counts = Counter()         # (symbol, direction)
+exit_counts = Counter()          # (symbol, reason)
+trail_counts = Counter()         # (symbol, side)
+stop_amends = Counter()          # (symbol, 'ok' | 'error')
+local_stop_hits = Counter()      # (symbol, side)
+throttled = Counter()            # (lane,) requests that waited for a rate-limit token
+throttle_stats = {lane: LatencyHistogram() for lane in ('order', 'read')}
+singleflight_shared = Counter()  # (endpoint,) GETs answered by another caller's in-flight request
+reconciled = Counter()           # (symbol, 'cleared' | 'adopted' | 'entry' | 'stop' | 'stray_stops')
+engine_signals = Counter()       # (symbol, signal kind) emitted by the candle engine
+cross_checks = Counter()         # ('matched' | 'engine_only' | 'tradingview_only',)
+_stages = threading.local()      # per-thread breakdown of the signal being handled
+
+def stage_add(stage, ms):
+    """Charge ms to a stage of the signal this thread is handling (no-op elsewhere)"""
+    acc = getattr(_stages, 'acc', None)
+    if acc is not None:
+        acc[stage] = acc.get(stage, 0.0) + ms
+
+@contextmanager
+def signal_stages():
+    _stages.acc = acc = {}
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages.acc = None
+        total = (time.perf_counter() - t0) * 1000
+        for stage in ('route', 'coalesce', 'exchange', 'save_state'):
+            webhook_stats[stage].observe(acc.get(stage, 0.0))
+        webhook_stats['strategy'].observe(max(total - sum(acc.values()), 0.0))
+        webhook_stats['total'].observe(total)
 
 # =============================================================================
 # BLOFIN API
@@ -111,581 +1093,1792 @@ def sign_request(path, method, ts, nonce, body=''):
     return base64.b64encode(bytes(mac.hexdigest(), 'utf-8')).decode()
 
 def api_request(method, endpoint, data=None):
+    """Signed BloFin call; identical concurrent GETs collapse into one (see SingleFlight)"""
+    if method == 'GET':
+        return singleflight.do(endpoint, lambda: signed_request(method, endpoint))
+    try:
+        return signed_request(method, endpoint, data)
+    finally:
+        singleflight.wrote()
+
+def signed_headers(method, endpoint, body=''):
     ts = str(int(time.time() * 1000))
     nonce = str(uuid.uuid4())
-    body = json.dumps(data, separators=(',', ':')) if data else ''
     sig = sign_request(endpoint, method, ts, nonce, body)
-    headers = {
+    return {
         'ACCESS-KEY': API_KEY, 'ACCESS-SIGN': sig, 'ACCESS-TIMESTAMP': ts,
         'ACCESS-PASSPHRASE': PASSPHRASE, 'ACCESS-NONCE': nonce, 'Content-Type': 'application/json'
     }
+
+def signed_request(method, endpoint, data=None):
+    body = json.dumps(data, separators=(',', ':')) if data else ''
+    headers = signed_headers(method, endpoint, body)
     try:
-        if method == 'GET':
-            return requests.get(BASE_URL + endpoint, headers=headers, timeout=10).json()
-        return requests.post(BASE_URL + endpoint, headers=headers, data=body, timeout=10).json()
+        return blofin_http(method, endpoint, headers, body)
     except Exception as e:
-        print(f"[API ERROR] {e}")
+        log('API ERROR', '%s %s: %s', method, endpoint, e, level=logging.ERROR)
         return {'code': '-1', 'msg': str(e)}
 
-def get_usdt_balance():
+def parse_position(pos):
+    positions = float(pos.get('positions', 0) or 0)
+    if positions > 0:
+        return {'side': 'LONG', 'size': positions, 'entry': float(pos.get('averagePrice', 0) or 0)}
+    elif positions < 0:
+        return {'side': 'SHORT', 'size': abs(positions), 'entry': float(pos.get('averagePrice', 0) or 0)}
+    return {'side': None, 'size': 0, 'entry': 0}
+
+def refresh_balance():
     r = api_request('GET', '/api/v1/asset/balances?accountType=futures')
     if r.get('code') == '0':
         for a in r.get('data', []):
             if a.get('currency') == 'USDT':
-                return float(a.get('available', 0))
-    return 0
+                account_cache.set_balance(float(a.get('available', 0)))
+                return True
+    return False
 
-def get_blofin_position():
+def store_positions(r):
+    account_cache.set_positions({p.get('instId'): parse_position(p) for p in r.get('data', [])})
+    return True
+
+def refresh_positions():
     r = api_request('GET', '/api/v1/account/positions')
-    if r.get('code') == '0':
-        for pos in r.get('data', []):
-            if pos.get('instId') == SYMBOL:
-                positions = float(pos.get('positions', 0))
-                if positions > 0:
-                    return {'side': 'LONG', 'size': positions, 'entry': float(pos.get('averagePrice', 0))}
-                elif positions < 0:
-                    return {'side': 'SHORT', 'size': abs(positions), 'entry': float(pos.get('averagePrice', 0))}
-    return {'side': None, 'size': 0, 'entry': 0}
+    return r.get('code') == '0' and store_positions(r)
+
+def get_usdt_balance():
+    bal = account_cache.get_balance()
+    if bal is None and refresh_balance():
+        bal = account_cache.get_balance(max_age=None)
+    return bal or 0
+
+def get_blofin_position(symbol=SYMBOL):
+    pos = account_cache.get_position(symbol)
+    if pos is None and refresh_positions():
+        pos = account_cache.get_position(symbol, max_age=None)
+    return pos or {'side': None, 'size': 0, 'entry': 0}
 
 def get_price(symbol):
+    px = price_cache.get(symbol)
+    if px is not None:
+        return px
     try:
-        r = requests.get("https://openapi.blofin.com/api/v1/market/tickers", timeout=10).json()
+        r = blofin_http('GET', f'/api/v1/market/tickers?instId={symbol}')
         for t in r.get('data', []):
             if t.get('instId') == symbol:
-                return float(t['last'])
+                return price_cache.set(symbol, float(t['last']))
     except:
         pass
     return None
 
-def close_position():
-    print(f"[CLOSE] Closing position...")
+def close_position(symbol=SYMBOL, margin_mode=MARGIN_MODE):
+    log('CLOSE', 'Closing position...', symbol=symbol)
     result = api_request('POST', '/api/v1/trade/close-position',
-        {'instId': SYMBOL, 'marginMode': MARGIN_MODE, 'positionSide': 'net'})
-    print(f"[CLOSE] Result: {result}")
+        {'instId': symbol, 'marginMode': margin_mode, 'positionSide': 'net'})
+    account_cache.invalidate(symbol)
+    log('CLOSE', 'Result: %s', result, symbol=symbol)
     return result
 
-def place_order(side, size, sl=None):
-    data = {'instId': SYMBOL, 'marginMode': MARGIN_MODE, 'positionSide': 'net',
+def place_order(side, size, sl=None, symbol=SYMBOL, margin_mode=MARGIN_MODE):
+    data = {'instId': symbol, 'marginMode': margin_mode, 'positionSide': 'net',
             'side': side, 'orderType': 'market', 'size': str(size)}
     if sl:
         data['slTriggerPrice'] = str(sl)
         data['slOrderPrice'] = '-1'
-    return api_request('POST', '/api/v1/trade/order', data)
-
-def update_stop_loss(new_stop):
-    """Update stop loss on existing position"""
-    # Cancel existing SL and place new one
-    # This is a simplified version - may need adjustment based on Blofin API
-    print(f"[TRAIL] Updating stop to {new_stop}")
-    # For now, we'll track it in state and rely on the next entry to set it
-    # A full implementation would use Blofin's modify order or algo order endpoints
-    return {'status': 'stop_updated', 'new_stop': new_stop}
+    result = api_request('POST', '/api/v1/trade/order', data)
+    account_cache.invalidate(symbol)
+    return result
 
 # =============================================================================
-# STOP CALCULATION WITH 1% CAP
+# ACCOUNT STREAM - private WebSocket feeding an in-memory account cache
 # =============================================================================
-def calculate_stop(entry_px, swing_px, direction):
+class BlofinStream:
     """
-    Calculate stop price with buffer and 1% max cap.
-    - direction: 'LONG' or 'SHORT'
-    - Returns capped stop price
+    Background WebSocket subscription to BloFin.
+    - logs in first when login=True (private channels)
+    - keeps the socket alive with text pings, reconnects with backoff
+    - hands every data push to on_data(channel, arg, data)
+    - calls on_subscribed() once the subscribe is acknowledged
     """
-    if direction == 'LONG':
-        # Stop below swing low
-        raw_stop = swing_px * (1 - STOP_BUFFER)
-        stop_distance_pct = (entry_px - raw_stop) / entry_px
-
-        # Cap at 1% max
-        if stop_distance_pct > MAX_STOP_PCT:
-            capped_stop = entry_px * (1 - MAX_STOP_PCT)
-            print(f"[STOP CAP] Raw stop {raw_stop:.4f} ({stop_distance_pct*100:.1f}%) -> Capped to {capped_stop:.4f} ({MAX_STOP_PCT*100}%)")
-            return capped_stop
-        return raw_stop
-    else:
-        # Stop above swing high
-        raw_stop = swing_px * (1 + STOP_BUFFER)
-        stop_distance_pct = (raw_stop - entry_px) / entry_px
+    def __init__(self, name, url, args, on_data, on_subscribed=None, login=False):
+        self.name = name
+        self.url = url
+        self.args = args
+        self.on_data = on_data
+        self.on_subscribed = on_subscribed
+        self.login = login
+        self.connected = False
+        self.last_msg = 0.0
+        self.reconnects = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, args):
+        """Add channels; sent now if connected, otherwise on the next (re)connect"""
+        args = [a for a in args if a not in self.args]
+        if not args:
+            return
+        self.args.extend(args)
+        ws = self._ws
+        if ws is not None and self.connected:
+            try:
+                ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+            except Exception as e:
+                log(f'{self.name.upper()} WS', 'subscribe failed, will retry on reconnect: %s', e, level=logging.WARNING)
+
+    def alive(self, max_age):
+        return self.connected and time.time() - self.last_msg <= max_age
+
+    def _login_msg(self):
+        ts = str(int(time.time() * 1000))
+        nonce = str(uuid.uuid4())
+        return {'op': 'login', 'args': [{
+            'apiKey': API_KEY, 'passphrase': PASSPHRASE, 'timestamp': ts, 'nonce': nonce,
+            'sign': sign_request('/users/self/verify', 'GET', ts, nonce)
+        }]}
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self._session()
+                backoff = 1
+            except Exception as e:
+                log(f'{self.name.upper()} WS', '%s', e, level=logging.WARNING)
+            self.connected = False
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _session(self):
+        ws = websocket.create_connection(self.url, timeout=10)
+        self._ws = ws
+        try:
+            if self.login:
+                ws.send(json.dumps(self._login_msg()))
+                msg = json.loads(ws.recv())
+                if msg.get('event') != 'login' or str(msg.get('code')) != '0':
+                    raise RuntimeError(f"login failed: {msg}")
+            ws.send(json.dumps({'op': 'subscribe', 'args': self.args}))
+            ws.settimeout(WS_PING_INTERVAL)
+            log(f'{self.name.upper()} WS', 'Connected to %s', self.url)
+            subscribed = False
+            while not self._stop.is_set():
+                try:
+                    raw = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    ws.send('ping')
+                    continue
+                if not raw:
+                    raise RuntimeError('connection closed')
+                self.last_msg = time.time()
+                if raw == 'pong':
+                    continue
+                msg = json.loads(raw)
+                if 'data' in msg:
+                    arg = msg.get('arg', {})
+                    self.on_data(arg.get('channel'), arg, msg['data'])
+                elif msg.get('event') == 'subscribe' and not subscribed:
+                    subscribed = True
+                    if self.on_subscribed:
+                        self.on_subscribed()
+                    self.connected = True
+                elif msg.get('event') == 'error':
+                    raise RuntimeError(f"{msg.get('code')} {msg.get('msg')}")
+        finally:
+            self._ws = None
+            ws.close()
+
+class AccountCache:
+    """
+    Last known positions, USDT balance and open orders.
+    Entries are trusted while the private stream is alive (pushes keep them
+    current); otherwise only for ACCOUNT_CACHE_MAX_AGE seconds after the last
+    REST read. invalidate() forces a REST read after we trade, until the
+    stream pushes the new position.
+    """
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.stream = None
+        self.synced = False           # REST snapshot taken after subscribing
+        self.positions = {}
+        self.positions_ts = 0.0
+        self.balance = None
+        self.balance_ts = 0.0
+        self.orders = {}
+        self.dirty = set()
+
+    def streaming(self):
+        return bool(self.synced and self.stream and self.stream.alive(self.max_age))
+
+    def _fresh(self, ts, max_age):
+        if max_age is None:
+            return True
+        if self.synced and self.stream and self.stream.alive(max_age):
+            return True
+        return time.time() - ts <= max_age
+
+    def get_position(self, inst_id, max_age=-1):
+        max_age = self.max_age if max_age == -1 else max_age
+        with self.lock:
+            if not self.positions_ts or (max_age is not None and inst_id in self.dirty):
+                return None
+            if not self._fresh(self.positions_ts, max_age):
+                return None
+            return dict(self.positions.get(inst_id) or {'side': None, 'size': 0, 'entry': 0})
+
+    def get_balance(self, max_age=-1):
+        max_age = self.max_age if max_age == -1 else max_age
+        with self.lock:
+            if self.balance is None or (max_age is not None and 'balance' in self.dirty):
+                return None
+            if not self._fresh(self.balance_ts, max_age):
+                return None
+            return self.balance
+
+    def set_positions(self, positions):
+        with self.lock:
+            self.positions = positions
+            self.positions_ts = time.time()
+            self.dirty &= {'balance'}
+            self.changed.notify_all()
+        change_feed.notify()
+
+    def set_balance(self, balance):
+        with self.lock:
+            self.balance = balance
+            self.balance_ts = time.time()
+            self.dirty.discard('balance')
+
+    def invalidate(self, inst_id):
+        with self.lock:
+            self.dirty.add(inst_id)
+            self.dirty.add('balance')
+
+    def on_stream_data(self, channel, arg, data):
+        now = time.time()
+        with self.lock:
+            if channel == 'positions':
+                for p in data:
+                    self.positions[p.get('instId')] = parse_position(p)
+                    self.dirty.discard(p.get('instId'))
+                self.positions_ts = now
+            elif channel == 'account':
+                for d in (data.get('details', []) if isinstance(data, dict) else []):
+                    if d.get('currency') == 'USDT':
+                        self.balance = float(d.get('available', 0))
+                        self.balance_ts = now
+                        self.dirty.discard('balance')
+            elif channel == 'orders':
+                for o in data:
+                    if o.get('state') in ('live', 'partially_filled'):
+                        self.orders[o.get('orderId')] = o
+                    else:
+                        self.orders.pop(o.get('orderId'), None)
+            self.changed.notify_all()
+        if channel == 'positions':
+            change_feed.notify()
+
+    def wait_for_update(self, timeout):
+        """Block until the next cache update (True) or timeout (False)"""
+        with self.lock:
+            return self.changed.wait(timeout)
+
+    def on_stream_subscribed(self):
+        # Subscribe first, then snapshot over REST: pushes from here on are deltas
+        with self.lock:
+            self.synced = False
+        ok = refresh_positions() and refresh_balance()
+        with self.lock:
+            self.synced = ok
+        log('ACCOUNT WS', 'Subscribed, REST snapshot %s', 'ok' if ok else 'FAILED')
+
+    def describe(self):
+        now = time.time()
+        with self.lock:
+            return {
+                'source': 'stream' if self.streaming() else 'rest',
+                'positions_age': round(now - self.positions_ts, 3) if self.positions_ts else None,
+                'balance_age': round(now - self.balance_ts, 3) if self.balance_ts else None,
+                'open_orders': len(self.orders),
+                'dirty': sorted(self.dirty)
+            }
+
+account_cache = AccountCache(ACCOUNT_CACHE_MAX_AGE)
+account_stream = BlofinStream(
+    'account', BLOFIN_WS_PRIVATE_URL,
+    [{'channel': 'positions'}, {'channel': 'orders'}, {'channel': 'account'}],
+    account_cache.on_stream_data, account_cache.on_stream_subscribed, login=True)
+account_cache.stream = account_stream
+
+if ACCOUNT_STREAM and API_KEY:
+    account_stream.start()
 
-        # Cap at 1% max
-        if stop_distance_pct > MAX_STOP_PCT:
-            capped_stop = entry_px * (1 + MAX_STOP_PCT)
-            print(f"[STOP CAP] Raw stop {raw_stop:.4f} ({stop_distance_pct*100:.1f}%) -> Capped to {capped_stop:.4f} ({MAX_STOP_PCT*100}%)")
-            return capped_stop
-        return raw_stop
+# =============================================================================
+# PRICE STREAM - public tickers feeding an O(1) last-price cache
+# =============================================================================
+class PriceCache:
+    """
+    Last traded price per instrument. Each quote is a (price, received_at)
+    tuple replaced in a single dict assignment, so reads need no lock.
+    """
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.quotes = {}
+
+    def get(self, symbol, max_age=-1):
+        max_age = self.max_age if max_age == -1 else max_age
+        q = self.quotes.get(symbol)
+        if q is None or (max_age is not None and time.time() - q[1] > max_age):
+            return None
+        return q[0]
+
+    def set(self, symbol, price):
+        self.quotes[symbol] = (price, time.time())
+        return price
+
+    def age(self, symbol):
+        q = self.quotes.get(symbol)
+        return time.time() - q[1] if q else None
+
+    def on_stream_data(self, channel, arg, data):
+        now = time.time()
+        for t in data:
+            if t.get('last'):
+                self.quotes[t.get('instId')] = (float(t['last']), now)
+
+    def describe(self):
+        now = time.time()
+        return {sym: {'price': px, 'age': round(now - ts, 3)} for sym, (px, ts) in self.quotes.items()}
+
+class StopBook:
+    """
+    Armed stop levels, indexed per (instrument, side) in a sorted array:
+    LONG stops fire when price <= level, SHORT stops when price >= level
+    (stored negated, so both sides fire as a suffix). A tick is one dict
+    lookup and a bisect per side; crossed stops are popped, so each fires once.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.books = {}     # (instId, side) -> sorted [(signed level, key)]
+        self.armed = {}     # key -> (instId, side, level)
+
+    def arm(self, key, inst, side, level):
+        with self.lock:
+            self._drop(key)
+            sign = 1 if side == 'LONG' else -1
+            bisect.insort(self.books.setdefault((inst, side), []), (sign * level, key))
+            self.armed[key] = (inst, side, level)
+
+    def disarm(self, key):
+        with self.lock:
+            self._drop(key)
+
+    def _drop(self, key):
+        old = self.armed.pop(key, None)
+        if old:
+            inst, side, level = old
+            arr = self.books[(inst, side)]
+            entry = ((1 if side == 'LONG' else -1) * level, key)
+            i = bisect.bisect_left(arr, entry)
+            if i < len(arr) and arr[i] == entry:
+                del arr[i]
+
+    def on_tick(self, inst, price):
+        """Stops crossed by this price, removed from the book: [(key, side, level)]"""
+        if not self.books.get((inst, 'LONG')) and not self.books.get((inst, 'SHORT')):
+            return []
+        fired = []
+        with self.lock:
+            for side, sign in (('LONG', 1), ('SHORT', -1)):
+                arr = self.books.get((inst, side))
+                if arr:
+                    i = bisect.bisect_left(arr, (sign * price,))
+                    for _, key in arr[i:]:
+                        fired.append((key, side, self.armed.pop(key)[2]))
+                    del arr[i:]
+        return fired
+
+    def describe(self):
+        with self.lock:
+            return {key: {'instId': inst, 'side': side, 'stop': level} for key, (inst, side, level) in self.armed.items()}
+
+price_cache = PriceCache(PRICE_MAX_AGE)
+stop_book = StopBook()
+# a stop hit waits for its symbol's lock, so it must not sit on io_pool, which lock holders wait on
+stop_pools = {sym: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'local-stop-{sym}') for sym in SYMBOLS}
+
+def on_ticker_data(channel, arg, data):
+    price_cache.on_stream_data(channel, arg, data)
+    for t in data:
+        if t.get('last'):
+            px = float(t['last'])
+            for key, side, level in stop_book.on_tick(t.get('instId'), px):
+                stop_pools[key].submit(local_stop_hit, key, side, level, px)
+
+price_stream = BlofinStream('price', BLOFIN_WS_PUBLIC_URL,
+                            [{'channel': 'tickers', 'instId': sym} for sym in SYMBOLS], on_ticker_data)
+
+if PRICE_STREAM:
+    price_stream.start()
 
 # =============================================================================
 # TRADING
 # =============================================================================
-def enter_long(price, swing_low):
-    global current_position, entry_price, stop_price, had_deviation
-
-    stop = calculate_stop(price, swing_low, 'LONG')
-
-    print(f"\n{'='*50}")
-    print(f"ENTERING LONG @ ${price:.6f}")
-    print(f"Swing Low: ${swing_low:.6f}")
-    print(f"Stop: ${stop:.6f} ({((price-stop)/price)*100:.2f}% risk)")
-    print(f"{'='*50}")
-
-    blofin_pos = get_blofin_position()
-    if blofin_pos['side'] == 'SHORT':
-        print("[CLOSE SHORT FIRST]")
-        close_position()
-        time.sleep(0.5)
-    elif blofin_pos['side'] == 'LONG':
-        print("[ALREADY LONG]")
-        return {'status': 'already_long'}
+class ContextPool(ThreadPoolExecutor):
+    """Thread pool whose tasks run in the submitter's contextvars context, so their exchange calls stay on its capture record"""
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+io_pool = ContextPool(max_workers=4, thread_name_prefix='blofin-io')
+leverage_cache = {}   # instId -> (leverage, margin_mode) confirmed on the exchange
+
+class StageTimer:
+    """Wall-clock ms spent in each named stage of one entry"""
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self.last) * 1000, 2)
+        self.last = now
+
+    def total(self):
+        return round(sum(self.stages.values()), 2)
+
+def ensure_leverage(inst_id=SYMBOL, leverage=LEVERAGE, margin_mode=MARGIN_MODE):
+    """Send set-leverage only when the instrument isn't already confirmed at this setting"""
+    if leverage_cache.get(inst_id) == (leverage, margin_mode):
+        return True
+    r = api_request('POST', '/api/v1/account/set-leverage',
+                    {'instId': inst_id, 'leverage': str(leverage), 'marginMode': margin_mode})
+    if r.get('code') == '0':
+        leverage_cache[inst_id] = (leverage, margin_mode)
+        return True
+    log('LEVERAGE', 'set-leverage failed: %s', r, symbol=inst_id, level=logging.WARNING)
+    return False
+
+def wait_until_flat(symbol=SYMBOL, timeout=CLOSE_CONFIRM_TIMEOUT):
+    """Block until the closed position reads flat - pushed by the stream, else polled over REST"""
+    deadline = time.time() + timeout
+    polled = False
+    while True:
+        pos = account_cache.get_position(symbol)
+        if pos is not None and pos['side'] is None:
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        if polled or account_cache.streaming():
+            if account_cache.wait_for_update(min(CLOSE_POLL_INTERVAL, remaining)):
+                continue
+        refresh_positions()
+        polled = True
+
+def execute_entry(st, direction, price, swing_px):
+    """
+    Entry pipeline shared by enter_long/enter_short:
+    prefetch (position + balance + leverage, concurrently) -> close opposite
+    and confirm flat -> re-read balance -> order. Returns the order response
+    with per-stage timings.
+    """
+    cfg = st.cfg
+    side = 'buy' if direction == 'LONG' else 'sell'
+    opposite = 'SHORT' if direction == 'LONG' else 'LONG'
+    stop = st.stop_for(price, swing_px, direction)
+    risk_pct = abs(price - stop) / price * 100
+
+    log('ENTERING', '%s @ $%.6f, swing %s $%.6f, stop $%.6f (%.2f%% risk)', direction, price,
+        'low' if direction == 'LONG' else 'high', swing_px, stop, risk_pct, symbol=st.symbol)
+
+    timer = StageTimer()
+    stale_stops = None
+    f_pos = io_pool.submit(get_blofin_position, st.symbol)
+    f_bal = io_pool.submit(get_usdt_balance)
+    f_lev = io_pool.submit(ensure_leverage, st.symbol, cfg.leverage, cfg.margin_mode)
+    blofin_pos = f_pos.result()
+    bal = f_bal.result()
+    timer.mark('prefetch')
+    stage_add('exchange', timer.stages['prefetch'])   # ran on io_pool threads
+
+    if blofin_pos['side'] == opposite:
+        log('CLOSE FIRST', '%s', opposite, symbol=st.symbol)
+        close_position(st.symbol, cfg.margin_mode)
+        timer.mark('close')
+        if not wait_until_flat(st.symbol):
+            f_lev.result()
+            log_signal(f"{direction} ABORTED: {opposite} close not confirmed within {CLOSE_CONFIRM_TIMEOUT}s", st.symbol)
+            return {'error': 'close not confirmed', 'timings_ms': timer.stages}
+        timer.mark('confirm_flat')
+        stop_book.disarm(st.symbol)   # the closed side's level must not fire against the new position
+        f_stale = io_pool.submit(pending_stops, st.symbol)   # the closed side's stop, listed before the new one exists
+        bal = get_usdt_balance()   # margin released by the close
+        stale_stops = f_stale.result()
+        timer.mark('balance')
+    elif blofin_pos['side'] == direction:
+        log('ALREADY', '%s', direction, symbol=st.symbol)
+        return {'status': f'already_{direction.lower()}'}
+
+    if not f_lev.result():
+        # may have been rejected while the old position was open
+        ensure_leverage(st.symbol, cfg.leverage, cfg.margin_mode)
+    timer.mark('leverage')
 
-    bal = get_usdt_balance()
     if bal <= 0:
         return {'error': 'no balance'}
 
-    position_value = bal * 0.95 * LEVERAGE
+    position_value = bal * cfg.size_pct * cfg.leverage
     size = int(position_value / price)
     if size <= 0:
         return {'error': 'size too small'}
 
-    api_request('POST', '/api/v1/account/set-leverage',
-                {'instId': SYMBOL, 'leverage': str(LEVERAGE), 'marginMode': MARGIN_MODE})
-    result = place_order('buy', size, stop)
+    result = place_order(side, size, stop, st.symbol, cfg.margin_mode)
+    timer.mark('order')
+    log('ENTRY TIMINGS', '%s total=%sms', timer.stages, timer.total(), symbol=st.symbol)
 
     if result.get('code') == '0':
-        current_position = 'LONG'
-        entry_price = price
-        stop_price = stop
-        had_deviation = False  # Reset after entry
-        log_signal(f"LONG ENTERED: size={size}, entry={price:.6f}, stop={stop:.6f}")
-        save_state()
-
-    return result
-
-def enter_short(price, swing_high):
-    global current_position, entry_price, stop_price, had_deviation
-
-    stop = calculate_stop(price, swing_high, 'SHORT')
+        st.record_entry(direction, price, stop)
+        entry_counts.inc(st.symbol, direction)
+        arm_stop(st.symbol, direction, stop)
+        if stale_stops:
+            io_pool.submit(cancel_stops, st.symbol, stale_stops)
+        log_signal(f"{direction} ENTERED: size={size}, entry={price:.6f}, stop={stop:.6f}, {timer.total()}ms", st.symbol)
+        save_state(st)
+    else:
+        leverage_cache.pop(st.symbol, None)   # re-check leverage on the next attempt
 
-    print(f"\n{'='*50}")
-    print(f"ENTERING SHORT @ ${price:.6f}")
-    print(f"Swing High: ${swing_high:.6f}")
-    print(f"Stop: ${stop:.6f} ({((stop-price)/price)*100:.2f}% risk)")
-    print(f"{'='*50}")
+    return dict(result, timings_ms=timer.stages)
 
-    blofin_pos = get_blofin_position()
-    if blofin_pos['side'] == 'LONG':
-        print("[CLOSE LONG FIRST]")
-        close_position()
-        time.sleep(0.5)
-    elif blofin_pos['side'] == 'SHORT':
-        print("[ALREADY SHORT]")
-        return {'status': 'already_short'}
+def enter_long(st, price, swing_low):
+    return execute_entry(st, 'LONG', price, swing_low)
 
-    bal = get_usdt_balance()
-    if bal <= 0:
-        return {'error': 'no balance'}
+def enter_short(st, price, swing_high):
+    return execute_entry(st, 'SHORT', price, swing_high)
 
-    position_value = bal * 0.95 * LEVERAGE
-    size = int(position_value / price)
-    if size <= 0:
-        return {'error': 'size too small'}
+def exit_position(st, price, reason):
+    log('EXITING', '%s @ $%.6f (%s)', st.position, price, reason, symbol=st.symbol)
 
-    api_request('POST', '/api/v1/account/set-leverage',
-                {'instId': SYMBOL, 'leverage': str(LEVERAGE), 'marginMode': MARGIN_MODE})
-    result = place_order('sell', size, stop)
+    close_position(st.symbol, st.cfg.margin_mode)
+    stop_book.disarm(st.symbol)
+    cancel_stops(st.symbol)
+    log_signal(f"EXIT {st.position}: price={price:.6f}, reason={reason}", st.symbol)
 
-    if result.get('code') == '0':
-        current_position = 'SHORT'
-        entry_price = price
-        stop_price = stop
-        had_deviation = False  # Reset after entry
-        log_signal(f"SHORT ENTERED: size={size}, entry={price:.6f}, stop={stop:.6f}")
-        save_state()
+    exit_counts.inc(st.symbol, reason)
+    st.record_exit()
+    save_state(st)
 
-    return result
+# =============================================================================
+# STOP ENGINE - exchange stop amends + local backstop on price ticks
+# =============================================================================
+def pending_stops(symbol):
+    """tpslIds of the stop-loss orders resting on the exchange for symbol (None if unknown)"""
+    r = api_request('GET', f'/api/v1/trade/orders-tpsl-pending?instId={symbol}')
+    if r.get('code') != '0':
+        return None
+    return [o['tpslId'] for o in r.get('data', []) if o.get('slTriggerPrice')]
+
+def parse_stops(r):
+    """{instId: [(tpslId, trigger price)]} of every stop-loss order in an orders-tpsl-pending response"""
+    out = {}
+    for o in r.get('data', []):
+        if o.get('slTriggerPrice'):
+            out.setdefault(o.get('instId'), []).append((o['tpslId'], float(o['slTriggerPrice'])))
+    return out
+
+def cancel_stops(symbol, ids=None):
+    ids = pending_stops(symbol) if ids is None else ids
+    if not ids:
+        return {'code': '0', 'data': []}
+    return api_request('POST', '/api/v1/trade/cancel-tpsl', [{'instId': symbol, 'tpslId': i} for i in ids])
+
+def update_stop_loss(st, side, new_stop):
+    """
+    Move the exchange stop of st's open position to new_stop. The new TPSL
+    order goes in before the old ones are cancelled, so the position is
+    never left without a stop.
+    """
+    old = pending_stops(st.symbol)
+    r = api_request('POST', '/api/v1/trade/order-tpsl', {
+        'instId': st.symbol, 'marginMode': st.cfg.margin_mode, 'positionSide': 'net',
+        'side': 'sell' if side == 'LONG' else 'buy', 'size': '-1',
+        'slTriggerPrice': str(new_stop), 'slOrderPrice': '-1'})
+    if r.get('code') != '0':
+        stop_amends.inc(st.symbol, 'error')
+        log_signal(f"STOP AMEND FAILED: {side} stop {new_stop:.6f} - {r.get('msg')}", st.symbol)
+        return r
+    data = r.get('data')
+    new_id = ((data[0] if isinstance(data, list) and data else data) or {}).get('tpslId')
+    stale = [i for i in (old or []) if i != new_id]
+    if stale:
+        cancel_stops(st.symbol, stale)
+    stop_amends.inc(st.symbol, 'ok')
+    log('TRAIL', 'exchange stop -> %s (tpsl %s, cancelled %s)', new_stop, new_id, stale, symbol=st.symbol)
+    return {'status': 'stop_updated', 'new_stop': new_stop, 'tpslId': new_id, 'cancelled': stale}
+
+def arm_stop(symbol, side, level):
+    if LOCAL_STOPS != 'off':
+        stop_book.arm(symbol, symbol, side, level)
+
+def local_stop_hit(symbol, side, level, price):
+    """A tick crossed an armed stop: close if the exchange still shows the position"""
+    st = get_state(symbol)
+    local_stop_hits.inc(symbol, side)
+    with symbol_guard(st):
+        if st.position != side or st.stop_price != level:
+            # armed level is stale - the state moved on (e.g. in another worker)
+            if st.position and st.stop_price:
+                arm_stop(symbol, st.position, st.stop_price)
+            return
+        account_cache.invalidate(symbol)
+        pos = get_blofin_position(symbol)
+        if pos['side'] != side:
+            log('LOCAL STOP', '%s stop %s crossed @ %s, exchange already %s', side, level, price, pos['side'] or 'flat',
+                symbol=symbol)
+            return
+        log_signal(f"LOCAL STOP: {side} stop {level:.6f} crossed @ {price:.6f} ({LOCAL_STOPS})", symbol)
+        if LOCAL_STOPS == 'enforce':
+            exit_position(st, price, 'LOCAL_STOP')
+
+for _st in states.values():
+    if _st.position and _st.stop_price:
+        arm_stop(_st.symbol, _st.position, _st.stop_price)
 
-def exit_position(price, reason):
-    global current_position, entry_price, stop_price
-    print(f"\n=== EXITING {current_position} @ ${price:.6f} ({reason}) ===")
+# =============================================================================
+# STARTUP - parallel warm-up + exchange reads, reconcile, then ready
+# =============================================================================
+def near(a, b):
+    return bool(a) and bool(b) and abs(a - b) <= abs(b) * RECONCILE_TOLERANCE
 
-    close_position()
-    log_signal(f"EXIT {current_position}: price={price:.6f}, reason={reason}")
+def reconcile_symbol(st, pos, stops):
+    """
+    Bring st in line with the position and stop orders found on the exchange.
+    The exchange wins on side and entry. The local stop wins over a different
+    resting one, since a trail is saved before its amend is sent. With no
+    local stop the nearest resting one is adopted; only a position with no
+    stop anywhere gets the widest stop its config allows.
+    Returns the corrections as log lines (applied only when STARTUP_RECONCILE=fix).
+    """
+    fix = STARTUP_RECONCILE == 'fix'
+    notes = []
+    def note(what, msg):
+        reconciled.inc(st.symbol, what)
+        notes.append(msg)
+    with symbol_guard(st):
+        side, local = pos['side'], st.position
+        triggers = [px for _, px in stops]
+        # the stop that fires first: highest sell stop under a long, lowest buy stop over a short
+        nearest = (max(triggers) if side == 'LONG' else min(triggers)) if side and triggers else None
+        if local and not side:
+            note('cleared', f"local {local} but exchange flat - cleared")
+            if fix:
+                stop_book.disarm(st.symbol)
+                st.record_exit()
+        elif side and side != local:
+            stop = nearest
+            note('adopted', f"exchange {side} size={pos['size']} entry={pos['entry']}, local {local or 'flat'} - adopted")
+            if fix:
+                st.record_entry(side, pos['entry'], stop)
+        elif side and pos['entry'] and not near(st.entry_price, pos['entry']):
+            note('entry', f"entry {st.entry_price} -> {pos['entry']} (exchange average)")
+            if fix:
+                st.entry_price = pos['entry']
+        if side and not st.stop_price and nearest:
+            note('stop_adopted', f"{side} has no local stop - adopted resting stop {nearest:.6f}")
+            if fix:
+                st.stop_price = nearest
+        elif side and fix and not st.stop_price:
+            pct = st.cfg.max_stop_pct
+            st.stop_price = pos['entry'] * (1 - pct if side == 'LONG' else 1 + pct)
+            log('RECONCILE', '%s position has NO stop locally or on the exchange - placing %.6f (max_stop_pct %s)',
+                side, st.stop_price, pct, symbol=st.symbol, level=logging.ERROR)
+        if side and st.stop_price and not any(near(px, st.stop_price) for px in triggers):
+            note('stop', f"{side} stop {st.stop_price:.6f} not on exchange (resting: {triggers or 'none'}) - placed")
+            if fix:
+                update_stop_loss(st, side, st.stop_price)
+        elif not side and stops:
+            note('stray_stops', f"{len(stops)} stop order(s) with no position - cancelled")
+            if fix:
+                cancel_stops(st.symbol, [i for i, _ in stops])
+        if fix and notes:
+            if st.position:
+                arm_stop(st.symbol, st.position, st.stop_price)
+            save_state(st)
+    for msg in notes:
+        log_signal(f"RECONCILE: {msg}{'' if fix else ' (log only)'}", st.symbol)
+    return notes
+
+class Startup:
+    """
+    Boot work that would otherwise land on the first webhook, run on a
+    background thread so the listener binds at once: connection warm-up,
+    positions, balance, resting stops and per-symbol leverage go out
+    concurrently, then every symbol is reconciled with the exchange by
+    whichever worker holds the reconcile lease. /ready answers 503 until it
+    has finished, and stays 503 ('failed') if the exchange reads gave up.
+    """
+    def __init__(self):
+        self.ready = threading.Event()
+        self.t0 = time.perf_counter()
+        self.deadline = self.t0 + STARTUP_RETRY_SECS
+        self.state = 'starting'
+        self.ready_ms = None
+        self.timings = {}
+        self.reconciled = {}
+        self.skipped = None
+        self.errors = []
+
+    def start(self):
+        threading.Thread(target=self._run, name='startup', daemon=True).start()
+        return self
+
+    def _timed(self, stage, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.errors.append(f"{stage}: {e}")
+        finally:
+            ms = round((time.perf_counter() - t0) * 1000, 1)
+            self.timings[stage] = max(ms, self.timings.get(stage, 0))
+
+    def _until_ok(self, endpoint, parse):
+        """Positions and stops are needed to reconcile - retry with backoff until they read or STARTUP_RETRY_SECS passes"""
+        delay = 0.5
+        while True:
+            r = api_request('GET', endpoint)
+            if r.get('code') == '0':
+                return parse(r)
+            error = f"code={r.get('code')} {r.get('msg')}"
+            if time.perf_counter() + delay > self.deadline:
+                raise RuntimeError(f"{endpoint} gave up after {STARTUP_RETRY_SECS:g}s, last error: {error}")
+            log('STARTUP', '%s failed (%s), retrying in %ss', endpoint, error, delay, level=logging.WARNING)
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _reconcile(self, pool):
+        """Exchange reads and reconciliation, run holding the reconcile lease so they see each other's fixes"""
+        f_pos = pool.submit(self._timed, 'positions', self._until_ok, '/api/v1/account/positions', store_positions)
+        f_stops = pool.submit(self._timed, 'stops', self._until_ok, '/api/v1/trade/orders-tpsl-pending', parse_stops)
+        positions, stops = f_pos.result(), f_stops.result()
+        if not positions or stops is None:
+            return False
+        t0 = time.perf_counter()
+        futures = {st.symbol: pool.submit(self._timed, 'reconcile', reconcile_symbol, st,
+                                          account_cache.get_position(st.symbol, max_age=None),
+                                          stops.get(st.symbol, []))
+                   for st in states.values()}
+        self.reconciled = {sym: f.result() for sym, f in futures.items() if f.result()}
+        self.timings['reconcile'] = round((time.perf_counter() - t0) * 1000, 1)
+        return True
+
+    def _run(self):
+        exchange = bool(API_KEY) and STARTUP_RECONCILE != 'off'
+        ok = True
+        with ThreadPoolExecutor(max_workers=STARTUP_WORKERS, thread_name_prefix='startup') as pool:
+            if BLOFIN_WARMUP:
+                pool.submit(self._timed, 'warmup', warm_up_connections)
+            if API_KEY:
+                pool.submit(self._timed, 'balance', refresh_balance)
+                for st in states.values():
+                    pool.submit(self._timed, 'leverage', ensure_leverage, st.symbol, st.cfg.leverage, st.cfg.margin_mode)
+            if exchange:
+                try:    # _reconcile's own failures land in self.errors, so a conflict here is the lease
+                    with state_store.lease(RECONCILE_LEASE, wait=0):
+                        ok = self._reconcile(pool)
+                except StateConflict:
+                    self.skipped = 'another worker holds the reconcile lease'
+                    log('STARTUP', 'another worker holds the reconcile lease - reconcile skipped')
+        self.state = 'failed' if not ok else 'degraded' if self.errors else 'ready'
+        self.ready_ms = round((time.perf_counter() - self.t0) * 1000, 1)
+        self.ready.set()
+        log('STARTUP', '%s in %sms %s reconciled=%d errors=%d', self.state, self.ready_ms, self.timings,
+            sum(len(n) for n in self.reconciled.values()), len(self.errors),
+            level=logging.ERROR if self.state == 'failed' else logging.INFO)
+
+    def healthy(self):
+        return self.ready.is_set() and self.state != 'failed'
+
+    def describe(self):
+        return {
+            'ready': self.healthy(),
+            'state': self.state,
+            'last_error': self.errors[-1] if self.errors else None,
+            'ready_ms': self.ready_ms,
+            'elapsed_ms': round((time.perf_counter() - self.t0) * 1000, 1),
+            'timings_ms': self.timings,
+            'reconciled': self.reconciled,
+            'reconcile_skipped': self.skipped,
+            'errors': self.errors,
+        }
 
-    current_position = None
-    entry_price = None
-    stop_price = None
-    save_state()
+startup = Startup().start()
 
 # =============================================================================
 # WEBHOOK - 30M/4H Strategy
 # =============================================================================
-@app.route('/webhook', methods=['POST'])
-def webhook():
-    global htf_trend, ltf_trend, had_deviation, current_position, entry_price, stop_price
-    global htf_swing_low, htf_swing_high
-
-    raw_data = request.get_data(as_text=True)
-    print(f"\n{'='*60}")
-    print(f"[WEBHOOK] Raw: {raw_data[:500]}")
-
+def parse_webhook(raw_data):
+    """Decode a TradingView alert body, returns (data, error)"""
     # Fix TradingView double-brace issue
     if raw_data.startswith('{{'):
         raw_data = raw_data[1:]
 
     try:
-        data = json.loads(raw_data)
+        return json.loads(raw_data), None
     except Exception as e:
-        log_signal(f"JSON PARSE ERROR: {e}")
-        return jsonify({'error': 'Invalid JSON'}), 400
-
-    signal = str(data.get('signal', '')).upper().strip()
-    price = float(data.get('price', 0)) or get_price(SYMBOL)
-    swing_low = float(data.get('swing_low')) if data.get('swing_low') else None
-    swing_high = float(data.get('swing_high')) if data.get('swing_high') else None
-
-    blofin_pos = get_blofin_position()
-
-    print(f"[SIGNAL] {signal} @ ${price:.6f}")
-    print(f"[STATE] htf={htf_trend}, ltf={ltf_trend}, deviation={had_deviation}, pos={blofin_pos['side']}")
-    print(f"[SWINGS] low={swing_low}, high={swing_high}")
-    print(f"[HTF SWINGS] low={htf_swing_low}, high={htf_swing_high}")
-
-    log_signal(f"RECV: {signal} | price={price:.6f} | htf={htf_trend} | ltf={ltf_trend} | dev={had_deviation}")
-
-    # =========================================================================
-    # 4H_UPDATE - Just update swings, no trend change (from Reclaim, Zone Cross, etc.)
-    # =========================================================================
-    if '4H' in signal and 'UPDATE' in signal:
-        if swing_low:
-            htf_swing_low = swing_low
-        if swing_high:
-            htf_swing_high = swing_high
-
-        log_signal(f"4H UPDATE: swings updated - low={htf_swing_low}, high={htf_swing_high}")
-
-        # Trail stop for existing LONG (move stop up to new swing low)
-        if blofin_pos['side'] == 'LONG' and htf_swing_low and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_low, 'LONG')
-            if stop_price and new_stop > stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL LONG: stop raised to {new_stop:.6f}")
-
-        # Trail stop for existing SHORT (move stop down to new swing high)
-        elif blofin_pos['side'] == 'SHORT' and htf_swing_high and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_high, 'SHORT')
-            if stop_price and new_stop < stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL SHORT: stop lowered to {new_stop:.6f}")
-
-        save_state()
-        return jsonify({'action': 'SWINGS_UPDATED', 'htf_swing_low': htf_swing_low, 'htf_swing_high': htf_swing_high})
-
-    # =========================================================================
-    # 4H (HTF) SIGNALS - Set trend, store swings, trail stops, exit on flip
-    # Only flip trend on STRUCTURE BREAKS (signal must contain BREAK)
-    # =========================================================================
-    elif '4H' in signal and 'BULL' in signal and 'BREAK' in signal:
-        old_trend = htf_trend
-        htf_trend = 'BULL'
-        had_deviation = False  # Reset deviation on HTF change
-
-        if swing_low:
-            htf_swing_low = swing_low
-        if swing_high:
-            htf_swing_high = swing_high
-
-        log_signal(f"4H BULL: htf {old_trend} -> BULL, deviation reset, swings: low={htf_swing_low}, high={htf_swing_high}")
-
-        # Exit SHORT on HTF flip to BULL
-        if blofin_pos['side'] == 'SHORT':
-            exit_position(price, '4H_BULL_FLIP')
-
-        # Trail stop for existing LONG (move stop up to new swing low)
-        elif blofin_pos['side'] == 'LONG' and htf_swing_low and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_low, 'LONG')
-            if stop_price and new_stop > stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL LONG: stop raised to {new_stop:.6f}")
-                # Note: Would need to update actual exchange stop here
-
-        save_state()
-        return jsonify({'action': 'HTF_BULL', 'htf_swing_low': htf_swing_low, 'htf_swing_high': htf_swing_high})
-
-    elif '4H' in signal and 'BEAR' in signal and 'BREAK' in signal:
-        old_trend = htf_trend
-        htf_trend = 'BEAR'
-        had_deviation = False  # Reset deviation on HTF change
-
-        if swing_low:
-            htf_swing_low = swing_low
-        if swing_high:
-            htf_swing_high = swing_high
-
-        log_signal(f"4H BEAR: htf {old_trend} -> BEAR, deviation reset, swings: low={htf_swing_low}, high={htf_swing_high}")
-
-        # Exit LONG on HTF flip to BEAR
-        if blofin_pos['side'] == 'LONG':
-            exit_position(price, '4H_BEAR_FLIP')
-
-        # Trail stop for existing SHORT (move stop down to new swing high)
-        elif blofin_pos['side'] == 'SHORT' and htf_swing_high and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_high, 'SHORT')
-            if stop_price and new_stop < stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL SHORT: stop lowered to {new_stop:.6f}")
-                # Note: Would need to update actual exchange stop here
-
-        save_state()
-        return jsonify({'action': 'HTF_BEAR', 'htf_swing_low': htf_swing_low, 'htf_swing_high': htf_swing_high})
-
-    # =========================================================================
-    # 4H OTHER SIGNALS (Imbalance, Reclaim, Zone Cross, etc.) - Update swings only, NO trend flip
-    # =========================================================================
-    elif '4H' in signal and 'BREAK' not in signal and 'UPDATE' not in signal:
-        # This catches: Imbalance, Reclaim, Zone Cross, etc.
-        if swing_low:
-            htf_swing_low = swing_low
-        if swing_high:
-            htf_swing_high = swing_high
-
-        log_signal(f"4H OTHER ({signal}): swings updated - low={htf_swing_low}, high={htf_swing_high} (NO TREND CHANGE)")
-
-        # Trail stop for existing positions
-        if blofin_pos['side'] == 'LONG' and htf_swing_low and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_low, 'LONG')
-            if stop_price and new_stop > stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL LONG: stop raised to {new_stop:.6f}")
-
-        elif blofin_pos['side'] == 'SHORT' and htf_swing_high and entry_price:
-            new_stop = calculate_stop(entry_price, htf_swing_high, 'SHORT')
-            if stop_price and new_stop < stop_price:
-                stop_price = new_stop
-                log_signal(f"TRAIL SHORT: stop lowered to {new_stop:.6f}")
-
-        save_state()
-        return jsonify({'action': 'HTF_SWING_UPDATE', 'signal': signal, 'htf_swing_low': htf_swing_low, 'htf_swing_high': htf_swing_high})
-
-    # =========================================================================
-    # 30M (LTF) BREAK SIGNALS - Require deviation
-    # =========================================================================
-    elif '30M' in signal and 'BULL' in signal and 'CONT' not in signal:
-        old_ltf = ltf_trend
-        ltf_trend = 'BULL'
-
-        # Check for deviation: LTF was BEAR while HTF was BULL
-        if old_ltf == 'BEAR' and htf_trend == 'BULL':
-            had_deviation = True
-            log_signal(f"DEVIATION DETECTED: LTF was BEAR, now BULL, HTF is BULL")
-
-        print(f"30M BULL BREAK - htf={htf_trend}, deviation={had_deviation}, blofin={blofin_pos['side']}")
-
-        # Entry conditions: HTF is BULL + had deviation + not already long
-        if htf_trend != 'BULL':
-            log_signal(f"NO ENTRY: HTF is {htf_trend}, need BULL")
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': f'htf is {htf_trend}'})
-
-        if not had_deviation:
-            log_signal(f"NO ENTRY: No deviation yet")
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no deviation'})
-
-        if blofin_pos['side'] == 'LONG':
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'already LONG'})
-
-        if not htf_swing_low:
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no HTF swing_low for stop'})
-
-        result = enter_long(price, htf_swing_low)
-        return jsonify({'action': 'LONG_ENTERED', 'type': 'BREAK', 'result': str(result)})
-
-    elif '30M' in signal and 'BEAR' in signal and 'CONT' not in signal:
-        old_ltf = ltf_trend
-        ltf_trend = 'BEAR'
-
-        # Check for deviation: LTF was BULL while HTF was BEAR
-        if old_ltf == 'BULL' and htf_trend == 'BEAR':
-            had_deviation = True
-            log_signal(f"DEVIATION DETECTED: LTF was BULL, now BEAR, HTF is BEAR")
-
-        print(f"30M BEAR BREAK - htf={htf_trend}, deviation={had_deviation}, blofin={blofin_pos['side']}")
-
-        # Entry conditions: HTF is BEAR + had deviation + not already short
-        if htf_trend != 'BEAR':
-            log_signal(f"NO ENTRY: HTF is {htf_trend}, need BEAR")
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': f'htf is {htf_trend}'})
-
-        if not had_deviation:
-            log_signal(f"NO ENTRY: No deviation yet")
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no deviation'})
-
-        if blofin_pos['side'] == 'SHORT':
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'already SHORT'})
-
-        if not htf_swing_high:
-            save_state()
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no HTF swing_high for stop'})
-
-        result = enter_short(price, htf_swing_high)
-        return jsonify({'action': 'SHORT_ENTERED', 'type': 'BREAK', 'result': str(result)})
-
-    # =========================================================================
-    # 30M (LTF) CONTINUATION SIGNALS - No deviation needed
-    # =========================================================================
-    elif '30M' in signal and 'BULL' in signal and 'CONT' in signal:
-        print(f"30M BULL CONT - htf={htf_trend}, blofin={blofin_pos['side']}")
-
-        if htf_trend != 'BULL':
-            log_signal(f"NO ENTRY: HTF is {htf_trend}, need BULL for continuation")
-            return jsonify({'action': 'NO_ENTRY', 'reason': f'htf is {htf_trend}'})
+        return None, e
+
+def process_signal(data):
+    """Route one decoded alert to its symbol's state, returns (response, http_status)"""
+    with signal_stages():
+        t0 = time.perf_counter()
+        st = get_state(data.get('instId'))
+        if st is None:
+            log_signal(f"UNKNOWN SYMBOL: {data.get('instId')}")
+            return {'error': f"Unknown instId: {data.get('instId')}"}, 400
+        if coalescer.window and coalesces(data):
+            stage_add('route', (time.perf_counter() - t0) * 1000)
+            return coalescer.submit(st, data)
+        with symbol_guard(st):
+            stage_add('route', (time.perf_counter() - t0) * 1000)
+            coalescer.flush(st)
+            return handle_signal(st, data)
+
+def process_burst(batch):
+    """Queue-mode counterpart of process_signal for a burst drained from one symbol's lane"""
+    with signal_stages():
+        t0 = time.perf_counter()
+        st = get_state(batch[0].get('instId'))
+        with symbol_guard(st):
+            stage_add('route', (time.perf_counter() - t0) * 1000)
+            return handle_burst(st, batch)
+
+def handle_signal(st, data):
+    """Run one alert through the strategy for a single symbol (caller holds symbol_guard)"""
+    signal, kind, price, swing_low, swing_high = parse_alert(data)
+    price = price or get_price(st.symbol)
+
+    blofin_pos = get_blofin_position(st.symbol)
+
+    log('SIGNAL', '%s @ $%.6f', signal, price, symbol=st.symbol)
+    log('STATE', 'htf=%s, ltf=%s, deviation=%s, pos=%s', st.htf_trend, st.ltf_trend, st.had_deviation, blofin_pos['side'],
+        symbol=st.symbol)
+    log('SWINGS', 'low=%s, high=%s', swing_low, swing_high, symbol=st.symbol)
+    log('HTF SWINGS', 'low=%s, high=%s', st.htf_swing_low, st.htf_swing_high, symbol=st.symbol)
+
+    log_signal(f"RECV: {signal} | price={price:.6f} | htf={st.htf_trend} | ltf={st.ltf_trend} | dev={st.had_deviation}", st.symbol)
+
+    signal_counts.inc(st.symbol, kind or 'UNKNOWN')
+    before = st.to_dict()
+    body, status, action = decide(st, kind, signal, swing_low, swing_high, blofin_pos['side'],
+                                  lambda msg: log_signal(msg, st.symbol))
+    if kind and kind.startswith('30M'):
+        log(kind.replace('_', ' '), 'htf=%s, deviation=%s, blofin=%s', st.htf_trend, st.had_deviation, blofin_pos['side'],
+            symbol=st.symbol)
+
+    if action and action[0] == 'EXIT':
+        exit_position(st, price, action[1])
+    elif action and action[0] == 'ENTER':
+        result = execute_entry(st, action[1], price, action[2])
+        body['result'] = str(result)
+    elif action and action[0] == 'TRAIL':
+        body['stop_update'] = apply_trail(st, action[1], action[2])
+    elif st.to_dict() != before:
+        save_state(st)
+    return body, status
+
+def apply_trail(st, side, new_stop):
+    """Persist a trailed stop, arm it locally and amend the exchange SL"""
+    trail_counts.inc(st.symbol, side)
+    arm_stop(st.symbol, side, new_stop)
+    save_state(st)
+    return update_stop_loss(st, side, new_stop)
+
+def handle_burst(st, batch):
+    """
+    Run a burst of 4H swing updates for one symbol (caller holds symbol_guard)
+    as one transition: one position read, every alert through the strategy in
+    arrival order, then at most one stop amend and one state write. The stop
+    only ever tightens, so the last TRAIL of the burst is the one to send.
+    An alert that fails gets its own 500; the rest of the burst still applies.
+    Returns [(response, http_status)] in batch order.
+    """
+    blofin_pos = get_blofin_position(st.symbol)
+    before = st.to_dict()
+    results, trail = [], None
+    for data in batch:
+        try:
+            signal, kind, price, swing_low, swing_high = parse_alert(data)
+            log('SIGNAL', '%s @ $%.6f [SWINGS] low=%s, high=%s', signal, price, swing_low, swing_high, symbol=st.symbol)
+            log_signal(f"RECV: {signal} | price={price:.6f} | htf={st.htf_trend} | ltf={st.ltf_trend} | dev={st.had_deviation}", st.symbol)
+            signal_counts.inc(st.symbol, kind or 'UNKNOWN')
+            body, status, action = decide(st, kind, signal, swing_low, swing_high, blofin_pos['side'],
+                                          lambda msg: log_signal(msg, st.symbol))
+        except Exception as e:
+            log('COALESCE ERROR', '%s: %s', data.get('signal'), e, symbol=st.symbol, level=logging.ERROR)
+            results.append(({'error': str(e), 'coalesced': len(batch)}, 500))
+            continue
+        trail = action or trail
+        results.append((dict(body, coalesced=len(batch)), status))
+
+    if len(batch) > 1:
+        log_signal(f"COALESCED: {len(batch)} swing updates, stop {f'{trail[2]:.6f}' if trail else 'unchanged'}", st.symbol)
+    if trail:
+        results[-1][0]['stop_update'] = apply_trail(st, trail[1], trail[2])
+    elif st.to_dict() != before:
+        save_state(st)
+    return results
+
+def coalesces(data):
+    return signal_kind(str(data.get('signal', '')).upper().strip()) in COALESCED_KINDS
+
+class Coalescer:
+    """
+    Burst window for 4H swing updates in sync mode. A symbol's first update
+    waits `window` seconds, then runs everything that arrived meanwhile
+    through handle_burst(); the rest of the burst waits for its result. Any
+    other signal for the symbol flushes the pending burst before it runs, so
+    entries and exits see the latest swings without waiting out the window.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}     # symbol -> {'alerts': [...], 'done': Event, 'results': [...]}
+
+    def submit(self, st, data):
+        t0 = time.perf_counter()
+        with self.lock:
+            burst = self.pending.get(st.symbol)
+            leader = burst is None
+            if leader:
+                burst = self.pending[st.symbol] = {'alerts': [], 'done': threading.Event(), 'results': None}
+            i = len(burst['alerts'])
+            burst['alerts'].append(data)
+        if leader:
+            time.sleep(self.window)
+            stage_add('coalesce', (time.perf_counter() - t0) * 1000)
+            with symbol_guard(st):
+                self.flush(st, burst)
+        else:
+            burst['done'].wait()
+            stage_add('coalesce', (time.perf_counter() - t0) * 1000)
+        return burst['results'][i]
+
+    def flush(self, st, burst=None):
+        """Run st's pending burst now (caller holds symbol_guard); with burst, only if it is still that one"""
+        with self.lock:
+            pending = self.pending.get(st.symbol)
+            if pending is None or (burst is not None and pending is not burst):
+                return
+            del self.pending[st.symbol]
+        try:
+            pending['results'] = handle_burst(st, pending['alerts'])
+        except Exception as e:
+            log('COALESCE ERROR', '%s', e, symbol=st.symbol, level=logging.ERROR)
+            pending['results'] = [({'error': str(e)}, 500)] * len(pending['alerts'])
+        pending['done'].set()
+
+coalescer = Coalescer(COALESCE_MS / 1000 if WEBHOOK_MODE != 'queue' else 0)
 
-        if blofin_pos['side'] == 'LONG':
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'already LONG'})
+# =============================================================================
+# IDEMPOTENCY - TTL'd LRU of webhook outcomes keyed by alert ID or payload hash
+# =============================================================================
+def alert_key(data):
+    """Explicit alert ID if the alert carries one, else a hash of the canonical payload"""
+    alert_id = data.get('alert_id') or data.get('alertId')
+    if alert_id:
+        return f"id:{alert_id}"
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+class DedupCache:
+    """
+    Bounded LRU of alert key -> (body, http_status) with TTL eviction.
+    claim() returns None for a new alert (the caller must finish() or
+    release() it) or the cached outcome for a duplicate. A duplicate of an
+    alert still in flight waits for its outcome instead of running again.
+    """
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()     # key -> [expires, done Event, outcome, callbacks]
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, key):
+        entry, new = self.reserve(key)
+        if new:
+            return None
+        if not entry[1].wait(DEDUP_WAIT):
+            return {'error': 'Duplicate of an alert still being processed'}, 409
+        return entry[2]
+
+    def reserve(self, key):
+        """Non-blocking half of claim(): (entry, True) for a new alert, else the original's entry"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                entry = self.entries[key] = [now + self.ttl, threading.Event(), None, []]
+                self._evict(now)
+                return entry, True
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry, False
+
+    def notify(self, entry, callback):
+        """Call callback() once entry has its outcome - the non-blocking way to wait on a duplicate"""
+        with self.lock:
+            if not entry[1].is_set():
+                entry[3].append(callback)
+                return
+        callback()
+
+    def finish(self, key, outcome):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            self._settle(entry, outcome)
+
+    def release(self, key):
+        """Forget a claim whose processing failed so a retry runs again"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._settle(entry, ({'error': 'Original delivery failed'}, 500))
+
+    def _settle(self, entry, outcome):
+        with self.lock:
+            entry[2] = outcome
+            entry[1].set()
+            callbacks, entry[3] = entry[3], []
+        for callback in callbacks:
+            callback()
+
+    def _evict(self, now):
+        entries = self.entries
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry[0] > now:
+                break
+            del entries[key]
+
+    def describe(self):
+        with self.lock:
+            return {'size': len(self.entries), 'max': self.max_size, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+dedup_cache = DedupCache(DEDUP_TTL, DEDUP_MAX)
 
-        if not htf_swing_low:
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no HTF swing_low for stop'})
-
-        result = enter_long(price, htf_swing_low)
-        return jsonify({'action': 'LONG_ENTERED', 'type': 'CONTINUATION', 'result': str(result)})
+# =============================================================================
+# SIGNAL QUEUE - ack webhooks immediately, execute on per-symbol workers
+# =============================================================================
+class SignalQueue:
+    """
+    Accepted signals wait in a FIFO lane per symbol. Each lane is drained by
+    one worker thread, so a symbol's signals execute strictly in arrival order.
+    With a window, a 4H swing update waits up to that long for more updates
+    and the run of them goes to burst_handler in one call; any other signal
+    ends the wait at once and runs right after the burst.
+    Outcomes are kept by signal ID (oldest evicted past max_results). A
+    signal runs in the contextvars context it was submitted from (a burst in
+    its last signal's), so per-webhook context such as the traffic capture
+    record follows it onto the worker.
+    """
+    def __init__(self, handler, max_results, burst_handler=None, window=0):
+        self.handler = handler
+        self.burst_handler = burst_handler
+        self.window = window
+        self.max_results = max_results
+        self.lock = threading.Lock()
+        self.lanes = {}
+        self.results = OrderedDict()
+        self.callbacks = {}     # sig_id -> on_done(rec)
+        self.contexts = {}      # sig_id -> contextvars context of the submitter
+
+    def submit(self, symbol, data, on_done=None):
+        sig_id = uuid.uuid4().hex[:12]
+        if on_done:
+            self.callbacks[sig_id] = on_done
+        self.contexts[sig_id] = contextvars.copy_context()
+        rec = {'id': sig_id, 'symbol': symbol, 'signal': data.get('signal'), 'status': 'queued',
+               'received': time.time(), 'started': None, 'finished': None,
+               'http_status': None, 'result': None}
+        with self.lock:
+            self.results[sig_id] = rec
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+            lane = self.lanes.get(symbol)
+            if lane is None:
+                lane = self.lanes[symbol] = queue.Queue()
+                threading.Thread(target=self._drain, args=(lane,), name=f'signals-{symbol}', daemon=True).start()
+        lane.put((rec, data))
+        return sig_id
+
+    def _drain(self, lane):
+        carry = None
+        while True:
+            item, carry = carry or lane.get(), None
+            if not (self.window and coalesces(item[1])):
+                self._run([item], lambda batch: [self.handler(batch[0])])
+                continue
+            burst = [item]
+            deadline = time.monotonic() + self.window
+            while True:
+                try:
+                    item = lane.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if not coalesces(item[1]):
+                    carry = item
+                    break
+                burst.append(item)
+            self._run(burst, self.burst_handler)
+
+    def _run(self, items, handler):
+        ctx = None
+        for rec, _ in items:
+            rec['status'] = 'running'
+            rec['started'] = time.time()
+            ctx = self.contexts.pop(rec['id'], ctx)
+        try:
+            outcomes = ctx.run(handler, [data for _, data in items])
+            for (rec, _), (body, code) in zip(items, outcomes):
+                rec.update(status='error' if code >= 500 else 'done', result=body, http_status=code)
+        except Exception as e:
+            log('QUEUE ERROR', '%s %s: %s', items[0][0]['id'], items[0][0]['signal'], e, level=logging.ERROR)
+            for rec, _ in items:
+                rec.update(status='error', result={'error': str(e)}, http_status=500)
+        finished = time.time()
+        for rec, _ in items:
+            rec['finished'] = finished
+            on_done = self.callbacks.pop(rec['id'], None)
+            if on_done:
+                on_done(rec)
+
+    def get(self, sig_id):
+        with self.lock:
+            rec = self.results.get(sig_id)
+            rec = dict(rec) if rec else None
+        if rec and rec['started']:
+            rec['queue_ms'] = round((rec['started'] - rec['received']) * 1000, 2)
+        if rec and rec['finished']:
+            rec['exec_ms'] = round((rec['finished'] - rec['started']) * 1000, 2)
+        return rec
+
+    def depth(self):
+        with self.lock:
+            return {sym: lane.qsize() for sym, lane in self.lanes.items()}
+
+signal_queue = SignalQueue(process_signal, SIGNAL_RESULTS_MAX, process_burst, COALESCE_MS / 1000)
 
-    elif '30M' in signal and 'BEAR' in signal and 'CONT' in signal:
-        print(f"30M BEAR CONT - htf={htf_trend}, blofin={blofin_pos['side']}")
+@app.route('/webhook', methods=['POST'])
+def webhook():
+    raw_data = request.get_data(as_text=True)
+    log('WEBHOOK', 'Raw: %.500s', raw_data, level=logging.DEBUG)
+
+    with capture.webhook(raw_data) as rec:
+        body, code = accept_webhook(raw_data)
+        capture.answer(rec, body, code)
+    webhook_responses.inc(str(code))
+    return jsonify(body), code
+
+def accept_webhook(raw_data):
+    t0 = time.perf_counter()
+    data, err = parse_webhook(raw_data)
+    webhook_stats['parse'].observe((time.perf_counter() - t0) * 1000)
+    if err:
+        log('WEBHOOK', 'Unparseable body: %.500s', raw_data, level=logging.WARNING)
+        log_signal(f"JSON PARSE ERROR: {err}")
+        return {'error': 'Invalid JSON'}, 400
+    if CANDLE_ENGINE != 'off' and isinstance(data, dict):
+        gated = engine_gate(data)
+        if gated:
+            return gated
+    return accept_alert(data)
+
+def accept_alert(data):
+    """Dedup, then route one decoded alert - TradingView's, or the candle engine's"""
+    if DEDUP_TTL <= 0 or not isinstance(data, dict):
+        return route_webhook(data)
+
+    key = alert_key(data)
+    outcome = dedup_cache.claim(key)
+    if outcome is not None:
+        body, code = outcome
+        log_signal(f"DUPLICATE: {data.get('signal')} ({key}) -> {code}", str(data.get('instId') or '').upper() or None)
+        return dict(body, duplicate=True), code
+    try:
+        outcome = route_webhook(data)
+    except Exception:
+        dedup_cache.release(key)
+        raise
+    if outcome[1] >= 500:
+        dedup_cache.release(key)    # let TradingView's retry run it again
+    else:
+        dedup_cache.finish(key, outcome)
+    return outcome
+
+def route_webhook(data):
+    if WEBHOOK_MODE == 'queue':
+        signal = str(data.get('signal', '')).upper().strip()
+        if not signal_kind(signal):
+            log_signal(f"UNKNOWN SIGNAL: {signal}")
+            return {'error': f'Unknown signal: {signal}'}, 400
+        st = get_state(data.get('instId'))
+        if st is None:
+            log_signal(f"UNKNOWN SYMBOL: {data.get('instId')}")
+            return {'error': f"Unknown instId: {data.get('instId')}"}, 400
+        return {'status': 'queued', 'id': signal_queue.submit(st.symbol, data, capture.queued())}, 202
+
+    return process_signal(data)
+
+@app.route('/signals/<sig_id>', methods=['GET'])
+def signal_status_endpoint(sig_id):
+    rec = signal_queue.get(sig_id)
+    if rec is None:
+        return jsonify({'error': f'Unknown signal id: {sig_id}'}), 404
+    return jsonify(rec)
 
-        if htf_trend != 'BEAR':
-            log_signal(f"NO ENTRY: HTF is {htf_trend}, need BEAR for continuation")
-            return jsonify({'action': 'NO_ENTRY', 'reason': f'htf is {htf_trend}'})
+# =============================================================================
+# CANDLE ENGINE - 30M/4H swings and breaks from the 1m kline stream
+# =============================================================================
+CROSS_CHECKED = ('4H_BULL_BREAK', '4H_BEAR_BREAK', '30M_BULL_BREAK', '30M_BEAR_BREAK', '30M_BULL_CONT', '30M_BEAR_CONT')
 
-        if blofin_pos['side'] == 'SHORT':
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'already SHORT'})
+class CrossCheck:
+    """
+    Pairs candle-engine events with TradingView alerts of the same symbol and
+    kind that arrive within CANDLE_MATCH_WINDOW of each other. Whatever is
+    still unpaired when the window has passed is logged as engine-only or
+    TradingView-only.
+    """
+    SOURCES = ('engine', 'tradingview')
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {source: deque() for source in self.SOURCES}   # (received, symbol, kind)
+        self.leads = deque(maxlen=100)     # seconds the engine was ahead of TradingView, per matched pair
+
+    def add(self, source, symbol, kind):
+        if kind not in CROSS_CHECKED:
+            return
+        now = time.time()
+        other = self.pending['tradingview' if source == 'engine' else 'engine']
+        with self.lock:
+            for i, (t, sym, k) in enumerate(other):
+                if sym == symbol and k == kind:
+                    del other[i]
+                    self.leads.append(round(now - t if source == 'tradingview' else t - now, 3))
+                    break
+            else:
+                self.pending[source].append((now, symbol, kind))
+                return
+        cross_checks.inc('matched')
+        log_signal(f"CROSS CHECK: {kind} matched, engine {self.leads[-1]:+.1f}s ahead", symbol)
+
+    def expire(self):
+        now = time.time()
+        stale = []
+        with self.lock:
+            for source, q in self.pending.items():
+                while q and now - q[0][0] > self.window:
+                    stale.append((source,) + q.popleft()[1:])
+        for source, symbol, kind in stale:
+            cross_checks.inc(f'{source}_only')
+            log_signal(f"CROSS CHECK: {kind} from {source} only, nothing matched within {self.window:.0f}s", symbol)
+
+    def describe(self):
+        with self.lock:
+            leads = sorted(self.leads)
+            pending = {source: len(q) for source, q in self.pending.items()}
+        return {'window_s': self.window, 'pending': pending, 'results': {k[0]: v for k, v in cross_checks.items()},
+                'engine_lead_s_p50': leads[len(leads) // 2] if leads else None}
+
+candle_engines = {sym: CandleEngine(sym, CANDLE_PIVOT) for sym in SYMBOLS}
+cross_check = CrossCheck(CANDLE_MATCH_WINDOW)
+# one worker per symbol, so a closed bar's alerts (4H update, then 30M break) run in the order emitted
+engine_pools = {sym: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'candle-engine-{sym}') for sym in SYMBOLS}
+
+def read_candles(symbol, bar):
+    """([(ts, o, h, l, c)] closed oldest-first, bar in progress or None) from the REST candles endpoint"""
+    r = blofin_http('GET', f'/api/v1/market/candles?instId={symbol}&bar={bar}&limit={CANDLE_HISTORY}')
+    rows = sorted((k for k in r.get('data', [])), key=lambda k: int(k[0]))
+    bars = [(int(k[0]) // 1000, float(k[1]), float(k[2]), float(k[3]), float(k[4]), str(k[8]) == '1') for k in rows]
+    closed = [b[:5] for b in bars if b[5]]
+    open_bar = bars[-1][:5] if bars and not bars[-1][5] else None
+    return closed, open_bar
+
+def seed_candles():
+    """Restore swings and trend from REST history - on connect, and after a reconnect to fill the gap"""
+    for sym, engine in candle_engines.items():
+        for label, bar in (('30M', '30m'), ('4H', '4H')):
+            try:
+                closed, open_bar = read_candles(sym, bar)
+                n = engine.seed(label, closed, open_bar)
+                log('CANDLES', '%s: %d bar(s) replayed, %s', label, n, engine.trackers[label].describe(), symbol=sym)
+            except Exception as e:
+                log('CANDLES', '%s history failed: %s', label, e, symbol=sym, level=logging.WARNING)
+    change_feed.notify()
+
+def on_candle_data(channel, arg, data):
+    """candle1m push: [ts ms, open, high, low, close, vol, volCurrency, volCurrencyQuote, confirm]"""
+    engine = candle_engines.get(arg.get('instId'))
+    if engine is None:
+        return
+    for k in data:
+        for alert in engine.on_candle(int(k[0]) // 1000, float(k[1]), float(k[2]), float(k[3]), float(k[4]),
+                                      str(k[8]) == '1'):
+            on_engine_alert(alert)
+    cross_check.expire()
+
+def on_engine_alert(alert):
+    symbol, kind = alert['instId'], signal_kind(alert['signal'])
+    engine_signals.inc(symbol, kind)
+    log_signal(f"ENGINE: {alert['signal']} @ {alert['price']:.6f}, swings low={alert['swing_low']} high={alert['swing_high']}"
+               f"{'' if CANDLE_ENGINE == 'live' else ' (shadow)'}", symbol)
+    cross_check.add('engine', symbol, kind)
+    if CANDLE_ENGINE == 'live':
+        engine_pools[symbol].submit(run_engine_alert, alert)
+
+def run_engine_alert(alert):
+    """Live mode: the engine's alert takes the same path as a webhook (dedup, queue or inline)"""
+    try:
+        body, code = accept_alert(alert)
+        log('ENGINE', '%s -> %s %s', alert['signal'], code, body, symbol=alert['instId'])
+    except Exception as e:
+        log('ENGINE ERROR', '%s: %s', alert['signal'], e, symbol=alert['instId'], level=logging.ERROR)
 
-        if not htf_swing_high:
-            return jsonify({'action': 'NO_ENTRY', 'reason': 'no HTF swing_high for stop'})
+def engine_gate(data):
+    """
+    A TradingView alert while the engine runs: it joins the cross-check. Under
+    live the engine is the only signal source, so the alert is acknowledged
+    but not executed. Returns that response, or None to carry on.
+    """
+    signal = str(data.get('signal', '')).upper().strip()
+    symbol = str(data.get('instId') or SYMBOL).upper()
+    cross_check.add('tradingview', symbol, signal_kind(signal))
+    if CANDLE_ENGINE != 'live':
+        return None
+    log_signal(f"ALERT NOT EXECUTED: {signal} (CANDLE_ENGINE=live, cross-check only)", symbol)
+    return {'action': 'CROSS_CHECK_ONLY', 'signal': signal, 'candle_engine': CANDLE_ENGINE}, 200
 
-        result = enter_short(price, htf_swing_high)
-        return jsonify({'action': 'SHORT_ENTERED', 'type': 'CONTINUATION', 'result': str(result)})
+candle_stream = BlofinStream('candles', BLOFIN_WS_PUBLIC_URL,
+                             [{'channel': 'candle1m', 'instId': sym} for sym in SYMBOLS],
+                             on_candle_data, seed_candles)
 
-    else:
-        log_signal(f"UNKNOWN SIGNAL: {signal}")
-        return jsonify({'error': f'Unknown signal: {signal}'}), 400
+if CANDLE_ENGINE in ('shadow', 'live'):
+    candle_stream.start()
 
 # =============================================================================
 # ENDPOINTS
 # =============================================================================
-@app.route('/status', methods=['GET'])
-def status():
-    blofin_pos = get_blofin_position()
-    return jsonify({
-        'htf_trend': htf_trend,
-        'ltf_trend': ltf_trend,
-        'had_deviation': had_deviation,
-        'position': current_position,
+def symbol_status(st):
+    blofin_pos = account_cache.get_position(st.symbol, max_age=None) or {'side': None, 'size': 0}
+    return {
+        'htf_trend': st.htf_trend,
+        'ltf_trend': st.ltf_trend,
+        'had_deviation': st.had_deviation,
+        'position': st.position,
         'blofin_position': blofin_pos['side'],
         'blofin_size': blofin_pos['size'],
-        'entry_price': entry_price,
-        'stop_price': stop_price,
-        'htf_swing_low': htf_swing_low,
-        'htf_swing_high': htf_swing_high,
-        'config': {
-            'symbol': SYMBOL,
-            'leverage': LEVERAGE,
-            'stop_buffer': STOP_BUFFER,
-            'max_stop_pct': MAX_STOP_PCT
-        },
-        'recent_logs': signal_log[-10:]
-    })
+        'entry_price': st.entry_price,
+        'stop_price': st.stop_price,
+        'htf_swing_low': st.htf_swing_low,
+        'htf_swing_high': st.htf_swing_high,
+        'config': st.cfg.to_dict()
+    }
+
+BOOT_ID = uuid.uuid4().hex[:8]     # in every ETag, so tags from another process or a restart never match
+_status_lock = threading.Lock()
+_status_view = {'version': None}
+
+def status_snapshot():
+    """
+    /status data as of the change feed's current version, rebuilt only when it
+    moves (state save, log event, position update). Positions are the account
+    cache's, so serving a snapshot never calls BloFin.
+    """
+    if STATE_BACKEND == 'sqlite':
+        for st in states.values():
+            peek_shared_state(st)       # another worker's change bumps the feed
+    version = change_feed.version
+    with _status_lock:
+        if _status_view['version'] != version:
+            _status_view.update(version=version, built=time.time(),
+                                symbols={sym: symbol_status(s) for sym, s in states.items()},
+                                shared={
+                                    'account_cache': account_cache.describe(),
+                                    'prices': price_cache.describe(),
+                                    'local_stops': stop_book.describe(),
+                                    'webhook_mode': WEBHOOK_MODE,
+                                    'queue_depth': signal_queue.depth(),
+                                    'dedup': dedup_cache.describe(),
+                                    'candle_engine': dict(mode=CANDLE_ENGINE, cross_check=cross_check.describe(),
+                                                          symbols={sym: e.describe() for sym, e in candle_engines.items()})
+                                                     if CANDLE_ENGINE != 'off' else {'mode': 'off'},
+                                    'recent_logs': recent_logs(10)
+                                })
+        return dict(_status_view)
+
+@app.route('/status', methods=['GET'])
+def status():
+    """Snapshot status with an ETag (If-None-Match -> 304); ?fresh=1 re-reads positions from BloFin first"""
+    st = get_state(request.args.get('instId'))
+    if st is None:
+        return jsonify({'error': f"Unknown instId: {request.args.get('instId')}"}), 404
+    if request.args.get('fresh') == '1':
+        refresh_positions()
+
+    snap = status_snapshot()
+    etag = f"{BOOT_ID}-{snap['version']}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        # Top level keeps the single-symbol shape for the requested (default) symbol
+        body = dict(snap['symbols'][st.symbol])
+        body.update(snap['shared'], symbols=snap['symbols'],
+                    snapshot={'version': snap['version'], 'age': round(time.time() - snap['built'], 3)})
+        resp = jsonify(body)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.route('/ready', methods=['GET'])
+def ready_endpoint():
+    """Readiness probe: 503 until warm-up, exchange reads and reconciliation have finished, or if they failed"""
+    return jsonify(startup.describe()), 200 if startup.healthy() else 503
 
 @app.route('/set_trend', methods=['POST'])
 def set_trend_endpoint():
-    global htf_trend, ltf_trend, had_deviation, htf_swing_low, htf_swing_high
     data = request.get_json(force=True)
-
-    if data.get('htf_trend'):
-        htf_trend = str(data['htf_trend']).upper()
-    if data.get('ltf_trend'):
-        ltf_trend = str(data['ltf_trend']).upper()
-    if data.get('had_deviation') is not None:
-        had_deviation = bool(data['had_deviation'])
-    if data.get('swing_low'):
-        htf_swing_low = float(data['swing_low'])
-    if data.get('swing_high'):
-        htf_swing_high = float(data['swing_high'])
-
-    log_signal(f"MANUAL SET: htf={htf_trend}, ltf={ltf_trend}, dev={had_deviation}")
-    save_state()
-    return jsonify({'status': 'ok', 'htf_trend': htf_trend, 'ltf_trend': ltf_trend, 'had_deviation': had_deviation})
+    st = get_state(data.get('instId'))
+    if st is None:
+        return jsonify({'error': f"Unknown instId: {data.get('instId')}"}), 404
+
+    with symbol_guard(st):
+        if data.get('htf_trend'):
+            st.htf_trend = str(data['htf_trend']).upper()
+        if data.get('ltf_trend'):
+            st.ltf_trend = str(data['ltf_trend']).upper()
+        if data.get('had_deviation') is not None:
+            st.had_deviation = bool(data['had_deviation'])
+        if data.get('swing_low'):
+            st.htf_swing_low = float(data['swing_low'])
+        if data.get('swing_high'):
+            st.htf_swing_high = float(data['swing_high'])
+
+        log_signal(f"MANUAL SET: htf={st.htf_trend}, ltf={st.ltf_trend}, dev={st.had_deviation}", st.symbol)
+        save_state(st)
+    return jsonify({'status': 'ok', 'instId': st.symbol, 'htf_trend': st.htf_trend,
+                    'ltf_trend': st.ltf_trend, 'had_deviation': st.had_deviation})
 
 @app.route('/close', methods=['POST'])
 def close_endpoint():
-    exit_position(get_price(SYMBOL) or 0, 'MANUAL')
-    return jsonify({'status': 'closed'})
+    data = request.get_json(force=True, silent=True) or {}
+    st = get_state(data.get('instId'))
+    if st is None:
+        return jsonify({'error': f"Unknown instId: {data.get('instId')}"}), 404
+    with symbol_guard(st):
+        exit_position(st, get_price(st.symbol) or 0, 'MANUAL')
+    return jsonify({'status': 'closed', 'instId': st.symbol})
+
+def parse_time_arg(value):
+    """Epoch seconds or ISO-8601 (local time if no offset) -> epoch seconds"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 @app.route('/logs', methods=['GET'])
 def logs_endpoint():
-    return jsonify({'logs': signal_log})
+    """
+    Event history, newest page first. Query args: since, until (epoch or ISO),
+    type (comma list, e.g. LONG_ENTERED,EXIT_LONG), instId, limit (<=1000),
+    cursor (next_cursor from the previous page).
+    """
+    args = request.args
+    try:
+        types = [t.strip().upper() for t in args['type'].split(',')] if args.get('type') else None
+        logs, next_cursor = event_store.query(
+            since=parse_time_arg(args.get('since')), until=parse_time_arg(args.get('until')),
+            types=types, symbol=args.get('instId', '').upper() or None, cursor=args.get('cursor'),
+            limit=max(1, min(int(args.get('limit', 100)), 1000)))
+    except ValueError as e:
+        return jsonify({'error': f'Bad query: {e}'}), 400
+    return jsonify({'logs': logs, 'next_cursor': next_cursor})
+
+@app.route('/latency', methods=['GET'])
+def latency_endpoint():
+    return jsonify({path: h.snapshot() for path, h in sorted(endpoint_stats.items())})
+
+def prom_labels(**labels):
+    if not labels:
+        return ''
+    escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for k, v in labels.items()}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped.items()) + '}'
+
+def prom_histogram(out, name, doc, series):
+    """series: [(labels dict, LatencyHistogram)] - ms buckets exported as seconds"""
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} histogram"]
+    for labels, h in series:
+        with h.lock:
+            counts, count, total = list(h.counts), h.count, h.total_ms
+        seen = 0
+        for le, c in zip(h.BUCKETS + (None,), counts):
+            seen += c
+            out.append(f"{name}_bucket{prom_labels(**labels, le='+Inf' if le is None else f'{le / 1000:g}')} {seen}")
+        out.append(f"{name}_sum{prom_labels(**labels)} {total / 1000:.6f}")
+        out.append(f"{name}_count{prom_labels(**labels)} {count}")
+
+def prom_counter(out, name, doc, counter, label_names):
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} counter"]
+    for values, n in counter.items():
+        out.append(f"{name}{prom_labels(**dict(zip(label_names, values)))} {n}")
+
+def prom_gauge(out, name, doc, samples):
+    """samples: [(labels dict, value)], None values are skipped"""
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+    for labels, v in samples:
+        if v is not None:
+            out.append(f"{name}{prom_labels(**labels)} {round(v, 3)}")
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition (per process - each gunicorn worker reports its own)"""
+    now = time.time()
+    out = []
+    prom_histogram(out, 'mxs_webhook_stage_seconds', 'Time per webhook stage',
+                   [({'stage': s}, webhook_stats[s]) for s in WEBHOOK_STAGES])
+    prom_counter(out, 'mxs_webhook_responses_total', 'Webhook responses by HTTP status', webhook_responses, ('status',))
+    endpoints = sorted(endpoint_stats.items())
+    prom_histogram(out, 'mxs_blofin_request_seconds', 'BloFin REST latency by endpoint',
+                   [({'endpoint': path}, h) for path, h in endpoints])
+    out += ["# HELP mxs_blofin_request_errors_total BloFin REST calls that failed or returned code != 0",
+            "# TYPE mxs_blofin_request_errors_total counter"]
+    out += [f"mxs_blofin_request_errors_total{prom_labels(endpoint=path)} {h.errors}" for path, h in endpoints]
+    dedup = dedup_cache.describe()
+    out += ["# HELP mxs_webhook_dedup_total Webhook deliveries by dedup cache result",
+            "# TYPE mxs_webhook_dedup_total counter",
+            f"mxs_webhook_dedup_total{prom_labels(result='hit')} {dedup['hits']}",
+            f"mxs_webhook_dedup_total{prom_labels(result='miss')} {dedup['misses']}"]
+    prom_gauge(out, 'mxs_webhook_dedup_entries', 'Alerts held in the dedup cache', [({}, dedup['size'])])
+    prom_histogram(out, 'mxs_blofin_throttle_seconds', 'Wait for a rate-limit token, by lane',
+                   [({'lane': lane}, h) for lane, h in throttle_stats.items()])
+    prom_counter(out, 'mxs_blofin_throttled_total', 'BloFin requests that waited for a rate-limit token', throttled, ('lane',))
+    prom_counter(out, 'mxs_blofin_singleflight_shared_total', 'GETs answered by an identical in-flight request',
+                 singleflight_shared, ('endpoint',))
+    prom_gauge(out, 'mxs_blofin_rate_tokens', 'Rate-limit tokens available per bucket',
+               [({'bucket': b.name}, b.available()) for b in (rest_limiter, trade_limiter)])
+    prom_counter(out, 'mxs_signals_total', 'Signals handled by kind', signal_counts, ('symbol', 'kind'))
+    prom_counter(out, 'mxs_entries_total', 'Positions opened', entry_counts, ('symbol', 'direction'))
+    prom_counter(out, 'mxs_exits_total', 'Positions closed by the strategy', exit_counts, ('symbol', 'reason'))
+    prom_counter(out, 'mxs_trailing_stop_moves_total', 'Trailing stop raises/lowers', trail_counts, ('symbol', 'side'))
+    prom_counter(out, 'mxs_stop_amends_total', 'Exchange stop-loss amends', stop_amends, ('symbol', 'result'))
+    prom_counter(out, 'mxs_local_stop_hits_total', 'Armed stops crossed on a price tick', local_stop_hits, ('symbol', 'side'))
+    with account_cache.lock:
+        pos_ts, bal_ts = account_cache.positions_ts, account_cache.balance_ts
+    prom_gauge(out, 'mxs_position_cache_age_seconds', 'Seconds since positions were last read or pushed',
+               [({}, now - pos_ts if pos_ts else None)])
+    prom_gauge(out, 'mxs_balance_cache_age_seconds', 'Seconds since the balance was last read or pushed',
+               [({}, now - bal_ts if bal_ts else None)])
+    prom_gauge(out, 'mxs_price_age_seconds', 'Seconds since the last price per symbol',
+               [({'symbol': sym}, price_cache.age(sym)) for sym in states])
+    prom_counter(out, 'mxs_reconciled_total', 'Local state corrected against the exchange at startup',
+                 reconciled, ('symbol', 'what'))
+    prom_gauge(out, 'mxs_ready', '1 once startup warm-up and reconciliation have finished',
+               [({}, 1 if startup.healthy() else 0)])
+    out += ["# HELP mxs_log_dropped_total Log records dropped because the writer queue was full",
+            "# TYPE mxs_log_dropped_total counter", f"mxs_log_dropped_total {log_writer.dropped}"]
+    prom_gauge(out, 'mxs_log_queue_depth', 'Log records waiting for the writer thread', [({}, log_writer.queue.qsize())])
+    if capture.f:
+        out += ["# HELP mxs_capture_dropped_total Capture records dropped because the writer queue was full",
+                "# TYPE mxs_capture_dropped_total counter", f"mxs_capture_dropped_total {capture.dropped}"]
+    prom_counter(out, 'mxs_engine_signals_total', 'Signals emitted by the candle engine', engine_signals, ('symbol', 'kind'))
+    prom_counter(out, 'mxs_engine_cross_check_total', 'Engine events vs TradingView alerts', cross_checks, ('result',))
+    prom_gauge(out, 'mxs_account_stream_up', '1 while the private stream is synced and alive',
+               [({}, 1 if account_cache.streaming() else 0)])
+    prom_gauge(out, 'mxs_signal_queue_depth', 'Queued signals per symbol (queue mode)',
+               [({'symbol': sym}, n) for sym, n in sorted(signal_queue.depth().items())])
+    return '\n'.join(out) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route('/reset', methods=['POST'])
 def reset_endpoint():
-    global htf_trend, ltf_trend, had_deviation, current_position, entry_price, stop_price
-    global htf_swing_low, htf_swing_high, signal_log
-
-    htf_trend = None
-    ltf_trend = None
-    had_deviation = False
-    current_position = None
-    entry_price = None
-    stop_price = None
-    htf_swing_low = None
-    htf_swing_high = None
-    signal_log = []
-    save_state()
-    return jsonify({'status': 'reset'})
+    """Reset one symbol ({"instId": ...}) or, with no body, every symbol (history is kept)"""
+    data = request.get_json(force=True, silent=True) or {}
+    if data.get('instId'):
+        st = get_state(data['instId'])
+        if st is None:
+            return jsonify({'error': f"Unknown instId: {data['instId']}"}), 404
+        targets = [st]
+    else:
+        targets = list(states.values())
+        signal_log.clear()
+
+    for st in targets:
+        with symbol_guard(st):
+            st.reset()
+            stop_book.disarm(st.symbol)
+            save_state(st)
+            log_signal("RESET: state cleared", st.symbol)
+    return jsonify({'status': 'reset', 'symbols': [st.symbol for st in targets]})
+
+def trend_color(trend):
+    return 'green' if trend == 'BULL' else 'red' if trend == 'BEAR' else 'gray'
+
+def dashboard_rows():
+    """Symbol table rows from memory - positions are whatever the account cache holds, never a REST read"""
+    rows = []
+    for st in states.values():
+        peek_shared_state(st)
+        pos = account_cache.get_position(st.symbol, max_age=None)
+        cfg = st.cfg
+        rows.append(f'''<tr>
+        <td>{st.symbol}</td>
+        <td style="color:{trend_color(st.htf_trend)}">{st.htf_trend or 'NONE'}</td>
+        <td style="color:{trend_color(st.ltf_trend)}">{st.ltf_trend or 'NONE'}</td>
+        <td style="color:{'yellow' if st.had_deviation else 'gray'}">{st.had_deviation}</td>
+        <td>{f"{pos['side'] or 'FLAT'} ({pos['size']} @ ${pos['entry']:.6f})" if pos else 'unknown'}</td>
+        <td>{st.entry_price}</td><td>{st.stop_price}</td>
+        <td>{st.htf_swing_low}</td><td>{st.htf_swing_high}</td>
+        <td>{cfg.leverage}x | {cfg.stop_buffer*100}% buf | {cfg.max_stop_pct*100}% max</td>
+        </tr>''')
+    return ''.join(rows)
+
+_dashboard_lock = threading.Lock()
+_dashboard_view = {'version': None, 'built': 0.0, 'payload': None}
+
+def dashboard_payload():
+    """
+    Dashboard fragments as JSON, rebuilt at most once per change however many
+    tabs are watching. With the shared sqlite backend other workers' changes
+    don't reach this process's feed, so the view also expires after a heartbeat.
+    """
+    version = change_feed.version
+    with _dashboard_lock:
+        view = _dashboard_view
+        expired = STATE_BACKEND == 'sqlite' and time.time() - view['built'] >= DASHBOARD_HEARTBEAT
+        if view['version'] != version or expired:
+            with account_cache.lock:
+                pos_ts = account_cache.positions_ts
+            source = 'stream' if account_cache.streaming() else 'last REST read'
+            view.update(version=version, built=time.time(), payload=json.dumps({
+                'rows': dashboard_rows(),
+                'logs': '<br>'.join(escape(f"{l['time']}: {l.get('symbol', '')} {l['msg']}") for l in recent_logs(20)) or 'No logs yet',
+                'positions': f"{source}, {time.time() - pos_ts:.0f}s ago" if pos_ts else 'not loaded yet',
+                'updated': datetime.now().strftime('%H:%M:%S'),
+            }))
+        return view['payload']
+
+dashboard_streams = threading.BoundedSemaphore(max(DASHBOARD_MAX_STREAMS, 1))
+native_sse = False    # set by mxs_asgi, whose /events costs no thread
+
+def sse_enabled():
+    """A WSGI stream pins a request thread for minutes: only on a threaded server, and only if configured"""
+    return native_sse or (DASHBOARD_MAX_STREAMS > 0 and bool(request.environ.get('wsgi.multithread')))
+
+@app.route('/events', methods=['GET'])
+def events_endpoint():
+    """Server-Sent Events: the dashboard payload on connect and again after every change"""
+    if not sse_enabled():
+        return jsonify({'error': 'Dashboard streams are off (DASHBOARD_MAX_STREAMS), poll /dashboard.json'}), 503
+    if not dashboard_streams.acquire(blocking=False):
+        return jsonify({'error': 'Too many dashboard streams, poll /dashboard.json'}), 503
+
+    def stream():
+        try:
+            yield 'retry: 2000\n\n'
+            deadline = time.time() + DASHBOARD_STREAM_SECS
+            seen, sent = change_feed.version, None
+            while time.time() < deadline:
+                payload = dashboard_payload()
+                if payload != sent:
+                    yield f"data: {payload}\n\n"
+                    sent = payload
+                version = change_feed.wait(seen, DASHBOARD_HEARTBEAT)
+                if version == seen:
+                    yield ': keep-alive\n\n'
+                else:
+                    time.sleep(DASHBOARD_DEBOUNCE)
+                seen = version
+        finally:
+            dashboard_streams.release()
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/dashboard.json', methods=['GET'])
+def dashboard_json():
+    return Response(dashboard_payload(), mimetype='application/json')
+
+# Live updates: poll /dashboard.json, or with streams on swap in each pushed payload (and poll if refused)
+DASHBOARD_JS = """
+function apply(d) {
+  document.getElementById('rows').innerHTML = d.rows;
+  document.getElementById('logs').innerHTML = d.logs;
+  document.getElementById('updated').textContent = d.updated + ' (positions: ' + d.positions + ')';
+}
+function poll() {
+  setInterval(function() { fetch('/dashboard.json').then(function(r) { return r.json(); }).then(apply); }, 5000);
+}
+if (SSE) {
+  var es = new EventSource('/events');
+  es.onmessage = function(e) { apply(JSON.parse(e.data)); };
+  es.onerror = function() { if (es.readyState === EventSource.CLOSED) { poll(); } };
+} else {
+  poll();
+}
+"""
 
 @app.route('/', methods=['GET'])
 def home():
-    blofin_pos = get_blofin_position()
-    logs_html = '<br>'.join([f"{l['time']}: {l['msg']}" for l in signal_log[-20:]])
-    htf_color = 'green' if htf_trend == 'BULL' else 'red' if htf_trend == 'BEAR' else 'gray'
-    ltf_color = 'green' if ltf_trend == 'BULL' else 'red' if ltf_trend == 'BEAR' else 'gray'
-    dev_color = 'yellow' if had_deviation else 'gray'
-
+    d = json.loads(dashboard_payload())
     return f'''<html><head>
     <title>MXS Bot - 30M/4H</title>
-    <meta http-equiv="refresh" content="5">
     <style>body{{background:#111;color:#eee;font-family:monospace;padding:20px;}}
-    .tag{{padding:2px 8px;border-radius:3px;margin:2px;}}</style>
+    .tag{{padding:2px 8px;border-radius:3px;margin:2px;}}
+    td,th{{padding:4px 10px;text-align:left;border-bottom:1px solid #333;}}</style>
     </head><body>
     <h1>MXS Volatile Strategy - 30M/4H</h1>
-    <p><b>Config:</b> {SYMBOL} | {LEVERAGE}x leverage | {STOP_BUFFER*100}% buffer | {MAX_STOP_PCT*100}% max stop</p>
-    <h2>
-        HTF: <span style="color:{htf_color}">{htf_trend or 'NONE'}</span> |
-        LTF: <span style="color:{ltf_color}">{ltf_trend or 'NONE'}</span> |
-        Deviation: <span style="color:{dev_color}">{had_deviation}</span>
-    </h2>
-    <p>HTF Swing Low: {htf_swing_low}</p>
-    <p>HTF Swing High: {htf_swing_high}</p>
-    <h3>Position: {blofin_pos['side'] or 'FLAT'} ({blofin_pos['size']} @ ${blofin_pos['entry']:.6f})</h3>
-    <p>Entry: {entry_price} | Stop: {stop_price}</p>
+    <p><b>Symbols:</b> {len(states)} | <b>Updated:</b> <span id="updated">{d['updated']} (positions: {d['positions']})</span></p>
+    <table>
+    <thead><tr><th>Symbol</th><th>HTF</th><th>LTF</th><th>Deviation</th><th>Position</th><th>Entry</th>
+    <th>Stop</th><th>HTF Swing Low</th><th>HTF Swing High</th><th>Config</th></tr></thead>
+    <tbody id="rows">{d['rows']}</tbody>
+    </table>
     <h3>Recent Logs</h3>
-    <pre style="background:#222;padding:10px;color:#0f0;max-height:400px;overflow:auto;">{logs_html or 'No logs yet'}</pre>
+    <pre id="logs" style="background:#222;padding:10px;color:#0f0;max-height:400px;overflow:auto;">{d['logs']}</pre>
     <p><a href="/status">Status JSON</a> | <a href="/logs">All Logs</a></p>
+    <script>var SSE = {'true' if sse_enabled() else 'false'};{DASHBOARD_JS}</script>
     </body></html>'''
 
 if __name__ == '__main__':
     print(f"\n{'='*60}")
     print(f"MXS VOLATILE STRATEGY BOT - 30M/4H")
     print(f"{'='*60}")
-    print(f"Symbol: {SYMBOL}")
-    print(f"Leverage: {LEVERAGE}x")
-    print(f"Stop Buffer: {STOP_BUFFER*100}%")
-    print(f"Max Stop Cap: {MAX_STOP_PCT*100}%")
-    print(f"{'='*60}")
-    print(f"HTF Trend: {htf_trend}")
-    print(f"LTF Trend: {ltf_trend}")
-    print(f"Deviation: {had_deviation}")
-    print(f"Position: {current_position}")
+    for st in states.values():
+        print(f"{st.symbol}: {st.cfg.leverage}x | Stop Buffer {st.cfg.stop_buffer*100}% | Max Stop Cap {st.cfg.max_stop_pct*100}%")
+        print(f"  HTF Trend: {st.htf_trend} | LTF Trend: {st.ltf_trend} | Deviation: {st.had_deviation} | Position: {st.position}")
     print(f"{'='*60}\n")
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))